@@ -0,0 +1,96 @@
+"""Latency of BM25 queries on a synthetic corpus at production scale.
+
+Chunks combine a few report sentences (see ``synthetic_pdfs``), whose company
+and topic words are very common, with Zipf-distributed filler words that
+give the index a long tail of rare terms, like real filings::
+
+    python -m benchmarks.lexical --chunks 300000 --queries 500 --out lexical.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.run import latency_summary, make_questions
+from benchmarks.synthetic_pdfs import _sentence
+from src.lexical_index import LexicalIndex
+
+
+def synthetic_chunks(
+    count: int, sentences: int = 3, filler: int = 120, vocabulary: int = 50000, seed: int = 0
+) -> Iterator[Tuple[str, str, str]]:
+    """Yield ``(id, filename, text)`` for ``count`` chunk-sized documents."""
+    rng = random.Random(seed)
+    words = np.random.default_rng(seed).zipf(1.2, size=(count, filler))
+    for i in range(count):
+        text = " ".join(_sentence(rng) for _ in range(sentences))
+        text += " " + " ".join(f"w{rank}" for rank in words[i] if rank <= vocabulary)
+        yield f"report_{i // 400}.pdf_page_{i % 400}", f"report_{i // 400}.pdf", text
+
+
+def build(index: LexicalIndex, count: int, batch_size: int = 2000) -> float:
+    """Index ``count`` synthetic chunks and return the seconds it took."""
+    started = time.perf_counter()
+    batch: List[Tuple[str, str, str]] = []
+    for chunk in synthetic_chunks(count):
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            ids, filenames, texts = zip(*batch)
+            index.add(ids, texts, filenames)
+            batch = []
+    if batch:
+        ids, filenames, texts = zip(*batch)
+        index.add(ids, texts, filenames)
+    return time.perf_counter() - started
+
+
+def measure(index: LexicalIndex, queries: int, n_results: int) -> Dict[str, float]:
+    """Time single-threaded searches over generated questions."""
+    latencies = []
+    for question in make_questions(queries, seed=1):
+        started = time.perf_counter()
+        index.search(question, n_results)
+        latencies.append(time.perf_counter() - started)
+    return {"queries": queries, "n_results": n_results, **latency_summary(latencies)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=300000, help="Number of indexed chunks")
+    parser.add_argument("--queries", type=int, default=500, help="Number of timed queries")
+    parser.add_argument("--n-results", type=int, default=20, help="Results per query")
+    parser.add_argument("--max-df-ratio", type=float, default=0.25, help="Skip terms found in a larger share of chunks")
+    parser.add_argument("--index", help="Reuse or keep the index at this path instead of a temporary one")
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.index or os.path.join(tmp, "bm25.sqlite")
+        index = LexicalIndex(path, max_df_ratio=args.max_df_ratio)
+        build_seconds = build(index, args.chunks) if len(index) != args.chunks else 0.0
+        report = {
+            "chunks": len(index),
+            "max_df_ratio": args.max_df_ratio,
+            "build_seconds": build_seconds,
+            "index_mb": os.path.getsize(path) / 1024 / 1024,
+            "search": measure(index, args.queries, args.n_results),
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Optional
+from flask import Flask, Response, jsonify, request, stream_with_context
+from werkzeug.serving import make_server
+
+ANSWER = (
+    "Based on the knowledge base, diversified index funds with low expense ratios have historically "
+    "offered a favorable balance of risk and return for long-term investors."
+)
+
+
+class MockOpenAI:
+    """Local stand-in for the OpenAI chat completions API.
+
+    Answers every request with a canned completion after a configurable
+    delay, with or without streaming, so the app can be load-tested offline.
+    Point the app at it with ``OPENAI_BASE_URL=http://host:port/v1``.
+
+    Faults can be injected to exercise retries, hedging and the circuit
+    breaker: a share of requests fails with ``error_status`` or is delayed by
+    ``slow_ms``, and ``fail_next`` makes the next requests fail for certain.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 50.0,
+        tokens_per_second: float = 100.0,
+        answer: str = ANSWER,
+        seed: Optional[int] = None,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        slow_rate: float = 0.0,
+        slow_ms: float = 5000.0,
+    ):
+        """Initialize the mock.
+
+        Args:
+            latency_ms: Mean delay before the first token.
+            jitter_ms: Standard deviation of that delay.
+            tokens_per_second: Streaming rate after the first token.
+            answer: Text returned for every completion.
+            seed: Seed of the latency and fault generator.
+            error_rate: Share of requests answered with ``error_status``.
+            error_status: HTTP status of injected errors; 429 adds ``Retry-After``.
+            slow_rate: Share of requests delayed by ``slow_ms`` on top of the latency.
+            slow_ms: Extra delay of slow requests.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.answer = answer
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.requests = 0
+        self.errors = 0
+        self._fail_next = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.app = self._create_app()
+
+    def fail_next(self, count: int = 1, status: int = 500) -> None:
+        """Answer the next ``count`` requests with ``status``."""
+        with self._lock:
+            self._fail_next.extend([status] * count)
+
+    def _plan(self):
+        """Draw the delay and the injected error status, if any, of one request."""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms))
+            if self._rng.random() < self.slow_rate:
+                delay += self.slow_ms
+            if self._fail_next:
+                status = self._fail_next.pop(0)
+            elif self._rng.random() < self.error_rate:
+                status = self.error_status
+            else:
+                status = None
+            if status is not None:
+                self.errors += 1
+            return delay / 1000, status
+
+    def _tokens(self):
+        words = self.answer.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _usage(self, messages) -> dict:
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+        completion_tokens = len(self._tokens())
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _create_app(self) -> Flask:
+        app = Flask(__name__)
+
+        @app.route("/v1/chat/completions", methods=["POST"])
+        def chat_completions():
+            body = request.get_json(force=True)
+            model = body.get("model", "gpt-4o-mini")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            created = int(time.time())
+            delay, status = self._plan()
+            time.sleep(delay)
+            if status is not None:
+                error = jsonify({"error": {"message": "Injected failure", "type": "server_error", "code": None}})
+                headers = {"Retry-After": "0.1"} if status == 429 else {}
+                return error, status, headers
+
+            if not body.get("stream"):
+                return jsonify({
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": self.answer},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": self._usage(body.get("messages", [])),
+                })
+
+            def chunk(delta=None, finish_reason=None, usage=None):
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [] if delta is None else [
+                        {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                    ],
+                }
+                if usage is not None:
+                    payload["usage"] = usage
+                return f"data: {json.dumps(payload)}\n\n"
+
+            def events():
+                yield chunk({"role": "assistant", "content": ""})
+                for token in self._tokens():
+                    yield chunk({"content": token})
+                    time.sleep(1 / self.tokens_per_second)
+                yield chunk({}, "stop")
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    yield chunk(usage=self._usage(body.get("messages", [])))
+                yield "data: [DONE]\n\n"
+
+            return Response(stream_with_context(events()), mimetype="text/event-stream")
+
+        return app
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a background thread.
+
+        Returns:
+            Base URL to use as ``OPENAI_BASE_URL``.
+        """
+        self._server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True).start()
+        return f"http://{host}:{self._server.server_port}/v1"
+
+    def stop(self) -> None:
+        """Stop the background server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8001, help="Port to bind")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Standard deviation of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Streaming rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of failed requests")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests with extra latency")
+    parser.add_argument("--slow-ms", type=float, default=5000.0, help="Extra latency of slow requests")
+    args = parser.parse_args()
+
+    mock = MockOpenAI(
+        args.latency_ms, args.jitter_ms, args.tokens_per_second,
+        error_rate=args.error_rate, error_status=args.error_status,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+    )
+    print(f"Serving on http://{args.host}:{args.port}/v1")
+    make_server(args.host, args.port, mock.app, threaded=True).serve_forever()
@@ -0,0 +1,253 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.mock_openai import MockOpenAI
+from benchmarks.synthetic_pdfs import COMPANIES, SECTORS, generate_corpus
+
+SCENARIOS = ("ingest", "retrieval", "generate")
+
+QUESTIONS = [
+    "What revenue did {company} report?",
+    "What is the dividend yield of {company}?",
+    "How did operating margin at {company} change?",
+    "What expense ratio does a {sector} index fund charge?",
+    "What is the price target for {company}?",
+    "How does diversification across {sector} affect volatility?",
+    "What happened to {company} bonds when rates rose?",
+    "What return did dollar-cost averaging into {company} produce?",
+]
+
+
+def make_questions(count: int, seed: int = 0) -> List[str]:
+    """Generate distinct-looking questions about the synthetic corpus."""
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUESTIONS).format(company=rng.choice(COMPANIES), sector=rng.choice(SECTORS))
+        for _ in range(count)
+    ]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Discard the app's progress prints while a scenario is timed."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """Summarize latencies in milliseconds."""
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "max_ms": float(ms.max()),
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and of its reaped children."""
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def run_load(call: Callable[[int], None], requests: int, concurrency: int) -> Dict[str, float]:
+    """Issue ``requests`` calls from ``concurrency`` threads and time each one."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def timed(i: int) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            call(i)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        **latency_summary(latencies),
+    }
+
+
+def scenario_ingest(args) -> Dict:
+    """Index a synthetic corpus from scratch, then re-run over the unchanged files."""
+    from src.pdf_extractor import process_pdf_directory
+
+    pages = generate_corpus("datasources", args.files, args.pages, seed=args.seed)
+
+    with _quiet():
+        started = time.perf_counter()
+        process_pdf_directory("datasources", workers=args.workers)
+        cold = time.perf_counter() - started
+
+        started = time.perf_counter()
+        process_pdf_directory("datasources", workers=args.workers)
+        unchanged = time.perf_counter() - started
+
+    return {
+        "files": args.files,
+        "pages": pages,
+        "workers": args.workers,
+        "seconds": cold,
+        "pages_per_second": pages / cold,
+        "unchanged_rerun_seconds": unchanged,
+    }
+
+
+def scenario_retrieval(args) -> Dict:
+    """Time ``search_similar_text`` against the index built by the ingest scenario."""
+    sys.path.insert(0, str(ROOT / "src"))
+    from retrieve import get_retriever, search_similar_text
+
+    retriever = get_retriever()
+    questions = make_questions(args.requests, args.seed)
+    with _quiet():
+        search_similar_text("warm up", retriever=retriever)
+        result = run_load(
+            lambda i: search_similar_text(questions[i], retriever=retriever), args.requests, args.concurrency
+        )
+    result["query_cache"] = retriever.store.query_cache.stats()
+    return result
+
+
+def scenario_generate(args) -> Dict:
+    """Load-test ``/generate`` with the OpenAI API replaced by the local mock."""
+    from werkzeug.serving import make_server
+
+    mock = MockOpenAI(args.llm_latency_ms, args.llm_jitter_ms, seed=args.seed)
+    os.environ["OPENAI_BASE_URL"] = mock.start()
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    sys.path.insert(0, str(ROOT / "src"))
+    with _quiet():
+        import webserver
+
+        app = webserver.create_app()
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/generate"
+    questions = make_questions(args.requests, args.seed)
+
+    def call(i: int) -> None:
+        body = json.dumps({"msg": questions[i]}).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "X-Session-Id": f"benchmark-client-{i % args.concurrency:04d}",
+        }
+        with urllib.request.urlopen(urllib.request.Request(url, body, headers), timeout=120) as response:
+            response.read()
+
+    try:
+        with _quiet():
+            call(0)
+            result = run_load(call, args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+        mock.stop()
+
+    result["llm_requests"] = mock.requests
+    result["llm_latency_ms"] = args.llm_latency_ms
+    return result
+
+
+def _run_scenario(args) -> Dict:
+    os.chdir(args.workdir)
+    result = {"generate": scenario_generate, "ingest": scenario_ingest, "retrieval": scenario_retrieval}[
+        args.scenario
+    ](args)
+    result.update(peak_rss_mb())
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion, retrieval and /generate")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all", help="Scenario to run")
+    parser.add_argument("--workdir", help="Folder for datasources/ and database/; a temporary one by default")
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    parser.add_argument("--files", type=int, default=10, help="Synthetic PDFs to ingest")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per PDF")
+    parser.add_argument("--workers", type=int, default=1, help="Extraction processes")
+    parser.add_argument("--requests", type=int, default=200, help="Queries per load scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Mock OpenAI time to first token")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0, help="Mock OpenAI latency deviation")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    if args.scenario != "all":
+        if not args.workdir:
+            parser.error("--workdir is required when running a single scenario")
+        print(json.dumps(_run_scenario(args)))
+        return
+
+    # Each scenario runs in its own process, so RSS and import costs are its own
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory(prefix="rag-bench-"))
+        report = {"commit": _git_commit(), "timestamp": time.time(), "parameters": vars(args), "scenarios": {}}
+        for scenario in SCENARIOS:
+            command = [sys.executable, "-m", "benchmarks.run", *sys.argv[1:], "--scenario", scenario, "--workdir", workdir]
+            completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+            if completed.returncode != 0:
+                lines = completed.stderr.strip().splitlines() or [f"exit code {completed.returncode}"]
+                report["scenarios"][scenario] = {"error": lines[-1]}
+                continue
+            report["scenarios"][scenario] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
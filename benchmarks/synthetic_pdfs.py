@@ -0,0 +1,198 @@
+import argparse
+import random
+from pathlib import Path
+from typing import List, Sequence
+
+# Letter size in points
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 56
+LINE_HEIGHT = 14
+CHARS_PER_LINE = 95
+
+COMPANIES = [
+    "Northwind Capital", "Bluecrest Holdings", "Aurora Energy", "Helix Biotech", "Summit Retail",
+    "Quantum Semiconductors", "Harbor Logistics", "Evergreen Utilities", "Atlas Financial", "Meridian Foods",
+]
+SECTORS = ["technology", "energy", "healthcare", "financials", "utilities", "consumer staples", "industrials"]
+TOPICS = [
+    "{company} reported revenue of ${revenue:.1f} billion for fiscal {year}, up {growth:.1f}% year over year, "
+    "driven by demand in its {sector} segment.",
+    "Operating margin at {company} expanded to {margin:.1f}% as cost controls offset higher input prices.",
+    "The board of {company} declared a quarterly dividend of ${dividend:.2f} per share, a yield of {yield_:.1f}%.",
+    "Analysts rate {company} a {rating} with a twelve-month price target of ${target:.0f}.",
+    "An index fund tracking the {sector} sector charges an expense ratio of {expense:.2f}% per year.",
+    "Diversification across {sector} and bonds reduced portfolio volatility to {volatility:.1f}% annualized.",
+    "Rising interest rates lowered the price of {company} bonds maturing in {maturity}.",
+    "Dollar-cost averaging into {company} since {year} produced an annualized return of {growth:.1f}%.",
+]
+DISCLAIMER = (
+    "Past performance is not a guarantee of future results. This report is provided for information "
+    "purposes only and does not constitute investment advice."
+)
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = CHARS_PER_LINE) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _sentence(rng: random.Random) -> str:
+    return rng.choice(TOPICS).format(
+        company=rng.choice(COMPANIES),
+        sector=rng.choice(SECTORS),
+        revenue=rng.uniform(0.5, 80),
+        growth=rng.uniform(-8, 25),
+        year=rng.randint(2015, 2024),
+        margin=rng.uniform(5, 40),
+        dividend=rng.uniform(0.1, 2.5),
+        yield_=rng.uniform(0.5, 6),
+        rating=rng.choice(["buy", "hold", "sell"]),
+        target=rng.uniform(20, 400),
+        expense=rng.uniform(0.03, 0.9),
+        volatility=rng.uniform(6, 25),
+        maturity=rng.randint(2026, 2050),
+    )
+
+
+def _text_ops(lines: Sequence[str], top: float) -> List[str]:
+    ops = ["BT", "/F1 10 Tf", f"{LINE_HEIGHT} TL", f"{MARGIN} {top:.1f} Td"]
+    for line in lines:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    return ops
+
+
+def _table_ops(rows: Sequence[Sequence[str]], top: float) -> List[str]:
+    """Draw a ruled table; the ruling lines are what table detection relies on."""
+    column_width = (PAGE_WIDTH - 2 * MARGIN) / len(rows[0])
+    row_height = 18
+    bottom = top - row_height * len(rows)
+    right = PAGE_WIDTH - MARGIN
+
+    ops = ["0.5 w"]
+    for i in range(len(rows) + 1):
+        y = top - i * row_height
+        ops.append(f"{MARGIN} {y:.1f} m {right:.1f} {y:.1f} l S")
+    for j in range(len(rows[0]) + 1):
+        x = MARGIN + j * column_width
+        ops.append(f"{x:.1f} {top:.1f} m {x:.1f} {bottom:.1f} l S")
+
+    ops += ["BT", "/F1 9 Tf"]
+    for i, row in enumerate(rows):
+        for j, cell in enumerate(row):
+            x = MARGIN + j * column_width + 4
+            y = top - (i + 1) * row_height + 5
+            ops.append(f"1 0 0 1 {x:.1f} {y:.1f} Tm ({_escape(cell)}) Tj")
+    ops.append("ET")
+    return ops
+
+
+def _table(rng: random.Random) -> List[List[str]]:
+    rows = [["Company", "Sector", "Revenue ($bn)", "Growth (%)", "Dividend ($)"]]
+    for company in rng.sample(COMPANIES, rng.randint(4, 8)):
+        rows.append([
+            company,
+            rng.choice(SECTORS),
+            f"{rng.uniform(0.5, 80):.1f}",
+            f"{rng.uniform(-8, 25):.1f}",
+            f"{rng.uniform(0.1, 2.5):.2f}",
+        ])
+    return rows
+
+
+def _page_stream(rng: random.Random, page: int, table_ratio: float, duplicate_ratio: float) -> bytes:
+    top = PAGE_HEIGHT - MARGIN
+    ops = _text_ops([f"Investment Outlook - page {page}"], top)
+    top -= 2 * LINE_HEIGHT
+
+    if rng.random() < table_ratio:
+        rows = _table(rng)
+        ops += _table_ops(rows, top)
+        top -= 18 * len(rows) + 2 * LINE_HEIGHT
+
+    paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(12, 20)))
+    if rng.random() < duplicate_ratio:
+        paragraph = f"{DISCLAIMER} {paragraph}"
+    lines = _wrap(paragraph)[:max(0, int((top - MARGIN) // LINE_HEIGHT))]
+    ops += _text_ops(lines, top)
+    return "\n".join(ops).encode("latin-1")
+
+
+def write_pdf(path: Path, pages: int, seed: int = 0, table_ratio: float = 0.3, duplicate_ratio: float = 0.2) -> None:
+    """Write a PDF of investment-style text pages, some with a ruled table.
+
+    Args:
+        path: Output file.
+        pages: Number of pages.
+        seed: Seed of the content generator.
+        table_ratio: Share of pages that get a table.
+        duplicate_ratio: Share of pages that start with the same disclaimer.
+    """
+    rng = random.Random(seed)
+    # 1: catalog, 2: pages, 3: font, then a page and a content object per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for page in range(1, pages + 1):
+        stream = _page_stream(rng, page, table_ratio, duplicate_ratio)
+        page_number, content_number = len(objects) + 1, len(objects) + 2
+        page_refs.append(f"{page_number} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>".encode("latin-1")
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {pages} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(out))
+
+
+def generate_corpus(directory: str, files: int = 10, pages: int = 20, seed: int = 0, **options) -> int:
+    """Write ``files`` synthetic PDFs into a directory.
+
+    Returns:
+        Total number of pages written.
+    """
+    for i in range(files):
+        write_pdf(Path(directory) / f"report_{i:04d}.pdf", pages, seed=seed + i, **options)
+    return files * pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic investment-style PDFs")
+    parser.add_argument("directory", help="Output folder")
+    parser.add_argument("--files", type=int, default=10, help="Number of PDFs")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per PDF")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--table-ratio", type=float, default=0.3, help="Share of pages with a table")
+    args = parser.parse_args()
+
+    total = generate_corpus(args.directory, args.files, args.pages, args.seed, table_ratio=args.table_ratio)
+    print(f"Wrote {args.files} files, {total} pages to {args.directory}")
@@ -1,21 +1,56 @@
 import subprocess
 import os
+import sys
 import threading
 import argparse
-from src.pdf_extractor import process_pdf_directory
 
 def run_flask():
     script_path = os.path.join(os.path.dirname(__file__), 'src', 'webserver.py')
     subprocess.run(['python', script_path])
 
+def add_src_to_path():
+    # The web modules import each other by bare name, as when run from src/
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+def run_prefork(host, port, workers):
+    add_src_to_path()
+    from prefork import serve
+    serve(host=host, port=port, workers=workers)
+
+def run_batch(questions_path, out_path, concurrency, rate):
+    add_src_to_path()
+    from ai_service import AIService
+    from batch_qa import run_batch as answer_file
+    answer_file(AIService(), questions_path, out_path, concurrency=concurrency, rate=rate)
+
 if __name__ == '__main__':
     flask_thread = threading.Thread(target=run_flask)
     parser = argparse.ArgumentParser(description='Run PDF processor and Flask server')
     parser.add_argument('--run-extractor', action='store_true', help='Run the PDF extractor')
+    parser.add_argument('--workers', type=int, default=1, help='Number of PDF extraction processes')
+    parser.add_argument('--export-index', action='store_true', help='Export embeddings to the memory-mapped index')
+    parser.add_argument('--serve', action='store_true', help='Serve with preforked worker processes')
+    parser.add_argument('--web-workers', type=int, default=2, help='Number of web worker processes with --serve')
+    parser.add_argument('--host', default='0.0.0.0', help='Interface to bind with --serve')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind with --serve')
+    parser.add_argument('--batch', metavar='QUESTIONS', help='Answer the questions of a JSONL file and exit')
+    parser.add_argument('--out', default='answers.jsonl', help='JSONL file the --batch answers are appended to')
+    parser.add_argument('--concurrency', type=int, default=8, help='Completions in flight at once with --batch')
+    parser.add_argument('--rate', type=float, default=None, help='Completions started per second at most with --batch')
     args = parser.parse_args()
 
+    # Heavy modules (torch, chromadb, pdfplumber) are imported only when needed
     if args.run_extractor:
-        process_pdf_directory("datasources")
-    
-    flask_thread.start()
-    flask_thread.join()
+        from src.pdf_extractor import process_pdf_directory
+        process_pdf_directory("datasources", workers=args.workers)
+    if args.export_index:
+        from src.mmap_index import export_from_database
+        export_from_database("database")
+
+    if args.batch:
+        run_batch(args.batch, args.out, args.concurrency, args.rate)
+    elif args.serve:
+        run_prefork(args.host, args.port, args.web_workers)
+    else:
+        flask_thread.start()
+        flask_thread.join()
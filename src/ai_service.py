@@ -1,31 +1,66 @@
-from openai import OpenAI
+import asyncio
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List, Dict
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from retrieve import search_similar_text
-from chat_history import ChatHistory
+from batch_qa import BATCH_SESSION, RateLimiter
+from retrieve import Retriever, get_retriever, search_similar_text
+from token_budget import PromptBudget, TokenCounter
+from session_store import DEFAULT_SESSION, SessionStore, create_session_store
+from answer_cache import AnswerCache, is_follow_up
+from intent import IntentClassifier, IntentResult
+from llm_client import LLMClient, LLMError
+from metrics import LLM_REQUESTS, STAGE_SECONDS, cache_samples, record_prompt, record_usage, span
+
+logger = logging.getLogger(__name__)
 
 class AIService:
     def __init__(self, model_name: str = "gpt-4o-mini", 
                  max_history: int = 5, 
                  temperature: float = 0,
-                 context_window: int = 3):
+                 context_window: int = 3,
+                 retriever: Optional[Retriever] = None,
+                 llm_intent_fallback: bool = False,
+                 executor_workers: int = 4,
+                 session_store: Optional[SessionStore] = None,
+                 answer_cache: Optional[AnswerCache] = None,
+                 max_prompt_tokens: int = 3000,
+                 llm: Optional[LLMClient] = None):
         """
         Initialize the AI service.
 
         Args:
             model_name: OpenAI model to use
-            max_history: Maximum number of chat interactions to store
+            max_history: Maximum number of chat interactions to store per session
             temperature: Temperature parameter for response generation
             context_window: Number of previous interactions to include in context
+            retriever: Shared retriever; defaults to the process-wide instance
+            llm_intent_fallback: Ask the LLM when local intent detection is unsure
+            executor_workers: Threads for embedding and vector search in the async path
+            session_store: Per-session chat histories; defaults to ``create_session_store``
+            answer_cache: Semantic cache of answers to near-duplicate questions
+            max_prompt_tokens: Token budget for system prompt, knowledge base and history
+            llm: OpenAI client with deadlines and retries; defaults to ``LLMClient.from_env``
         """
         self.model_name = model_name
         self.temperature = temperature
         self.context_window = context_window
         self.setup_environment()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.chat_history = ChatHistory(max_history=max_history)
+        self.llm = llm or LLMClient.from_env(api_key=os.getenv("OPENAI_API_KEY"))
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="retrieval")
+        self.sessions = session_store if session_store is not None else create_session_store(max_history=max_history)
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        self.prompt_budget = PromptBudget(TokenCounter(model_name), max_prompt_tokens=max_prompt_tokens)
+        self.retriever = retriever or get_retriever()
+        self.intent_classifier = IntentClassifier(
+            encode=lambda texts: self.retriever.store.create_embeddings(texts).cpu().numpy(),
+            llm_fallback=self.classify_with_llm if llm_intent_fallback else None,
+        )
+        self.intent_handlers = {"clear_history": self.clear_history}
 
     def setup_environment(self) -> None:
         """Load environment variables from .env file."""
@@ -36,7 +71,23 @@ class AIService:
         if not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OPENAI_API_KEY not found in environment variables")
 
-    def prepare_knowledge_base(self, similar_texts: List[List[str]]) -> str:
+    @staticmethod
+    def format_passage(result) -> str:
+        """
+        Format one retrieved passage with its source.
+
+        Args:
+            result: ``(id, distance, metadata, document)`` search result
+
+        Returns:
+            Passage text prefixed with its file and page
+        """
+        _, _, metadata, document = result
+        if metadata and "filename" in metadata:
+            return f"[{metadata['filename']}, page {metadata.get('page', '?')}] {document}"
+        return str(document)
+
+    def prepare_knowledge_base(self, similar_texts: List) -> str:
         """
         Format retrieved texts into knowledge base string.
 
@@ -46,7 +97,7 @@ class AIService:
         Returns:
             Formatted knowledge base string
         """
-        return "\n".join(" ".join(map(str, page)) for page in similar_texts)
+        return "\n".join(self.format_passage(result) for result in similar_texts)
 
     def create_system_prompt(self, knowledge_base: str) -> str:
         """
@@ -68,13 +119,17 @@ class AIService:
         {knowledge_base}
         """
 
-    def prepare_messages(self, system_prompt: str, user_question: str) -> List[Dict[str, str]]:
+    def prepare_messages(self, system_prompt: str, user_question: str,
+                         session_id: str = DEFAULT_SESSION,
+                         history: Optional[List] = None) -> List[Dict[str, str]]:
         """
         Prepare messages for the chat completion API.
 
         Args:
             system_prompt: Formatted system prompt
             user_question: Current user question
+            session_id: Session whose history is included
+            history: Interactions to include; defaults to the session's last ``context_window``
 
         Returns:
             List of message dictionaries
@@ -82,7 +137,8 @@ class AIService:
         messages = [{"role": "system", "content": system_prompt}]
         
         # Add context from chat history
-        last_interactions = self.chat_history.get_last_n_interactions(self.context_window)
+        last_interactions = history if history is not None else \
+            self.sessions.get_last_n_interactions(session_id, self.context_window)
         for interaction in last_interactions:
             messages.extend([
                 {"role": "user", "content": interaction.user_message},
@@ -91,7 +147,7 @@ class AIService:
         
         messages.append({"role": "user", "content": user_question})
 
-        print(f"Messages: {messages}")
+        logger.debug("Messages: %s", messages)
         
         return messages
 
@@ -103,28 +159,227 @@ class AIService:
             messages: Prepared message list
 
         Returns:
-            AI-generated response or error message
+            AI-generated response
+
+        Raises:
+            LLMError: No response could be generated
         """
         try:
-            response = self.client.chat.completions.create(
+            with span("llm"):
+                response = self.llm.complete(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature
+                )
+            return self._response_text(response)
+        except LLMError:
+            LLM_REQUESTS.inc(outcome="error")
+            raise
+
+    async def agenerate_response(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Generate response using the async OpenAI client.
+
+        Args:
+            messages: Prepared message list
+
+        Returns:
+            AI-generated response
+
+        Raises:
+            LLMError: No response could be generated
+        """
+        try:
+            with span("llm"):
+                response = await self.llm.acomplete(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature
+                )
+            return self._response_text(response)
+        except LLMError:
+            LLM_REQUESTS.inc(outcome="error")
+            raise
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Record the usage of a completion and return its text."""
+        record_usage(response.usage)
+        if response.choices and response.choices[0].message and response.choices[0].message.content:
+            LLM_REQUESTS.inc(outcome="ok")
+            return response.choices[0].message.content
+        raise LLMError("No response generated")
+
+    @staticmethod
+    def failure_message(error: LLMError) -> str:
+        """Reply shown to the user when no answer could be generated."""
+        return f"AI generation failed: {error}"
+
+    def generate_response_stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """
+        Stream response tokens from the OpenAI API as they are produced.
+
+        Args:
+            messages: Prepared message list
+
+        Yields:
+            Pieces of the AI-generated response
+
+        Raises:
+            LLMError: The response could not be generated or was cut off
+        """
+        started = time.perf_counter()
+        first_token = True
+        try:
+            stream = self.llm.stream(
                 model=self.model_name,
                 messages=messages,
-                temperature=self.temperature
+                temperature=self.temperature,
+                stream_options={"include_usage": True},
             )
-            
-            if response.choices and response.choices[0].message:
-                return response.choices[0].message.content
-            raise ValueError("No response generated")
-            
-        except Exception as e:
-            return f"AI generation failed: {str(e)}"
 
-    def chat(self, user_text: str) -> str:
+            for chunk in stream:
+                # The last chunk has no choices, only the token usage
+                if chunk.usage is not None:
+                    record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_token")
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+        except LLMError:
+            LLM_REQUESTS.inc(outcome="error")
+            raise
+        LLM_REQUESTS.inc(outcome="ok")
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+
+    def build_messages(self, question: str, embedding: Optional[List[float]] = None,
+                       session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        """
+        Retrieve context for the question and assemble the chat messages.
+
+        Args:
+            question: Cleaned user question
+            embedding: Precomputed embedding of the question
+            session_id: Session whose history is included
+
+        Returns:
+            List of message dictionaries
+        """
+        similar_texts = self.retrieve(question, embedding)
+        return self.assemble_messages(question, similar_texts, session_id)
+
+    def retrieve(self, question: str, embedding: Optional[List[float]] = None) -> List:
+        """
+        Get passages similar to the question from the knowledge base.
+
+        Args:
+            question: Cleaned user question
+            embedding: Precomputed embedding of the question
+
+        Returns:
+            List of ``(id, distance, metadata, document)`` tuples
+        """
+        return search_similar_text(question, retriever=self.retriever, embedding=embedding) or []
+
+    def assemble_messages(self, question: str, similar_texts: List,
+                          session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        """
+        Assemble the chat messages from already retrieved context.
+
+        Args:
+            question: Cleaned user question
+            similar_texts: Retrieved passages
+            session_id: Session whose history is included
+
+        Returns:
+            List of message dictionaries
+        """
+        with span("prompt_assembly"):
+            history = self.sessions.get_last_n_interactions(session_id, self.context_window)
+
+            # Fit passages and history into the prompt token budget; Chroma returns
+            # distances, so a smaller distance means a more similar passage
+            passages, history, report = self.prompt_budget.allocate(
+                self.create_system_prompt(""),
+                question,
+                [(self.format_passage(result), -result[1]) for result in similar_texts],
+                history,
+            )
+            record_prompt(report)
+            # Cut context changes answers, so it is worth seeing without debug logging
+            logger.log(logging.INFO if report.trimmed else logging.DEBUG, "%s", report)
+
+            # Prepare prompts and messages
+            knowledge_base = "\n".join(passages)
+            system_prompt = self.create_system_prompt(knowledge_base)
+            return self.prepare_messages(system_prompt, question, session_id, history)
+
+    def _is_cacheable(self, question: str, session_id: str) -> bool:
+        """Check that earlier turns cannot change the meaning of the question."""
+        if not self.sessions.get_last_n_interactions(session_id, 1):
+            return True
+        return not is_follow_up(question)
+
+    def cached_answer(self, question: str, embedding: List[float],
+                      similar_texts: List, session_id: str = DEFAULT_SESSION) -> Optional[str]:
+        """
+        Look up an answer to a near-duplicate question in the answer cache.
+
+        Args:
+            question: Cleaned user question
+            embedding: Embedding of the question
+            similar_texts: Passages retrieved for the question
+            session_id: Session the question belongs to
+
+        Returns:
+            Cached answer, or None
+        """
+        if not similar_texts or not self._is_cacheable(question, session_id):
+            return None
+        return self.answer_cache.lookup(
+            embedding, [result[0] for result in similar_texts], self.retriever.index_version()
+        )
+
+    def remember_answer(self, question: str, embedding: List[float], similar_texts: List,
+                        answer: str, session_id: str = DEFAULT_SESSION) -> None:
+        """
+        Store a generated answer in the answer cache.
+
+        Args:
+            question: Cleaned user question
+            embedding: Embedding of the question
+            similar_texts: Passages the answer was based on
+            answer: Generated answer
+            session_id: Session the question belongs to
+        """
+        if similar_texts and self._is_cacheable(question, session_id):
+            self.answer_cache.store(
+                embedding, [result[0] for result in similar_texts], answer, self.retriever.index_version()
+            )
+
+    def record_answer(self, question: str, embedding: List[float], similar_texts: List,
+                      answer: str, session_id: str = DEFAULT_SESSION) -> None:
+        """
+        Store a generated answer in the answer cache and the session history.
+
+        Args:
+            question: Cleaned user question
+            embedding: Embedding of the question
+            similar_texts: Passages the answer was based on
+            answer: Generated answer
+            session_id: Session the question belongs to
+        """
+        self.remember_answer(question, embedding, similar_texts, answer, session_id)
+        self.sessions.add_interaction(session_id, question, answer)
+
+    def chat(self, user_text: str, session_id: str = DEFAULT_SESSION) -> str:
         """
         Process user input and generate response.
 
         Args:
             user_text: User's input text
+            session_id: Session the message belongs to
 
         Returns:
             AI-generated response
@@ -132,59 +387,324 @@ class AIService:
         # Clean user input
         question = user_text.strip()
 
-        user_request = self.handle_user_request(user_text)
-        if user_request == "History cleared":
+        # The query embedding serves both intent detection and retrieval
+        embedding = self.retriever.embed(question)
+
+        user_request = self.handle_user_request(question, embedding, session_id)
+        if user_request != question:
             return user_request
         
-        # Get similar texts
-        similar_texts = search_similar_text(question)
-        
-        # Prepare prompts and messages
-        knowledge_base = self.prepare_knowledge_base(similar_texts)
-        system_prompt = self.create_system_prompt(knowledge_base)
-        messages = self.prepare_messages(system_prompt, question)
+        similar_texts = self.retrieve(question, embedding)
+        answer = self.cached_answer(question, embedding, similar_texts, session_id)
+        if answer is not None:
+            self.sessions.add_interaction(session_id, question, answer)
+            return answer
+
+        messages = self.assemble_messages(question, similar_texts, session_id)
         
         # Generate response
-        answer = self.generate_response(messages)
+        try:
+            answer = self.generate_response(messages)
+        except LLMError as e:
+            return self.failure_message(e)
         
         # Update chat history
-        if answer and not answer.startswith("AI generation failed"):
-            self.chat_history.add_interaction(question, answer)
+        self.record_answer(question, embedding, similar_texts, answer, session_id)
             
         return answer
+
+    async def achat(self, user_text: str, session_id: str = DEFAULT_SESSION) -> str:
+        """
+        Process user input without blocking the event loop.
+
+        The query is embedded through the embedding batcher, awaited on the
+        loop. Vector search and every step that reads or writes the session
+        store, the answer cache or counts prompt tokens run in a bounded
+        thread pool. Intent detection and retrieval run concurrently; if the
+        message turns out to be a command, the retrieval result is discarded.
+
+        Args:
+            user_text: User's input text
+            session_id: Session the message belongs to
+
+        Returns:
+            AI-generated response
+        """
+        # Clean user input
+        question = user_text.strip()
+        loop = asyncio.get_running_loop()
+
+        # The query embedding serves both intent detection and retrieval. It is
+        # awaited on the loop rather than in the pool, so concurrent requests
+        # are not capped at one per pool thread when they meet in a batch
+        embedding = await self.retriever.aembed(question)
+
+        intent_task = loop.run_in_executor(self.executor, self.detect_intent, question, embedding)
+        search_task = loop.run_in_executor(
+            self.executor,
+            partial(search_similar_text, question, retriever=self.retriever, embedding=embedding),
+        )
+
+        result = await intent_task
+        handler = self.intent_handlers.get(result.name)
+        if handler is not None:
+            search_task.cancel()
+            return await loop.run_in_executor(self.executor, handler, session_id)
+
+        similar_texts = await search_task or []
+        answer = await loop.run_in_executor(
+            self.executor, self.cached_answer, question, embedding, similar_texts, session_id
+        )
+        if answer is not None:
+            await loop.run_in_executor(self.executor, self.sessions.add_interaction, session_id, question, answer)
+            return answer
+
+        messages = await loop.run_in_executor(
+            self.executor, self.assemble_messages, question, similar_texts, session_id
+        )
+
+        # Generate response
+        try:
+            answer = await self.agenerate_response(messages)
+        except LLMError as e:
+            return self.failure_message(e)
+
+        # Update chat history
+        await loop.run_in_executor(
+            self.executor, self.record_answer, question, embedding, similar_texts, answer, session_id
+        )
+        return answer
+
+    async def answer_batch(self, items: List[Tuple[str, str]], concurrency: int = 8,
+                           rate: Optional[float] = None,
+                           chunk_size: int = 256) -> AsyncIterator[Dict]:
+        """
+        Answer many independent questions, yielding each answer as it finishes.
+
+        Each chunk of questions is embedded in one batched encode and searched
+        with one multi-query vector search. Completions then run concurrently,
+        at most ``concurrency`` at a time and ``rate`` started per second.
+        Questions are answered without history or intent detection, and
+        nothing is added to any session. Answer cache lookups and prompt
+        assembly run in the thread pool, off the event loop.
+
+        Args:
+            items: ``(id, question)`` pairs
+            concurrency: Completions in flight at once
+            rate: Completions started per second at most; unlimited if None
+            chunk_size: Questions embedded and searched together
+
+        Yields:
+            Dicts with ``id``, ``question``, ``answer``, ``sources`` and
+            ``cached``, plus ``error`` when the answer could not be generated
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        limiter = RateLimiter(rate)
+
+        async def answer(item_id: str, question: str, embedding: List[float], similar_texts: List) -> Dict:
+            result = {
+                "id": item_id,
+                "question": question,
+                "sources": [result[2] for result in similar_texts],
+                "cached": False,
+            }
+            cached = await loop.run_in_executor(
+                self.executor, self.cached_answer, question, embedding, similar_texts, BATCH_SESSION
+            )
+            if cached is not None:
+                return {**result, "answer": cached, "cached": True}
+
+            messages = await loop.run_in_executor(
+                self.executor, self.assemble_messages, question, similar_texts, BATCH_SESSION
+            )
+            try:
+                async with semaphore:
+                    await limiter.acquire()
+                    text = await self.agenerate_response(messages)
+            except LLMError as e:
+                return {**result, "answer": None, "error": str(e)}
+
+            await loop.run_in_executor(
+                self.executor, self.remember_answer, question, embedding, similar_texts, text, BATCH_SESSION
+            )
+            return {**result, "answer": text}
+
+        def search(chunk: List[Tuple[str, str]]):
+            return loop.run_in_executor(
+                self.executor, self.retriever.search_batch, [question for _, question in chunk]
+            )
+
+        chunks = [
+            [(item_id, question.strip()) for item_id, question in items[start:start + chunk_size]]
+            for start in range(0, len(items), chunk_size)
+        ]
+        pending = search(chunks[0]) if chunks else None
+        for i, chunk in enumerate(chunks):
+            embeddings, results = await pending
+            # Retrieve the next chunk while this one's completions run
+            if i + 1 < len(chunks):
+                pending = search(chunks[i + 1])
+            tasks = [
+                asyncio.ensure_future(answer(item_id, question, embedding, similar_texts))
+                for (item_id, question), embedding, similar_texts in zip(chunk, embeddings, results)
+            ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    def chat_stream(self, user_text: str, session_id: str = DEFAULT_SESSION) -> Iterator[str]:
+        """
+        Process user input and stream the response as it is generated.
+
+        The completed answer is added to the chat history once the stream ends.
+
+        Args:
+            user_text: User's input text
+            session_id: Session the message belongs to
+
+        Yields:
+            Pieces of the AI-generated response
+        """
+        # Clean user input
+        question = user_text.strip()
+
+        # The query embedding serves both intent detection and retrieval
+        embedding = self.retriever.embed(question)
+
+        user_request = self.handle_user_request(question, embedding, session_id)
+        if user_request != question:
+            yield user_request
+            return
+
+        similar_texts = self.retrieve(question, embedding)
+        answer = self.cached_answer(question, embedding, similar_texts, session_id)
+        if answer is not None:
+            self.sessions.add_interaction(session_id, question, answer)
+            yield answer
+            return
+
+        messages = self.assemble_messages(question, similar_texts, session_id)
+
+        parts = []
+        try:
+            for token in self.generate_response_stream(messages):
+                parts.append(token)
+                yield token
+        except LLMError as e:
+            yield self.failure_message(e)
+            return
+
+        # Update chat history
+        answer = "".join(parts)
+        if answer:
+            self.remember_answer(question, embedding, similar_texts, answer, session_id)
+            self.sessions.add_interaction(session_id, question, answer)
     
-    def handle_user_request(self, user_text: str) -> str:
+    def handle_user_request(self, user_text: str, embedding: Optional[List[float]] = None,
+                            session_id: str = DEFAULT_SESSION) -> str:
         """
         Handle special user requests like clearing chat history.
 
+        Intents are detected locally; see ``IntentClassifier``.
+
         Args:
             user_text: User's input text.
+            embedding: Precomputed embedding of the text, if available.
+            session_id: Session the message belongs to.
 
         Returns:
-            Response string based on the request.
+            Response string of the matching handler, or the unchanged user text.
+        """
+        result = self.detect_intent(user_text, embedding)
+        handler = self.intent_handlers.get(result.name)
+        if handler is not None:
+            return handler(session_id)
+
+        # Default response if no match
+        return user_text
+
+    def detect_intent(self, user_text: str, embedding: Optional[List[float]] = None) -> IntentResult:
+        """
+        Classify the message locally and record how long it took.
+
+        Args:
+            user_text: User's input text.
+            embedding: Precomputed embedding of the text, if available.
+
+        Returns:
+            Detected intent.
+        """
+        with span("intent"):
+            try:
+                result = self.intent_classifier.classify(user_text, embedding)
+            except LLMError as e:
+                # An unavailable LLM fallback must not fail the question itself
+                logger.warning("LLM intent fallback failed, answering as a question: %s", e)
+                result = IntentResult(IntentClassifier.UNCATEGORIZED, 0.0, "default")
+        logger.debug("Prompt category: %s (%s, %.2f)", result.name, result.source, result.confidence)
+        return result
+
+    def metric_samples(self) -> List:
+        """
+        Report cache statistics for the ``/metrics`` endpoint.
+
+        Returns:
+            Samples as expected by ``Registry.register_collector``
+        """
+        store = self.retriever.store
+        samples = cache_samples("query_embedding", store.query_cache.stats())
+        samples += cache_samples("answer", self.answer_cache.stats())
+        if store.batcher is not None:
+            stats = store.batcher.stats()
+            samples.append((
+                "rag_embedding_batch_size_mean", "gauge",
+                "Mean number of queries per batched encode.", {}, stats["mean_batch_size"],
+            ))
+        samples.append((
+            "rag_llm_circuit_open", "gauge", "1 while calls to OpenAI are rejected by the circuit breaker.",
+            {}, 1 if self.llm.breaker.state == "open" else 0,
+        ))
+        return samples
+
+    def clear_history(self, session_id: str = DEFAULT_SESSION) -> str:
+        """Clear the session's chat history and confirm it to the user."""
+        self.sessions.clear_history(session_id)
+        return "History cleared"
+
+    def classify_with_llm(self, user_text: str) -> str:
+        """
+        Classify the request type with an LLM, for low-confidence local results.
+
+        Args:
+            user_text: User's input text.
+
+        Returns:
+            Intent name understood by ``IntentClassifier``.
         """
-        # Use an LLM to classify the request type
         messages = [
             {"role": "system", "content": "You are a helpful assistant. If the user asks to clear chat history, respond with 'clear history.' For all other requests, return 'uncategorized.'."},
             {"role": "user", "content": user_text}
         ]
         
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0
-        )
+        with span("intent_llm"):
+            response = self.llm.complete(
+                stage="intent_llm",
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0
+            )
+        record_usage(response.usage)
 
         prompt_category = response.choices[0].message.content.lower()
-        print(f"Prompt category: {prompt_category}")
         
         # Check if the response classifies it as a clear history request
         if "clear history" in prompt_category:
-            self.chat_history.clear_history()
-            return "History cleared"
-        
-        # Default response if no match
-        return user_text
+            return "clear_history"
+        return IntentClassifier.UNCATEGORIZED
 
 # Usage example
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+import numpy as np
+
+# Words that usually point back at an earlier turn ("what about it?")
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|their|he|she|above|previous|earlier|"
+    r"same|more|else|also|again|instead)\b",
+    re.IGNORECASE,
+)
+
+
+def is_follow_up(question: str, min_words: int = 4) -> bool:
+    """Guess whether a question depends on the earlier conversation.
+
+    Args:
+        question: The user's question.
+        min_words: Questions shorter than this are treated as follow-ups.
+
+    Returns:
+        True if the question likely refers to a previous turn.
+    """
+    return len(question.split()) < min_words or bool(FOLLOW_UP_PATTERN.search(question))
+
+
+class AnswerCache:
+    """Semantic cache of generated answers keyed by query embedding.
+
+    A new question hits the cache when its cosine similarity to a cached
+    question reaches ``threshold`` and retrieval returned the same document ids.
+    Entries expire after ``ttl`` seconds, the least recently used ones are
+    evicted beyond ``max_entries``, and everything is dropped when the index
+    version changes.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl: float = 3600.0):
+        """Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity between questions for a hit.
+            max_entries: Maximum number of cached answers.
+            ttl: Seconds a cached answer stays valid.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, Tuple[str, ...], str, float]]" = OrderedDict()
+        self._next_key = 0
+        self._index_version: Optional[Hashable] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, index_version: Hashable) -> None:
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._matrix = None
+            self._index_version = index_version
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if now - entry[3] >= self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def lookup(
+        self,
+        embedding: Sequence[float],
+        doc_ids: Sequence[str],
+        index_version: Hashable = None,
+    ) -> Optional[str]:
+        """Return a cached answer for a similar question, if any.
+
+        Args:
+            embedding: Embedding of the new question.
+            doc_ids: Ids of the documents retrieved for the new question.
+            index_version: Current version of the vector index.
+
+        Returns:
+            The cached answer, or None on a miss.
+        """
+        query = self._normalize(embedding)
+        doc_key = tuple(sorted(doc_ids))
+        with self._lock:
+            self._check_version(index_version)
+            self._expire(time.time())
+
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+
+                scores = self._matrix @ query
+                for position in np.argsort(-scores):
+                    if scores[position] < self.threshold:
+                        break
+                    key = self._matrix_keys[position]
+                    _, cached_doc_key, answer, _ = self._entries[key]
+                    if cached_doc_key == doc_key:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return answer
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        doc_ids: Sequence[str],
+        answer: str,
+        index_version: Hashable = None,
+    ) -> None:
+        """Cache an answer.
+
+        Args:
+            embedding: Embedding of the question.
+            doc_ids: Ids of the documents the answer was based on.
+            answer: Generated answer.
+            index_version: Version of the vector index the documents came from.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[self._next_key] = (
+                self._normalize(embedding), tuple(sorted(doc_ids)), answer, time.time()
+            )
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, hits, misses and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
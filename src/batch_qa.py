@@ -0,0 +1,179 @@
+import asyncio
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Set, Tuple
+
+# Session used for batch questions; nothing is ever stored under it, so every
+# question is answered without history and may use the answer cache
+BATCH_SESSION = "batch"
+
+
+class RateLimiter:
+    """Spaces out calls on an event loop to at most ``rate`` per second."""
+
+    def __init__(self, rate: Optional[float] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Calls per second; ``None`` or 0 means unlimited
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        """Wait until the next call is allowed."""
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def parse_limits(
+    concurrency: Any = 8, rate: Any = None, max_concurrency: Optional[int] = None
+) -> Tuple[int, Optional[float]]:
+    """
+    Validate the concurrency and rate of a batch.
+
+    Args:
+        concurrency: Completions in flight at once, at least 1
+        rate: Completions started per second at most; ``None`` or 0 means unlimited
+        max_concurrency: Upper bound the concurrency is capped to
+
+    Returns:
+        ``(concurrency, rate)``
+
+    Raises:
+        ValueError: With a message for the client if either value is invalid
+    """
+    try:
+        concurrency = int(concurrency)
+    except (TypeError, ValueError):
+        raise ValueError("'concurrency' must be a positive integer") from None
+    if concurrency < 1:
+        raise ValueError("'concurrency' must be a positive integer")
+    if max_concurrency is not None:
+        concurrency = min(concurrency, max_concurrency)
+
+    if rate is None or rate == "":
+        return concurrency, None
+    try:
+        rate = float(rate)
+    except (TypeError, ValueError):
+        raise ValueError("'rate' must be a number of questions per second") from None
+    if rate < 0 or not math.isfinite(rate):
+        raise ValueError("'rate' must be a non-negative number of questions per second")
+    return concurrency, rate or None
+
+
+def parse_item(index: int, raw: Any) -> Tuple[str, str]:
+    """
+    Read one batch entry.
+
+    Args:
+        index: Position of the entry, used as its id when it has none
+        raw: A question string or an object with ``question`` and optional ``id``
+
+    Returns:
+        ``(id, question)``
+    """
+    if isinstance(raw, dict):
+        return str(raw.get("id", index)), str(raw.get("question", ""))
+    return str(index), str(raw)
+
+
+def read_questions(path: str) -> List[Tuple[str, str]]:
+    """Read ``(id, question)`` pairs from a JSONL file, skipping blank lines."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if line.strip():
+                items.append(parse_item(index, json.loads(line)))
+    return items
+
+
+def answered_ids(path: str) -> Set[str]:
+    """
+    Collect ids already answered in an output file and drop a torn last line.
+
+    A run that was interrupted may have left half a line at the end; it is
+    truncated so that appending continues on a clean line. Failed answers are
+    not counted, so they are retried.
+
+    Args:
+        path: JSONL output of an earlier run
+
+    Returns:
+        Ids with a successful answer
+    """
+    if not os.path.exists(path):
+        return set()
+
+    done, valid_bytes = set(), 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_bytes += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("error"):
+                done.add(str(record.get("id")))
+
+    if valid_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+def run_batch(
+    ai_service,
+    questions_path: str,
+    out_path: str,
+    concurrency: int = 8,
+    rate: Optional[float] = None,
+) -> int:
+    """
+    Answer every question of a JSONL file and append the answers to another.
+
+    Questions answered by an earlier run into the same output file are
+    skipped. Each answer is written and flushed as soon as it is ready.
+
+    Args:
+        ai_service: ``AIService`` used to answer
+        questions_path: JSONL input, one question per line
+        out_path: JSONL output
+        concurrency: Completions in flight at once
+        rate: Completions started per second at most
+
+    Returns:
+        Number of answers written
+    """
+    concurrency, rate = parse_limits(concurrency, rate)
+    done = answered_ids(out_path)
+    items = [item for item in read_questions(questions_path) if item[0] not in done]
+    print(f"{len(done)} questions already answered, {len(items)} to go.")
+    if not items:
+        return 0
+
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+
+    async def answer_all() -> int:
+        written = 0
+        with open(out_path, "a", encoding="utf-8") as out:
+            async for result in ai_service.answer_batch(items, concurrency=concurrency, rate=rate):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                written += 1
+                if written % 100 == 0:
+                    print(f"{written}/{len(items)} answered")
+        return written
+
+    return asyncio.run(answer_all())
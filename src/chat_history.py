@@ -1,13 +1,35 @@
+import time
 from collections import deque
 from typing import List, Optional
-from dataclasses import dataclass
 
-@dataclass
 class ChatEntry:
     """Represents a single chat interaction with user message and assistant response"""
-    user_message: str
-    assistant_response: str
-    timestamp: Optional[float] = None
+    __slots__ = ("user_message", "assistant_response", "timestamp")
+
+    # Object headers of the entry, its two strings and the timestamp float
+    OVERHEAD_BYTES = 180
+
+    def __init__(self, user_message: str, assistant_response: str, timestamp: Optional[float] = None):
+        self.user_message = user_message
+        self.assistant_response = assistant_response
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ChatEntry):
+            return NotImplemented
+        return (self.user_message, self.assistant_response, self.timestamp) == (
+            other.user_message, other.assistant_response, other.timestamp
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"ChatEntry(user_message={self.user_message!r}, "
+            f"assistant_response={self.assistant_response!r}, timestamp={self.timestamp!r})"
+        )
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by this entry"""
+        return self.OVERHEAD_BYTES + len(self.user_message) + len(self.assistant_response)
 
 class ChatHistory:
     def __init__(self, max_history: int = 10):
@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class Chunk:
+    """A token-bounded slice of a longer text."""
+    text: str
+    start: int
+    end: int
+    index: int
+
+
+class TextChunker:
+    """Splits text into overlapping chunks that fit the embedding model.
+
+    Chunks are measured in the model's own tokens, so each one is embedded in
+    full instead of being silently truncated at the model's maximum sequence
+    length. Character offsets into the original text are kept for every chunk.
+    """
+
+    # [CLS] and [SEP] are added around every input by the model
+    SPECIAL_TOKENS = 2
+
+    def __init__(self, tokenizer, max_tokens: int = 254, overlap: int = 32):
+        """Initialize the chunker.
+
+        Args:
+            tokenizer: Hugging Face fast tokenizer of the embedding model.
+            max_tokens: Maximum number of tokens per chunk.
+            overlap: Number of tokens shared by consecutive chunks.
+        """
+        if overlap >= max_tokens:
+            raise ValueError("Overlap must be smaller than max_tokens.")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    @classmethod
+    def from_model(cls, model, overlap: int = 32) -> "TextChunker":
+        """Create a chunker matching a SentenceTransformer's maximum sequence length."""
+        return cls(model.tokenizer, max_tokens=model.max_seq_length - cls.SPECIAL_TOKENS, overlap=overlap)
+
+    def split(self, text: str) -> List[Chunk]:
+        """Split text into chunks of at most ``max_tokens`` tokens.
+
+        Args:
+            text: Text to split.
+
+        Returns:
+            Chunks in document order; a short text yields a single chunk.
+        """
+        offsets = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            verbose=False,
+        )["offset_mapping"]
+
+        if len(offsets) <= self.max_tokens:
+            return [Chunk(text, 0, len(text), 0)]
+
+        chunks = []
+        step = self.max_tokens - self.overlap
+        start_token = 0
+        while True:
+            # Do not start a chunk in the middle of a word, but never skip past
+            # the overlap: a longer run without whitespace (a CSV row, a long
+            # number) is cut mid-word instead of losing the text in between
+            boundary = start_token
+            limit = min(start_token + self.overlap, len(offsets) - 1)
+            while 0 < boundary < limit and offsets[boundary][0] == offsets[boundary - 1][1]:
+                boundary += 1
+            if boundary == 0 or offsets[boundary][0] != offsets[boundary - 1][1]:
+                start_token = boundary
+
+            end_token = min(start_token + self.max_tokens, len(offsets))
+            start_char = offsets[start_token][0]
+            end_char = offsets[end_token - 1][1]
+            chunks.append(Chunk(text[start_char:end_char], start_char, end_char, len(chunks)))
+
+            if end_token >= len(offsets):
+                return chunks
+            start_token += step
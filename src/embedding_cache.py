@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+DEFAULT_CACHE_DIR = "embedding_cache"
+DEFAULT_MAX_MB = 1024
+
+# The vector file grows in steps of this many rows instead of being preallocated
+GROWTH_ROWS = 4096
+
+
+class EmbeddingCache:
+    """Persistent content-addressed cache of document embeddings.
+
+    Entries are keyed by a hash of the model identity and the normalized
+    text, so identical chunks are encoded once across files and across
+    rebuilds of the database. Vectors are kept as float16 rows of a
+    memory-mapped file. A SQLite index maps each key to its row and its last
+    use, and the least recently used entries are evicted once the cache holds
+    ``max_entries`` vectors.
+
+    The cache lives outside ``database/`` so deleting the database keeps it.
+    One process should write to it at a time.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, max_bytes: Optional[int] = None):
+        """Open the cache, creating it if needed.
+
+        Args:
+            path: Cache folder.
+            max_bytes: Upper bound of the vector file; read from
+                ``EMBEDDING_CACHE_MAX_MB`` when omitted.
+        """
+        self.path = path
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f16")
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite"))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key BLOB PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self.dim: Optional[int] = meta.get("dim")
+        self._used = meta.get("used", 0)
+        self._vectors: Optional[np.memmap] = None
+        if self.dim:
+            self._open_vectors()
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        """Content address of a normalized text embedded by a model."""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+    @property
+    def max_entries(self) -> int:
+        return max(1, self.max_bytes // (2 * self.dim)) if self.dim else 0
+
+    def _open_vectors(self) -> None:
+        rows = os.path.getsize(self._vectors_path) // (2 * self.dim) if os.path.exists(self._vectors_path) else 0
+        if rows < self._used:
+            # The vector file does not match the index; start over
+            self.clear()
+            return
+        self._vectors = (
+            np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(rows, self.dim)) if rows else None
+        )
+
+    def _grow(self, rows: int) -> None:
+        """Make room for ``rows`` rows in the vector file."""
+        allocated = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= allocated:
+            return
+        new_rows = min(max(rows, allocated + GROWTH_ROWS, allocated * 2), max(rows, self.max_entries))
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_rows * self.dim * 2)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(new_rows, self.dim))
+
+    def lookup(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Return the cached float32 vector of each key, or None for misses."""
+        found: Dict[bytes, int] = {}
+        if self._vectors is not None and keys:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part
+                ))
+            if found:
+                with self._conn:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE entries SET last_used = ? WHERE key = ?", ((now, key) for key in found)
+                    )
+
+        results = []
+        for key in keys:
+            slot = found.get(key)
+            results.append(None if slot is None else np.asarray(self._vectors[slot], dtype=np.float32))
+        hits = sum(vector is not None for vector in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def store(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Add vectors under their keys, evicting the least recently used if full.
+
+        Args:
+            keys: Distinct keys not yet in the cache.
+            vectors: One row per key.
+        """
+        vectors = np.asarray(vectors)
+        if not len(keys):
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        # Keep the most recent vectors of a batch larger than the whole cache
+        keys, vectors = list(keys)[-self.max_entries:], vectors[-self.max_entries:]
+
+        slots = list(range(self._used, min(self._used + len(keys), self.max_entries)))
+        with self._conn:
+            shortfall = len(keys) - len(slots)
+            if shortfall:
+                evicted = self._conn.execute(
+                    "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (shortfall,)
+                ).fetchall()
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key, _ in evicted))
+                slots.extend(slot for _, slot in evicted)
+                self.evictions += len(evicted)
+                keys, vectors = keys[:len(slots)], vectors[:len(slots)]
+            if not slots:
+                return
+
+            self._used = max(self._used, max(slots) + 1)
+            self._grow(self._used)
+            self._vectors[slots] = vectors.astype(np.float16)
+            self._vectors.flush()
+
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", ((key, slot, now) for key, slot in zip(keys, slots))
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('used', ?)", (self._used,))
+
+    def clear(self) -> None:
+        """Remove every entry and the vector file."""
+        self._vectors = None
+        with self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM meta")
+        if os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+        self.dim, self._used = None, 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit and miss counts since opening, hit rate and current size."""
+        lookups = self.hits + self.misses
+        size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": size,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        self._conn.close()
+
+
+def open_embedding_cache(path: Optional[str] = None) -> Optional[EmbeddingCache]:
+    """Open the cache configured by ``EMBEDDING_CACHE_DIR``, or None if disabled.
+
+    Setting ``EMBEDDING_CACHE_MAX_MB=0`` disables the cache.
+    """
+    if float(os.getenv("EMBEDDING_CACHE_MAX_MB", DEFAULT_MAX_MB)) <= 0:
+        return None
+    return EmbeddingCache(path or os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR))
@@ -1,9 +1,325 @@
-from typing import List, Optional, Dict
+import argparse
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Dict, Tuple, Union
+import numpy as np
 import torch
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 
+# Records per ChromaDB write; large enough to amortize the SQLite transaction,
+# small enough to keep each request well under the client's batch limit.
+DEFAULT_WRITE_BATCH_SIZE = 1024
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "torch" is the full-precision PyTorch model, "torch-int8" the same model with
+# dynamically quantized linear layers and "onnx" an ONNX Runtime session.
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx")
+
+DEFAULT_ENCODE_BATCH_SIZE = 32
+
+# How long the batcher waits for more queries after the first one arrives
+DEFAULT_BATCH_WINDOW_MS = 3.0
+
+
+def load_embedding_model(
+    model_name: str = DEFAULT_MODEL_NAME,
+    backend: str = "torch",
+    device: str = "cpu",
+    num_threads: Optional[int] = None,
+    onnx_file: Optional[str] = None,
+) -> SentenceTransformer:
+    """Load a SentenceTransformer with the requested inference backend.
+
+    Args:
+        model_name: SentenceTransformer model name or path.
+        backend: One of ``EMBEDDING_BACKENDS``; quantized and ONNX models run on CPU.
+        device: Device of the ``torch`` backend.
+        num_threads: Intra-op threads; the runtime default when omitted.
+        onnx_file: ONNX file inside the model repository, e.g.
+            ``onnx/model_qint8_avx2.onnx`` for a pre-quantized model.
+
+    Returns:
+        The loaded model.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Embedding backend must be one of {EMBEDDING_BACKENDS}.")
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    if backend == "onnx":
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx backend needs `pip install optimum[onnxruntime]`.") from e
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        model_kwargs = {"session_options": options, "provider": "CPUExecutionProvider"}
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    if backend == "torch-int8":
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return SentenceTransformer(model_name, device=device)
+
+
+def _onnx_file_digest(model: SentenceTransformer, model_name: str, onnx_file: Optional[str]) -> Optional[str]:
+    """SHA-256 of the ONNX file a model was loaded from, if it can be found."""
+    paths = [getattr(getattr(model[0], "auto_model", None), "model_path", None)]
+    if os.path.isdir(model_name):
+        paths.append(os.path.join(model_name, onnx_file or "onnx/model.onnx"))
+    for path in paths:
+        if path and os.path.isfile(path):
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+    return None
+
+
+# Models loaded by ``preload_model``. A prefork server loads the weights once
+# in the parent; workers forked afterwards find them here and share the pages
+# copy-on-write instead of each loading a private copy.
+_MODEL_CACHE: Dict[Tuple[str, str, str, Optional[str]], SentenceTransformer] = {}
+
+
+def _model_settings(
+    backend: Optional[str] = None, device: Optional[str] = None
+) -> Tuple[str, str, Optional[str]]:
+    """Resolve backend, device and ONNX file from arguments and environment."""
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+    if backend == "torch":
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    else:
+        device = "cpu"
+    return backend, device, os.getenv("EMBEDDING_ONNX_FILE") or None
+
+
+def preload_model(model_name: str = DEFAULT_MODEL_NAME, backend: Optional[str] = None) -> bool:
+    """Load the embedding model into the process-wide cache before forking.
+
+    Only the weights are loaded; no forward pass runs, so no intra-op thread
+    pool exists yet when the workers are forked. ONNX Runtime sessions do not
+    survive a fork and are left for each worker to create.
+
+    Returns:
+        Whether the model was cached.
+    """
+    backend, device, onnx_file = _model_settings(backend)
+    if backend == "onnx" or device != "cpu":
+        return False
+    key = (model_name, backend, device, onnx_file)
+    if key not in _MODEL_CACHE:
+        _MODEL_CACHE[key] = load_embedding_model(model_name, backend, device, onnx_file=onnx_file)
+    return True
+
+
+def parity_report(reference: torch.Tensor, candidate: torch.Tensor) -> Dict[str, float]:
+    """Compare embeddings of the same texts produced by two backends.
+
+    Returns:
+        Minimum and mean cosine similarity between matching rows, and how often
+        both backends agree on each text's nearest neighbour among the others.
+    """
+    reference = torch.nn.functional.normalize(reference.float().cpu(), dim=1)
+    candidate = torch.nn.functional.normalize(candidate.float().cpu(), dim=1)
+    cosine = (reference * candidate).sum(dim=1)
+
+    report = {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+    if len(reference) > 2:
+        mask = torch.eye(len(reference), dtype=torch.bool)
+        reference_nn = (reference @ reference.T).masked_fill(mask, -2).argmax(dim=1)
+        candidate_nn = (candidate @ candidate.T).masked_fill(mask, -2).argmax(dim=1)
+        report["neighbour_agreement"] = float((reference_nn == candidate_nn).float().mean())
+    return report
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings with hit/miss counters."""
+
+    def __init__(self, max_size: int = 1024):
+        """Initialize the cache.
+        
+        Args:
+            max_size: Maximum number of embeddings kept; 0 disables caching.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], torch.Tensor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[torch.Tensor]:
+        """Return the cached embedding for a key and mark it as recently used."""
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key: Tuple[str, str], embedding: torch.Tensor) -> None:
+        """Store an embedding, evicting the least recently used ones if full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, hits, misses and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-query encodes into batched forward passes.
+
+    Callers submit one text and get a ``Future``. A background thread takes the
+    first waiting text, collects whatever else arrives within ``max_wait_ms``
+    or until ``max_batch_size`` texts are queued, encodes them in one call and
+    resolves every future with its own row. The thread is started on first use
+    and restarted after a fork, so a batcher created before forking workers is
+    safe to use in each of them. ``on_batch``, if set, is called with the size
+    of every encoded batch.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], torch.Tensor],
+        max_batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_BATCH_WINDOW_MS,
+    ):
+        """Initialize the batcher.
+
+        Args:
+            encode: Function embedding a list of texts into a 2-D tensor.
+            max_batch_size: Upper bound of texts per forward pass.
+            max_wait_ms: Collection window opened by the first waiting text.
+        """
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self.on_batch: Optional[Callable[[int], None]] = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Queue and thread belong to the parent process after a fork
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding.
+
+        Returns:
+            Future resolved with the text's 1-D embedding.
+        """
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def stop(self) -> None:
+        """Stop the background thread after the queued texts are encoded."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+            self._pid = None
+
+    def stats(self) -> Dict[str, float]:
+        """Return the number of batches, encoded texts and mean batch size."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _collect(self, first) -> Tuple[list, bool]:
+        batch, stopping = [first], False
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        return batch, stopping
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stopping = self._collect(first)
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                try:
+                    embeddings = self.encode([text for text, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        future.set_exception(e)
+                else:
+                    self.batches += 1
+                    self.items += len(batch)
+                    if self.on_batch is not None:
+                        self.on_batch(len(batch))
+                    for (_, future), embedding in zip(batch, embeddings):
+                        future.set_result(embedding)
+            if stopping:
+                return
+
+
 class VectorStore:
     """Manages storage and retrieval of vector embeddings."""
 
@@ -12,23 +328,113 @@ class VectorStore:
         collection_name: str = "embeddings",
         database_path: str = "database",
         device: Optional[str] = None,
+        model_name: str = DEFAULT_MODEL_NAME,
+        query_cache_size: int = 1024,
+        backend: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        encode_batch_size: Optional[int] = None,
+        batch_window_ms: Optional[float] = None,
     ):
         """Initialize the vector store.
         
         Args:
             collection_name: Name of the ChromaDB collection to use.
             database_path: Path to the persistent database.
-            model: Embedding model to use for generating embeddings.
             device: Device to run embedding computations on (e.g., "cpu" or "cuda").
+            model_name: SentenceTransformer model used for generating embeddings.
+            query_cache_size: Number of query embeddings kept in the LRU cache.
+            backend: Inference backend, see ``EMBEDDING_BACKENDS``; read from
+                ``EMBEDDING_BACKEND`` when omitted.
+            num_threads: CPU threads used for encoding; read from
+                ``EMBEDDING_THREADS`` when omitted.
+            encode_batch_size: Texts per forward pass; read from
+                ``EMBEDDING_BATCH_SIZE`` when omitted.
+            batch_window_ms: Window for micro-batching concurrent queries; read
+                from ``EMBEDDING_BATCH_WINDOW_MS`` when omitted, 0 disables it.
         """
+        self.database_path = database_path
+        self.collection_name = collection_name
         self.client = chromadb.PersistentClient(
             path=database_path,
             settings=Settings(),
         )
 
         self.collection = self._get_or_create_collection(collection_name)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.backend, self.device, self.onnx_file = _model_settings(backend, device)
+        self.num_threads = num_threads or int(os.getenv("EMBEDDING_THREADS", "0")) or None
+        self.encode_batch_size = encode_batch_size or int(
+            os.getenv("EMBEDDING_BATCH_SIZE", DEFAULT_ENCODE_BATCH_SIZE)
+        )
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size)
+        if batch_window_ms is None:
+            batch_window_ms = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", DEFAULT_BATCH_WINDOW_MS))
+        self.batcher = (
+            EmbeddingBatcher(self._encode, self.encode_batch_size, batch_window_ms) if batch_window_ms > 0 else None
+        )
+        self.load_model(model_name)
+
+    def load_model(self, model_name: str) -> None:
+        """Load the embedding model, invalidating cached query embeddings.
+        
+        Args:
+            model_name: SentenceTransformer model name or path.
+        """
+        self.model = _MODEL_CACHE.get((model_name, self.backend, self.device, self.onnx_file))
+        if self.model is None:
+            self.model = load_embedding_model(
+                model_name,
+                backend=self.backend,
+                device=self.device,
+                num_threads=self.num_threads,
+                onnx_file=self.onnx_file,
+            )
+        elif self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        self.model_name = model_name
+        self._document_model: Optional[str] = None
+        self._lowercase = bool(getattr(self.model.tokenizer, "do_lower_case", False))
+        self.query_cache.clear()
+
+    def warm_up(self) -> None:
+        """Run one encode so the first request does not pay for lazy initialization."""
+        self._encode(["warm up"])
+
+    def normalize_text(self, text: str) -> str:
+        """Normalize a text the same way the tokenizer would see it."""
+        normalized = " ".join(text.split())
+        if self._lowercase:
+            normalized = normalized.lower()
+        return normalized
+
+    def _cache_key(self, text: str) -> Tuple[str, str]:
+        return self.model_name, self.normalize_text(text)
+
+    def document_model(self) -> str:
+        """Identity of the loaded model in ``EmbeddingCache`` keys.
+
+        ONNX models include the file and a hash of its content, since
+        different exports of one model repository (e.g. a quantized one)
+        produce different vectors.
+        """
+        if self._document_model is None:
+            self._document_model = f"{self.model_name}:{self.backend}"
+            if self.backend == "onnx":
+                digest = _onnx_file_digest(self.model, self.model_name, self.onnx_file)
+                self._document_model += f":{self.onnx_file or 'onnx/model.onnx'}:{digest or ''}"
+        return self._document_model
+
+    def reopen(self) -> None:
+        """Open a new ChromaDB client to see what another process has written.
+
+        Clients for one path share a cached system whose vector index is
+        loaded once, so the cache is cleared first. Requests still holding the
+        old collection handle finish on it.
+        """
+        from chromadb.api.client import SharedSystemClient
+
+        SharedSystemClient.clear_system_cache()
+        self.client = chromadb.PersistentClient(path=self.database_path, settings=Settings())
+        self.collection = self._get_or_create_collection(self.collection_name)
 
     def _get_or_create_collection(self, name: str):
         """Get or create a collection by name.
@@ -45,11 +451,17 @@ class VectorStore:
                 return collection
         return self.client.create_collection(name=name)
     
-    def create_embeddings(self, texts: List[str]) -> torch.Tensor:
+    def create_embeddings(
+        self,
+        texts: Union[str, List[str]],
+        use_cache: Optional[bool] = None,
+    ) -> torch.Tensor:
         """Generate embeddings for the provided texts.
         
         Args:
-            texts: List of text strings to embed.
+            texts: Text string or list of text strings to embed.
+            use_cache: Look up and store embeddings in the query cache. Defaults
+                to caching single-string queries and not ingestion batches.
         
         Returns:
             Tensor containing the embeddings.
@@ -57,60 +469,147 @@ class VectorStore:
         if not texts:
             raise ValueError("The 'texts' argument cannot be empty.")
 
-        # Example: Text preprocessing logic (to be implemented)
-        processed_texts = self._preprocess_texts(texts)
+        if use_cache is None:
+            use_cache = isinstance(texts, str)
+
+        if not use_cache:
+            return self._encode(texts)
+
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        keys = [self._cache_key(text) for text in items]
+        embeddings = [self.query_cache.get(key) for key in keys]
+
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            if single and self.batcher is not None:
+                encoded = [self.batcher.submit(texts).result()]
+            else:
+                encoded = self._encode([items[i] for i in misses])
+            for i, embedding in zip(misses, encoded):
+                embeddings[i] = embedding
+                self.query_cache.put(keys[i], embedding)
+
+        return embeddings[0] if single else torch.stack(embeddings)
+
+    async def acreate_embedding(self, text: str) -> torch.Tensor:
+        """Embed a single query from an event loop.
+
+        A cache miss is handed to the batcher and its future awaited on the
+        loop, so no thread is held while the query waits for its batch and
+        every request in flight can share one forward pass. Without a batcher
+        the query is encoded in the loop's default executor.
+
+        Args:
+            text: Query text.
+
+        Returns:
+            1-D embedding tensor.
+        """
+        key = self._cache_key(text)
+        embedding = self.query_cache.get(key)
+        if embedding is not None:
+            return embedding
+        if self.batcher is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self.create_embeddings, text)
+        embedding = await asyncio.wrap_future(self.batcher.submit(text))
+        self.query_cache.put(key, embedding)
+        return embedding
+
+    def embed_documents(self, texts: List[str], cache=None) -> torch.Tensor:
+        """Embed documents for storage, reusing vectors from an on-disk cache.
+
+        With an ``EmbeddingCache``, texts already in it are not encoded and
+        identical texts in the batch are encoded once. Embeddings are rounded
+        to the cache's float16 precision either way, so a rebuild from the
+        cache stores exactly what the first run stored.
 
-        # Generate embeddings
+        Args:
+            texts: Document texts.
+            cache: ``EmbeddingCache`` to read and fill, or None to encode everything.
+
+        Returns:
+            Tensor containing the embeddings, on the CPU.
+        """
+        if cache is None:
+            return self._encode(texts)
+
+        model = self.document_model()
+        keys = [cache.key(model, self.normalize_text(text)) for text in texts]
+        vectors = cache.lookup(keys)
+
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = self._encode(list(missing.values())).cpu().numpy().astype(np.float16)
+            cache.store(list(missing), encoded)
+            by_key = dict(zip(missing, encoded.astype(np.float32)))
+            vectors = [by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        return torch.from_numpy(np.stack(vectors))
+
+    def _encode(self, texts: Union[str, List[str]]) -> torch.Tensor:
+        """Run the embedding model on the texts.
+
+        Documents arrive already split by ``TextChunker`` in src/chunker.py.
+        """
         with torch.no_grad():
             embeddings = self.model.encode(
-                processed_texts,
+                texts,
+                batch_size=self.encode_batch_size,
                 convert_to_tensor=True,
                 device=self.device
             )
 
         return embeddings
 
-    def _preprocess_texts(self, texts: List[str]) -> List[str]:
-        """Preprocess texts for embedding generation (e.g., tokenization, splitting).
-        
-        Args:
-            texts: List of raw text strings.
-        
-        Returns:
-            List of preprocessed text strings.
-        """
-        # Placeholder for text preprocessing logic
-        return texts
-
     def store_embeddings(
         self, 
         embeddings: torch.Tensor, 
         metadata: List[Dict[str, str]], 
-        documents: List[str]
+        documents: List[str],
+        ids: Optional[List[str]] = None,
+        batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
     ) -> None:
         """Store embeddings in the vector database with metadata.
+
+        Records are upserted in batches, so re-running ingestion over a partially
+        indexed file overwrites what is already there instead of failing.
         
         Args:
             embeddings: Tensor of embeddings to store.
             metadata: List of metadata dictionaries corresponding to each embedding.
             documents: List of raw text or table data corresponding to each embedding.
+            ids: Optional document ids; defaults to ``{filename}_page_{page}``.
+            batch_size: Maximum number of records sent to ChromaDB per write.
         """
         if embeddings.size(0) != len(metadata) or embeddings.size(0) != len(documents):
             raise ValueError("Embeddings, metadata, and documents must have the same length.")
 
-        embeddings_list = embeddings.cpu().numpy().tolist()
+        if ids is not None and len(ids) != len(documents):
+            raise ValueError("Ids and documents must have the same length.")
 
-        for embedding, meta, document in zip(embeddings_list, metadata, documents):
+        for meta in metadata:
             if "filename" not in meta or "page" not in meta:
                 raise ValueError("Metadata must include 'filename' and 'page' keys.")
 
-            self.collection.add(
-                embeddings=[embedding],
-                ids=[f"{meta['filename']}_page_{meta['page']}"],
-                metadatas=[meta],
-                documents=[document]
+        if ids is None:
+            ids = [f"{meta['filename']}_page_{meta['page']}" for meta in metadata]
+
+        batch_size = max(1, min(batch_size, self.client.get_max_batch_size()))
+
+        for start in range(0, len(documents), batch_size):
+            end = start + batch_size
+            self.collection.upsert(
+                embeddings=embeddings[start:end].cpu().tolist(),
+                ids=ids[start:end],
+                metadatas=metadata[start:end],
+                documents=documents[start:end]
             )
-            print(f"Stored embedding for {meta['filename']} page {meta['page']}")
+
+        print(f"Stored {len(documents)} embeddings")
 
     def retrieve_embeddings(self, query: List[float], top_k: int = 5) -> List[Dict]:
         """Retrieve the most similar embeddings from the database.
@@ -125,5 +624,45 @@ class VectorStore:
         results = self.collection.query(query_embeddings=[query], n_results=top_k)
         return results
 
+SAMPLE_TEXTS = [
+    "What is the expense ratio of an index fund?",
+    "Diversification reduces the impact of any single holding on a portfolio.",
+    "Bond prices fall when interest rates rise.",
+    "How much should I keep in an emergency fund?",
+    "Dividends are paid out of a company's earnings to its shareholders.",
+    "Past performance is not a guarantee of future results.",
+    "Dollar-cost averaging invests a fixed amount at regular intervals.",
+    "Total revenue increased 12% year over year to $4.2 billion.",
+]
+
+
 if __name__ == "__main__":
-    store = VectorStore()
+    parser = argparse.ArgumentParser(description="Compare embedding backends against the PyTorch model")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="onnx", help="Backend to check")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_ENCODE_BATCH_SIZE, help="Texts per forward pass")
+    parser.add_argument("--samples", type=int, default=512, help="Documents taken from the collection")
+    args = parser.parse_args()
+
+    reference = VectorStore(backend="torch", num_threads=args.threads, encode_batch_size=args.batch_size)
+    candidate = VectorStore(backend=args.backend, num_threads=args.threads, encode_batch_size=args.batch_size)
+
+    documents = reference.collection.get(limit=args.samples, include=["documents"])["documents"] or []
+    texts = [document for document in documents if document] or SAMPLE_TEXTS
+
+    for name, store in (("torch", reference), (args.backend, candidate)):
+        store._encode(texts[:args.batch_size])  # warm up
+        started = time.perf_counter()
+        embeddings = store._encode(texts)
+        batch_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for text in SAMPLE_TEXTS:
+            store._encode(text)
+        query_ms = (time.perf_counter() - started) * 1000 / len(SAMPLE_TEXTS)
+
+        print(f"{name}: {len(texts) / batch_seconds:.1f} texts/s, {query_ms:.1f} ms per query")
+        if store is reference:
+            reference_embeddings = embeddings
+
+    print(parity_report(reference_embeddings, embeddings))
@@ -0,0 +1,86 @@
+import asyncio
+import queue
+import threading
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+
+class BackgroundLoop:
+    """An asyncio event loop running in a daemon thread.
+
+    Flask handles each request on its own thread. Submitting the request's
+    coroutine to one shared loop lets every in-flight chat share a single
+    ``AsyncOpenAI`` connection pool, while the request threads only wait.
+    """
+
+    def __init__(self, name: str = "asyncio-loop"):
+        """Start the loop thread.
+
+        Args:
+            name: Name of the thread running the loop.
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block until it completes.
+
+        Args:
+            coro: Coroutine to run.
+            timeout: Seconds to wait before raising ``TimeoutError``.
+
+        Returns:
+            The coroutine's result.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, iterable: AsyncIterator) -> Iterator:
+        """Consume an async iterator on the loop from a blocking thread.
+
+        Items are handed over as soon as they are produced. If the caller
+        stops iterating early, the async iterator is cancelled.
+
+        Args:
+            iterable: Async iterator to consume.
+
+        Yields:
+            The iterator's items.
+        """
+        items: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump() -> None:
+            try:
+                async for item in iterable:
+                    items.put((item, None))
+            except BaseException as e:
+                items.put((done, e))
+                raise
+            items.put((done, None))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def stop(self) -> None:
+        """Stop the loop and wait for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
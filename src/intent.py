@@ -0,0 +1,151 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+
+@dataclass
+class Intent:
+    """A command the user can ask for instead of an investment question."""
+    name: str
+    patterns: List[str] = field(default_factory=list)
+    exemplars: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IntentResult:
+    """Outcome of intent detection for one message."""
+    name: str
+    confidence: float
+    source: str
+
+
+CLEAR_HISTORY = Intent(
+    name="clear_history",
+    patterns=[
+        # Only whole-message commands aimed at the conversation itself, so that
+        # questions such as "does a reverse split reset the price history?" pass
+        r"^\s*(please\s+)?((can|could|would|will)\s+you\s+(please\s+)?)?"
+        r"(clear|reset|delete|erase|wipe|forget)\s+(the\s+|our\s+|this\s+|my\s+|your\s+|all\s+)?"
+        r"((chat|conversation)(\s+history)?|history|memory|context)"
+        r"(\s+please)?\s*[.!?]*\s*$",
+        r"^\s*(start over|start again|new (chat|conversation)|forget everything)\s*[.!]*\s*$",
+    ],
+    exemplars=[
+        "clear chat history",
+        "please clear our conversation",
+        "delete the chat history",
+        "forget everything we talked about",
+        "reset the conversation",
+        "start a new chat",
+        "wipe my history",
+    ],
+)
+
+
+class IntentClassifier:
+    """Detects command intents locally, without calling the LLM.
+
+    Messages longer than ``max_words`` are always questions. Shorter ones are
+    checked against whole-message keyword rules first, and those that match
+    no rule are compared against intent exemplars using the sentence
+    embedding model that is already loaded for retrieval. An optional LLM
+    fallback is consulted only when the embedding similarity is inconclusive.
+    """
+
+    UNCATEGORIZED = "uncategorized"
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Sequence[Sequence[float]]],
+        intents: Optional[List[Intent]] = None,
+        threshold: float = 0.75,
+        fallback_threshold: float = 0.55,
+        max_words: int = 12,
+        llm_fallback: Optional[Callable[[str], str]] = None,
+    ):
+        """Initialize the classifier.
+
+        Args:
+            encode: Function returning one embedding per input text.
+            intents: Intents to detect; defaults to clearing the chat history.
+            threshold: Cosine similarity at which an exemplar match is accepted.
+            fallback_threshold: Lowest similarity that still asks the LLM fallback.
+            max_words: Longer messages are treated as questions without embedding checks.
+            llm_fallback: Optional function mapping a message to an intent name.
+        """
+        self.encode = encode
+        self.threshold = threshold
+        self.fallback_threshold = fallback_threshold
+        self.max_words = max_words
+        self.llm_fallback = llm_fallback
+        self.intents: Dict[str, Intent] = {}
+        self._rules: List[tuple] = []
+        self._exemplar_matrix: Optional[np.ndarray] = None
+        self._exemplar_labels: List[str] = []
+        self._lock = threading.Lock()
+
+        for intent in intents if intents is not None else [CLEAR_HISTORY]:
+            self.register(intent)
+
+    def register(self, intent: Intent) -> None:
+        """Add an intent; exemplar embeddings are recomputed on next use."""
+        with self._lock:
+            self.intents[intent.name] = intent
+            self._rules = [
+                (re.compile(pattern, re.IGNORECASE), item.name)
+                for item in self.intents.values()
+                for pattern in item.patterns
+            ]
+            self._exemplar_matrix = None
+
+    def _exemplars(self):
+        """Return the normalized exemplar matrix, encoding it on first use."""
+        with self._lock:
+            if self._exemplar_matrix is None:
+                labels = [name for name, intent in self.intents.items() for _ in intent.exemplars]
+                texts = [text for intent in self.intents.values() for text in intent.exemplars]
+                matrix = np.asarray(self.encode(texts), dtype=np.float32) if texts else np.zeros((0, 1), np.float32)
+                if texts:
+                    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._exemplar_matrix, self._exemplar_labels = matrix, labels
+            return self._exemplar_matrix, self._exemplar_labels
+
+    def classify(self, text: str, embedding: Optional[Sequence[float]] = None) -> IntentResult:
+        """Detect the intent of a message.
+
+        Args:
+            text: The user's message.
+            embedding: Precomputed embedding of the message, if available.
+
+        Returns:
+            The detected intent, or ``uncategorized``.
+        """
+        if len(text.split()) > self.max_words:
+            return IntentResult(self.UNCATEGORIZED, 1.0, "length")
+
+        for pattern, name in self._rules:
+            if pattern.search(text):
+                return IntentResult(name, 1.0, "rule")
+
+        matrix, labels = self._exemplars()
+        if not labels:
+            return IntentResult(self.UNCATEGORIZED, 1.0, "default")
+
+        if embedding is None:
+            embedding = self.encode([text])[0]
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+
+        if score >= self.threshold:
+            return IntentResult(labels[best], score, "embedding")
+
+        if self.llm_fallback is not None and score >= self.fallback_threshold:
+            name = self.llm_fallback(text)
+            if name in self.intents:
+                return IntentResult(name, score, "llm")
+
+        return IntentResult(self.UNCATEGORIZED, 1.0 - score, "embedding")
@@ -0,0 +1,300 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,&'/-][a-z0-9]+)*")
+
+# Postings read per term and round of a search; doubled every round
+FIRST_BLOCK = 64
+# Stored impacts are recomputed once the average document length has moved
+# this far from the one they were normalized with
+IMPACT_DRIFT = 0.2
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "will with what which who how do does i you we they".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms for lexical matching.
+
+    Tickers, decimals and names such as ``s&p`` or ``3.5`` are kept whole, and
+    their alphanumeric parts are added as separate terms.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in re.split(r"[.,&'/-]", token) if part and part not in STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Merge several rankings of ids with reciprocal rank fusion.
+
+    Args:
+        rankings: Lists of ids, best first.
+        k: Damping constant; larger values flatten the contribution of top ranks.
+
+    Returns:
+        All ids ordered by fused score, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """Persistent BM25 inverted index on SQLite.
+
+    Kept next to the Chroma collection and updated incrementally during
+    ingestion. Document frequencies and corpus statistics are maintained on
+    write, so a query only reads the postings of its own terms.
+
+    Each posting stores its BM25 term frequency component (its impact),
+    normalized with the average document length at write time, and postings
+    are indexed by term in impact order. A search reads the best postings of
+    each term first and stops as soon as no unread document can enter the
+    top results, so it touches a small prefix of long postings lists instead
+    of scoring all of them.
+    """
+
+    def __init__(
+        self,
+        path: str = "database/bm25.sqlite",
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_df_ratio: float = 0.25,
+    ):
+        """Open the index, creating its tables if needed.
+
+        Args:
+            path: SQLite database file.
+            k1: BM25 term frequency saturation; applied when postings are written.
+            b: BM25 document length normalization; applied when postings are written.
+            max_df_ratio: Terms found in a larger share of documents are ignored
+                at query time; they carry almost no weight but have long postings.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(postings)")]
+            if columns and "impact" not in columns:
+                # Written before impacts were stored; the manifest version was
+                # bumped with it, so every file is indexed again
+                for table in ("docs", "postings", "terms", "stats"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "id TEXT PRIMARY KEY, filename TEXT, length INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS docs_filename ON docs (filename)")
+            # Clustered by document, which serves the lookup of a candidate's
+            # other terms; the covering term index serves reads in impact order
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "doc_id TEXT NOT NULL, term TEXT NOT NULL, tf INTEGER NOT NULL, impact REAL NOT NULL, "
+                "PRIMARY KEY (doc_id, term)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_impact ON postings (term, impact, doc_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO stats VALUES ('doc_count', 0), ('total_length', 0), ('impact_length', 0)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-65536")
+            self._local.conn = conn
+        return conn
+
+    def _delete(self, conn: sqlite3.Connection, ids: Iterable[str]) -> None:
+        for doc_id in ids:
+            row = conn.execute("SELECT length FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                continue
+            terms = [term for (term,) in conn.execute("SELECT term FROM postings WHERE doc_id = ?", (doc_id,))]
+            conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", ((term,) for term in terms))
+            conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+            conn.execute("UPDATE stats SET value = value - 1 WHERE key = 'doc_count'")
+            conn.execute("UPDATE stats SET value = value - ? WHERE key = 'total_length'", (row[0],))
+        conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def _impact(self, tf: int, length: int, average_length: float) -> float:
+        """BM25 term frequency component of a posting."""
+        return tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+
+    def _refresh_impacts(self, conn: sqlite3.Connection) -> None:
+        """Renormalize impacts if the average document length has drifted."""
+        stats = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        if not stats["doc_count"]:
+            return
+        average_length = max(round(stats["total_length"] / stats["doc_count"]), 1)
+        if abs(average_length - stats["impact_length"]) <= IMPACT_DRIFT * stats["impact_length"]:
+            return
+        conn.execute(
+            "UPDATE postings SET impact = tf * :k1_1 / (tf + :k1 * (1 - :b + :b * "
+            "(SELECT length FROM docs WHERE id = postings.doc_id) / :average))",
+            {"k1_1": self.k1 + 1, "k1": self.k1, "b": self.b, "average": float(average_length)},
+        )
+        conn.execute("UPDATE stats SET value = ? WHERE key = 'impact_length'", (average_length,))
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], filenames: Optional[Sequence[str]] = None) -> None:
+        """Index documents, replacing any existing ones with the same ids.
+
+        Args:
+            ids: Document ids, shared with the Chroma collection.
+            documents: Document texts.
+            filenames: Source file of each document, used for deletes by file.
+        """
+        rows, counts, document_frequency = [], [], Counter()
+        for i, (doc_id, document) in enumerate(zip(ids, documents)):
+            counts.append(Counter(tokenize(document)))
+            rows.append((doc_id, filenames[i] if filenames else None, sum(counts[-1].values())))
+            document_frequency.update(counts[-1].keys())
+
+        with self._connection() as conn:
+            self._delete(conn, ids)
+            # The first documents set the length impacts are normalized with
+            conn.execute(
+                "UPDATE stats SET value = ? WHERE key = 'impact_length' AND value = 0",
+                (max(round(sum(row[2] for row in rows) / max(len(rows), 1)), 1),),
+            )
+            (average_length,) = conn.execute("SELECT value FROM stats WHERE key = 'impact_length'").fetchone()
+            conn.executemany("INSERT INTO docs VALUES (?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                (
+                    (row[0], term, tf, self._impact(tf, row[2], average_length))
+                    for row, terms in zip(rows, counts)
+                    for term, tf in terms.items()
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                document_frequency.items(),
+            )
+            conn.execute("UPDATE stats SET value = value + ? WHERE key = 'doc_count'", (len(rows),))
+            conn.execute(
+                "UPDATE stats SET value = value + ? WHERE key = 'total_length'",
+                (sum(row[2] for row in rows),),
+            )
+            self._refresh_impacts(conn)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Remove documents by id."""
+        with self._connection() as conn:
+            self._delete(conn, ids)
+
+    def delete_file(self, filename: str) -> None:
+        """Remove every document that came from a source file."""
+        with self._connection() as conn:
+            ids = [doc_id for (doc_id,) in conn.execute("SELECT id FROM docs WHERE filename = ?", (filename,))]
+            self._delete(conn, ids)
+
+    def __len__(self) -> int:
+        row = self._connection().execute("SELECT value FROM stats WHERE key = 'doc_count'").fetchone()
+        return row[0] if row else 0
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Rank documents for a query with BM25.
+
+        Postings are read in blocks in descending impact order. Every new
+        document is scored in full by looking up its other query terms, and
+        the search stops once the ``n_results``-th score reaches the best
+        score an unread document could still get: the sum of the impacts at
+        the current read position of every term.
+
+        Args:
+            query: Search text.
+            n_results: Number of results to return.
+
+        Returns:
+            ``(id, score)`` pairs, best first.
+        """
+        conn = self._connection()
+        stats = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        doc_count = stats.get("doc_count", 0)
+        if not doc_count or n_results <= 0:
+            return []
+
+        weights: Dict[str, float] = {}
+        for term, query_tf in Counter(tokenize(query)).items():
+            row = conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+            # Never skip terms of small corpora, where every term is "common"
+            if row is None or row[0] > max(self.max_df_ratio * doc_count, 50):
+                continue
+            df = row[0]
+            weights[term] = query_tf * math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        if not weights:
+            return []
+
+        # Read position of each term: impact and id of the last posting read
+        cursors: Dict[str, Tuple[float, str]] = {term: (math.inf, "") for term in weights}
+        placeholders = ",".join("?" * len(weights))
+        top: List[Tuple[float, str]] = []
+        scored = set()
+        block = max(FIRST_BLOCK, n_results)
+        while cursors:
+            unseen = []
+            for term, (impact, doc_id) in list(cursors.items()):
+                rows = conn.execute(
+                    "SELECT impact, doc_id FROM postings WHERE term = ? AND (impact, doc_id) < (?, ?) "
+                    "ORDER BY impact DESC, doc_id DESC LIMIT ?",
+                    (term, impact, doc_id, block),
+                ).fetchall()
+                if len(rows) < block:
+                    del cursors[term]
+                else:
+                    cursors[term] = rows[-1]
+                for _, candidate in rows:
+                    if candidate not in scored:
+                        scored.add(candidate)
+                        unseen.append(candidate)
+
+            for start in range(0, len(unseen), 500):
+                part = unseen[start:start + 500]
+                scores: Dict[str, float] = {}
+                for doc_id, term, impact in conn.execute(
+                    f"SELECT doc_id, term, impact FROM postings WHERE doc_id IN ({','.join('?' * len(part))}) "
+                    f"AND term IN ({placeholders})",
+                    [*part, *weights],
+                ):
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weights[term] * impact
+                for doc_id, score in scores.items():
+                    if len(top) < n_results:
+                        heapq.heappush(top, (score, doc_id))
+                    elif score > top[0][0]:
+                        heapq.heapreplace(top, (score, doc_id))
+
+            threshold = sum(weights[term] * impact for term, (impact, _) in cursors.items())
+            if len(top) == n_results and top[0][0] >= threshold:
+                break
+            block *= 2
+
+        return [(doc_id, score) for score, doc_id in sorted(top, reverse=True)]
@@ -0,0 +1,437 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+from metrics import LLM_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Seconds a call of each stage may take in total, retries included
+DEFAULT_DEADLINES = {"llm": 30.0, "llm_stream": 30.0, "intent_llm": 5.0}
+CONNECT_TIMEOUT = 5.0
+
+
+class LLMError(Exception):
+    """No completion could be obtained from the OpenAI API."""
+
+
+class LLMTimeoutError(LLMError):
+    """The stage deadline passed before a completion arrived."""
+
+
+class CircuitOpenError(LLMError):
+    """The call was rejected because the upstream has been failing."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a failed call may succeed when repeated (429, 5xx, network)."""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Fails fast while the upstream keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are rejected for ``reset_timeout`` seconds. Then a single trial call
+    is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if now - self._opened_at >= self.reset_timeout else "open"
+
+    @property
+    def state(self) -> str:
+        """``closed``, ``open`` or ``half_open``."""
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def allow(self) -> bool:
+        """Check whether a call may be made now."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == "closed":
+                return True
+            # A trial that never reported back (e.g. cancelled) does not block forever
+            if state == "half_open" and (self._trial_at is None or now - self._trial_at >= self.reset_timeout):
+                self._trial_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("OpenAI circuit opened after %d failures", self._failures)
+                self._opened_at = time.monotonic()
+                self._trial_at = None
+
+
+class LatencyTracker:
+    """Rolling window of completion latencies."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the ``q``-th percentile, or None until enough calls were seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class LLMClient:
+    """OpenAI chat completions with deadlines, retries, hedging and a circuit breaker.
+
+    The sync and async SDK clients get their own tuned connection pools and
+    have the SDK's built-in retries disabled; this class retries instead.
+
+    - Every call has a deadline per stage (``DEFAULT_DEADLINES``). Each
+      attempt gets the time that is left, so retries never overrun it. The
+      SDK's httpx timeout only bounds each phase of a request (connect,
+      each read), so attempts are also bounded as a whole: async ones with
+      ``asyncio.wait_for``, sync ones by waiting on a pool thread.
+    - 429, 5xx and network errors are retried with full-jitter exponential
+      backoff, honouring ``Retry-After``. Other API errors are not retried.
+    - With ``hedge_percentile`` set, an async call still running after that
+      percentile of recent latencies is duplicated and the first answer wins.
+    - Retryable failures feed a ``CircuitBreaker``; while it is open, calls
+      raise ``CircuitOpenError`` at once instead of waiting on a failing API.
+
+    All failures are raised as ``LLMError``.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        deadlines: Optional[Dict[str, float]] = None,
+        hedge_percentile: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            api_key: OpenAI API key; defaults to ``OPENAI_API_KEY``
+            base_url: API base URL; defaults to ``OPENAI_BASE_URL`` or OpenAI's
+            max_connections: Connections per pool
+            max_keepalive_connections: Idle connections kept open per pool
+            max_retries: Retries after the first attempt
+            backoff_base: Backoff of the first retry in seconds, before jitter
+            backoff_max: Upper bound of the backoff in seconds
+            deadlines: Per-stage deadlines in seconds, merged into the defaults
+            hedge_percentile: Latency percentile after which async calls are hedged
+            breaker: Circuit breaker; defaults to 5 failures and 30 s
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=30.0,
+        )
+        timeout = httpx.Timeout(max(self.deadlines.values()), connect=CONNECT_TIMEOUT)
+        self.client = OpenAI(
+            api_key=api_key, base_url=base_url, max_retries=0, timeout=timeout,
+            http_client=httpx.Client(limits=limits, timeout=timeout),
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key, base_url=base_url, max_retries=0, timeout=timeout,
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+        )
+        # Runs sync attempts so the caller can stop waiting at the deadline
+        self._pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="llm")
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str] = None) -> "LLMClient":
+        """Create a client configured by ``LLM_*`` environment variables."""
+        hedge = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+        return cls(
+            api_key=api_key,
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            deadlines={"llm": float(os.getenv("LLM_DEADLINE_S", DEFAULT_DEADLINES["llm"]))},
+            hedge_percentile=hedge or None,
+        )
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Seconds to wait before retry number ``attempt + 1``."""
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _deadline(self, stage: str, deadline: Optional[float]) -> float:
+        return time.monotonic() + (deadline if deadline is not None else self.deadlines.get(stage, DEFAULT_DEADLINES["llm"]))
+
+    def _admit(self, stage: str, deadline_at: float) -> float:
+        """Check the deadline and the breaker; return the seconds left for the attempt."""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError(f"{stage} deadline exceeded")
+        if not self.breaker.allow():
+            LLM_EVENTS.inc(event="rejected")
+            raise CircuitOpenError("OpenAI API is failing; not calling it for now")
+        return remaining
+
+    def _after_failure(self, stage: str, error: Exception, attempt: int, deadline_at: float) -> float:
+        """Record a failed attempt and return the backoff, or raise if it must not be retried."""
+        if not isinstance(error, openai.OpenAIError):
+            raise error
+        if not is_retryable(error):
+            raise LLMError(f"{stage} failed: {error}") from error
+
+        self.breaker.record_failure()
+        failure = LLMTimeoutError if isinstance(error, openai.APITimeoutError) else LLMError
+        if attempt >= self.max_retries:
+            raise failure(f"{stage} failed after {attempt + 1} attempts: {error}") from error
+        delay = self.backoff(attempt, error)
+        if time.monotonic() + delay >= deadline_at:
+            raise LLMTimeoutError(f"{stage} deadline exceeded after {attempt + 1} attempts: {error}") from error
+
+        LLM_EVENTS.inc(event="retry")
+        logger.warning("%s attempt %d failed (%s); retrying in %.2fs", stage, attempt + 1, error, delay)
+        return delay
+
+    def _timed_out(self, stage: str, attempt: int) -> LLMTimeoutError:
+        """Record an attempt cut off at the deadline and return the error to raise."""
+        self.breaker.record_failure()
+        return LLMTimeoutError(f"{stage} deadline exceeded during attempt {attempt + 1}")
+
+    def _wait(self, stage: str, attempt: int, timeout: float, call: Callable, discard: Optional[Callable] = None):
+        """Run a blocking SDK call on the pool and return its result within ``timeout`` seconds.
+
+        A call still running at the deadline is abandoned; httpx's own timeout
+        ends it later, and ``discard`` is then applied to a late result.
+        """
+        def discard_late(done) -> None:
+            if done.exception() is None:
+                discard(done.result())
+
+        future = self._pool.submit(call)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Never started if the pool was busy; otherwise left to finish
+            if not future.cancel() and discard is not None:
+                future.add_done_callback(discard_late)
+            raise self._timed_out(stage, attempt) from None
+
+    def _succeeded(self, started: float) -> None:
+        self.breaker.record_success()
+        self.latency.observe(time.monotonic() - started)
+
+    def complete(self, stage: str = "llm", deadline: Optional[float] = None, **params: Any):
+        """
+        Create a chat completion.
+
+        Args:
+            stage: Stage whose deadline applies
+            deadline: Seconds allowed, overriding the stage deadline
+            **params: Arguments of ``chat.completions.create``
+
+        Returns:
+            The ``ChatCompletion``
+
+        Raises:
+            LLMError: The completion failed, timed out or the circuit is open
+        """
+        deadline_at = self._deadline(stage, deadline)
+        attempt = 0
+        while True:
+            remaining = self._admit(stage, deadline_at)
+            started = time.monotonic()
+            try:
+                response = self._wait(
+                    stage, attempt, remaining,
+                    lambda: self.client.chat.completions.create(timeout=remaining, **params),
+                )
+            except LLMTimeoutError:
+                raise
+            except Exception as e:
+                time.sleep(self._after_failure(stage, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            self._succeeded(started)
+            return response
+
+    async def acomplete(self, stage: str = "llm", deadline: Optional[float] = None, **params: Any):
+        """
+        Create a chat completion without blocking the event loop, hedging slow calls.
+
+        Args:
+            stage: Stage whose deadline applies
+            deadline: Seconds allowed, overriding the stage deadline
+            **params: Arguments of ``chat.completions.create``
+
+        Returns:
+            The ``ChatCompletion``
+
+        Raises:
+            LLMError: The completion failed, timed out or the circuit is open
+        """
+        deadline_at = self._deadline(stage, deadline)
+        attempt = 0
+        while True:
+            remaining = self._admit(stage, deadline_at)
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    self._hedged(
+                        lambda timeout: self.async_client.chat.completions.create(timeout=timeout, **params),
+                        remaining,
+                    ),
+                    remaining,
+                )
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                raise self._timed_out(stage, attempt) from None
+            except Exception as e:
+                await asyncio.sleep(self._after_failure(stage, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            self._succeeded(started)
+            return response
+
+    async def _hedged(self, create: Callable, timeout: float):
+        """Await ``create``, starting a duplicate if it outlives the hedge threshold."""
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        if hedge_after is None or hedge_after >= timeout:
+            return await create(timeout)
+
+        tasks = [asyncio.ensure_future(create(timeout))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                LLM_EVENTS.inc(event="hedge")
+                tasks.append(asyncio.ensure_future(create(timeout - hedge_after)))
+
+            # The first success wins; fail only once every copy has failed
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stream(self, stage: str = "llm_stream", deadline: Optional[float] = None, **params: Any) -> Iterator:
+        """
+        Stream a chat completion.
+
+        Attempts are retried until the first chunk arrives; the deadline
+        bounds the time to that chunk. Errors after it are raised as they are.
+
+        Args:
+            stage: Stage whose deadline applies
+            deadline: Seconds allowed, overriding the stage deadline
+            **params: Arguments of ``chat.completions.create`` except ``stream``
+
+        Yields:
+            ``ChatCompletionChunk`` objects
+
+        Raises:
+            LLMError: The completion failed, timed out or the circuit is open
+        """
+        deadline_at = self._deadline(stage, deadline)
+        attempt = 0
+        while True:
+            remaining = self._admit(stage, deadline_at)
+
+            def open_stream():
+                opened = self.client.chat.completions.create(stream=True, timeout=remaining, **params)
+                try:
+                    chunks = iter(opened)
+                    return opened, chunks, next(chunks, None)
+                except BaseException:
+                    opened.close()
+                    raise
+
+            try:
+                stream, chunks, first = self._wait(
+                    stage, attempt, remaining, open_stream, lambda late: late[0].close()
+                )
+            except LLMTimeoutError:
+                raise
+            except Exception as e:
+                time.sleep(self._after_failure(stage, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            # Time to first token is not a completion latency; keep it out of the hedge window
+            self.breaker.record_success()
+            break
+
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        except openai.OpenAIError as e:
+            if is_retryable(e):
+                self.breaker.record_failure()
+            raise LLMError(f"{stage} failed mid-stream: {e}") from e
+        finally:
+            stream.close()
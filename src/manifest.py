@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class IndexManifest:
+    """Persistent record of what has been indexed for each source file.
+
+    For every PDF the manifest keeps its size, mtime and content hash, plus the
+    hash of every chunk stored in ChromaDB under that file. This lets ingestion
+    skip unchanged files without opening them, re-embed only changed chunks and
+    find ids that no longer exist in the source.
+    """
+
+    # Bumped whenever the id or chunking scheme changes or a per-chunk index is
+    # added; an older manifest is ignored, so every file is re-indexed.
+    VERSION = 5
+
+    def __init__(self, path: str = "database/manifest.json"):
+        """Load the manifest from disk, starting empty if it does not exist.
+
+        Args:
+            path: Location of the manifest JSON file.
+        """
+        self.path = Path(path)
+        self.files: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Read the manifest file, ignoring it if missing or unreadable."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == self.VERSION:
+            self.files = data.get("files", {})
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def file_hash(path: Path, block_size: int = 1 << 20) -> str:
+        """Compute the SHA-256 of a file without reading it into memory at once."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def chunk_hash(text: str) -> str:
+        """Hash a chunk of text for change detection."""
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, filename: str) -> Optional[Dict]:
+        """Return the manifest entry for a file, if any."""
+        return self.files.get(filename)
+
+    def stat_matches(self, filename: str, stat: os.stat_result) -> bool:
+        """Check whether a file's size and mtime are unchanged since indexing."""
+        entry = self.files.get(filename)
+        return (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        )
+
+    def chunk_ids(self, filename: str) -> List[str]:
+        """Return the ids stored for a file."""
+        entry = self.files.get(filename)
+        return list(entry["chunks"]) if entry else []
+
+    def update(
+        self,
+        filename: str,
+        stat: os.stat_result,
+        sha256: str,
+        chunks: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Record a file as indexed.
+
+        Args:
+            filename: Name of the source file.
+            stat: ``os.stat`` result taken before the file was read.
+            sha256: Content hash of the file.
+            chunks: Mapping of stored ids to chunk hashes; keeps the existing
+                chunks when omitted.
+        """
+        if chunks is None:
+            chunks = self.files.get(filename, {}).get("chunks", {})
+        self.files[filename] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": sha256,
+            "chunks": chunks,
+        }
+
+    def remove(self, filename: str) -> List[str]:
+        """Forget a file and return the ids that were stored for it."""
+        entry = self.files.pop(filename, None)
+        return list(entry["chunks"]) if entry else []
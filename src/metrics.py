@@ -0,0 +1,351 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cache hit up to a slow completion
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name, type, help, labels, value) produced by a collector at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add to the counter of the given label values."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict:
+        """Return the current values in a JSON-serializable form."""
+        with self._lock:
+            series = [[list(key), value] for key, value in self._values.items()]
+        return {
+            "name": self.name, "type": "counter", "help": self.documentation,
+            "labelnames": list(self.labelnames), "series": series,
+        }
+
+
+class Histogram:
+    """Cumulative histogram with labels, in Prometheus bucket layout."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (non-cumulative), sum and count
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation for the given label values."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict:
+        """Return the current values in a JSON-serializable form."""
+        with self._lock:
+            series = [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._series.items()]
+        return {
+            "name": self.name, "type": "histogram", "help": self.documentation,
+            "labelnames": list(self.labelnames), "buckets": list(self.buckets), "series": series,
+        }
+
+
+def _render_metric(metric: Dict) -> List[str]:
+    """Render a merged counter or histogram snapshot."""
+    name = metric["name"]
+    lines = [f"# HELP {name} {metric['help']}", f"# TYPE {name} {metric['type']}"]
+    for key, value in sorted(metric["series"].items()):
+        labels = dict(zip(metric["labelnames"], key))
+        if metric["type"] == "counter":
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+        counts, total, count = value
+        cumulative = 0
+        for bound, bucket_count in zip(metric["buckets"], counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': repr(bound)})} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return lines
+
+
+def _merge(snapshots: Iterable[Dict], label_gauges: bool = False) -> Tuple[Dict[str, Dict], Dict[str, List[Sample]]]:
+    """Add up the snapshots of several processes.
+
+    Counters, histograms and counter samples are summed. Gauge samples of
+    different processes are kept apart with a ``pid`` label when
+    ``label_gauges`` is set, since their sum is rarely meaningful.
+    """
+    metrics: Dict[str, Dict] = {}
+    samples: Dict[Tuple, Sample] = {}
+    for snapshot in snapshots:
+        for metric in snapshot["metrics"]:
+            merged = metrics.setdefault(metric["name"], {**metric, "series": {}})
+            for key, value in metric["series"]:
+                key = tuple(key)
+                if metric["type"] == "counter":
+                    merged["series"][key] = merged["series"].get(key, 0.0) + value
+                    continue
+                counts, total, count = merged["series"].get(key, ([0] * len(metric["buckets"]), 0.0, 0))
+                merged["series"][key] = (
+                    [a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2]
+                )
+        for name, kind, documentation, labels, value in snapshot["samples"]:
+            if kind == "gauge" and label_gauges:
+                labels = {**labels, "pid": str(snapshot["pid"])}
+            key = (name, tuple(sorted(labels.items())))
+            previous = samples.get(key)
+            samples[key] = (name, kind, documentation, labels, value + (previous[4] if previous else 0))
+
+    grouped: Dict[str, List[Sample]] = {}
+    for sample in samples.values():
+        grouped.setdefault(sample[0], []).append(sample)
+    return metrics, grouped
+
+
+@contextmanager
+def _directory_lock(directory: str, operation: int) -> Iterator[None]:
+    """Hold a shared or exclusive lock on a multiprocess metrics directory."""
+    with open(os.path.join(directory, ".lock"), "a") as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """Keep the totals of an exited worker but stop reporting its gauges.
+
+    Its counters and histograms stay in the sums, so they never go backwards
+    when a worker is restarted. The file is renamed so a later process that
+    reuses the pid cannot overwrite it.
+    """
+    path = os.path.join(directory, f"{pid}.json")
+    with _directory_lock(directory, fcntl.LOCK_EX):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        snapshot["samples"] = [sample for sample in snapshot["samples"] if sample[1] != "gauge"]
+        dead = os.path.join(directory, f"dead-{pid}-{uuid.uuid4().hex}.json")
+        with open(dead, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.remove(path)
+
+
+class Registry:
+    """Set of metrics rendered together in the Prometheus text format.
+
+    Besides counters and histograms updated in place, collectors registered
+    with ``register_collector`` are called on every scrape, which suits values
+    another component already tracks, such as cache statistics.
+
+    Forked worker processes each hold their own copy of the metrics. After
+    ``enable_multiprocess`` a process writes its values to a file of its own in
+    a shared directory, and every scrape adds up the files of all workers.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._directory: Optional[str] = None
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Add a function returning ``(name, type, help, labels, value)`` samples."""
+        self._collectors.append(collector)
+
+    def enable_multiprocess(self, directory: str, interval: float = 1.0) -> None:
+        """Share this process's metrics through ``directory``.
+
+        Call in each worker after the fork. A daemon thread writes the values
+        every ``interval`` seconds, so a scrape sees the other workers' values
+        at most that old.
+        """
+        self._directory = directory
+        self.flush()
+
+        def flush_periodically() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Writing metrics failed")
+
+        threading.Thread(target=flush_periodically, name="metrics-flush", daemon=True).start()
+
+    def snapshot(self) -> Dict:
+        """Collect the metrics and collector samples of this process."""
+        samples: List[Sample] = []
+        for collector in self._collectors:
+            try:
+                samples.extend(collector())
+            except Exception:
+                logger.exception("Metrics collector failed")
+        return {"pid": os.getpid(), "metrics": [metric.snapshot() for metric in self._metrics], "samples": samples}
+
+    def flush(self) -> None:
+        """Write this process's snapshot to the multiprocess directory."""
+        if self._directory is None:
+            return
+        path = os.path.join(self._directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def _read_snapshots(self) -> List[Dict]:
+        self.flush()
+        snapshots = []
+        with _directory_lock(self._directory, fcntl.LOCK_SH):
+            for path in glob.glob(os.path.join(self._directory, "*.json")):
+                with open(path, "r", encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+        return snapshots
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        if self._directory is None:
+            metrics, grouped = _merge([self.snapshot()])
+        else:
+            metrics, grouped = _merge(self._read_snapshots(), label_gauges=True)
+
+        lines = []
+        for metric in metrics.values():
+            lines.extend(_render_metric(metric))
+        for name, samples in grouped.items():
+            lines.append(f"# HELP {name} {samples[0][2]}")
+            lines.append(f"# TYPE {name} {samples[0][1]}")
+            for _, _, _, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Time spent in each stage of answering a question.", ["stage"]
+)
+REQUESTS = REGISTRY.counter("rag_requests_total", "Chat requests by endpoint.", ["endpoint"])
+LLM_REQUESTS = REGISTRY.counter("rag_llm_requests_total", "OpenAI completion calls by outcome.", ["outcome"])
+LLM_EVENTS = REGISTRY.counter(
+    "rag_llm_resilience_events_total", "OpenAI retries, hedged requests and circuit breaker rejections.", ["event"]
+)
+LLM_TOKENS = REGISTRY.counter("rag_llm_tokens_total", "OpenAI tokens used, by kind.", ["kind"])
+PROMPT_TOKENS = REGISTRY.histogram(
+    "rag_prompt_tokens", "Tokens of each assembled prompt, by part.", ["part"],
+    buckets=(50, 100, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000),
+)
+PROMPT_TRIMMED = REGISTRY.counter(
+    "rag_prompt_trimmed_total", "Passages and history turns cut to fit the prompt budget.", ["item", "action"]
+)
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "rag_embedding_batch_size", "Queries encoded per batched forward pass.", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage of request handling into ``rag_stage_duration_seconds``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        logger.debug("%s took %.1f ms", stage, elapsed * 1000)
+
+
+def record_usage(usage) -> None:
+    """Count the tokens reported in an OpenAI response's ``usage``."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+
+
+def record_prompt(report) -> None:
+    """Record the token counts and trimming of a ``BudgetReport``."""
+    for part in ("system", "knowledge", "history", "question", "total"):
+        PROMPT_TOKENS.observe(getattr(report, f"{part}_tokens"), part=part)
+    PROMPT_TRIMMED.inc(report.passages_dropped, item="passage", action="dropped")
+    PROMPT_TRIMMED.inc(report.passages_truncated, item="passage", action="truncated")
+    PROMPT_TRIMMED.inc(report.turns_dropped, item="turn", action="dropped")
+
+
+def cache_samples(name: str, stats: Dict[str, float]) -> List[Sample]:
+    """Turn a cache's ``stats()`` into samples labelled with the cache name."""
+    samples = [
+        ("rag_cache_lookups_total", "counter", "Cache lookups by cache and result.",
+         {"cache": name, "result": "hit"}, stats.get("hits", 0)),
+        ("rag_cache_lookups_total", "counter", "Cache lookups by cache and result.",
+         {"cache": name, "result": "miss"}, stats.get("misses", 0)),
+        ("rag_cache_hit_ratio", "gauge", "Share of cache lookups that were hits.",
+         {"cache": name}, stats.get("hit_rate", 0.0)),
+    ]
+    if "size" in stats:
+        samples.append(("rag_cache_entries", "gauge", "Entries held by the cache.", {"cache": name}, stats["size"]))
+    return samples
@@ -0,0 +1,418 @@
+import argparse
+import json
+import mmap
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+SUPPORTED_DTYPES = ("int8", "float16")
+# Symlink in the index directory to the export that readers should open
+CURRENT = "current"
+# Files of exports from before exports were versioned
+LEGACY_FILES = ("vectors.npy", "scales.npy", "offsets.npy", "records.jsonl", "ids.json", "meta.json")
+
+
+class MmapIndex:
+    """Exact nearest-neighbour search over a memory-mapped embedding matrix.
+
+    Embeddings are exported from ChromaDB once into ``vectors.npy`` with
+    L2-normalized rows, either as int8 with a per-row scale or as float16.
+    Queries are answered with a blocked matrix product and ``argpartition``.
+    The file is opened read-only with ``mmap``, so every worker process on the
+    host shares the same pages of the OS page cache instead of its own copy.
+
+    The metadata and text of every row are exported too, as JSON lines in
+    ``records.jsonl`` with their byte offsets in ``offsets.npy``, so hits are
+    loaded without a round trip to ChromaDB.
+
+    Each export is written to a directory of its own and published by
+    pointing the ``current`` symlink at it, so a reader always opens a
+    complete set of files from one export.
+    """
+
+    def __init__(self, path: str = "database/mmap_index", block_rows: int = 4096, cache: bool = False):
+        """Open an exported index.
+
+        Args:
+            path: Directory ``export`` wrote to; the current export in it is opened.
+            block_rows: Rows converted to float32 at a time during a search.
+            cache: Convert the whole matrix to float32 once and keep it in this
+                process. Single queries get faster, but every process holds its
+                own copy of 4 bytes per dimension and row.
+        """
+        self.path = Path(path)
+        self.block_rows = block_rows
+        while True:
+            # Read every file from one export; a concurrent export only repoints the link
+            self.directory = Path(os.path.realpath(self.path / CURRENT))
+            try:
+                self._open(self.directory)
+                break
+            except FileNotFoundError:
+                # Deleted by later exports before it could be opened
+                if Path(os.path.realpath(self.path / CURRENT)) == self.directory:
+                    raise
+        self.matrix = self._float32(slice(0, len(self.ids))) if cache else None
+
+    def _open(self, directory: Path) -> None:
+        with open(directory / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(directory / "ids.json", "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        self.rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        self.scales = np.load(directory / "scales.npy", mmap_mode="r") if self.meta["dtype"] == "int8" else None
+        self.offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+        with open(directory / "records.jsonl", "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        """Check whether an exported index is present.
+
+        Exports from before exports were versioned count as missing.
+        """
+        return (Path(path) / CURRENT / "meta.json").exists()
+
+    @staticmethod
+    def export(
+        collection,
+        path: str = "database/mmap_index",
+        dtype: str = "int8",
+        page_size: int = 5000,
+        source_version: Optional[int] = None,
+    ) -> int:
+        """Write all embeddings of a Chroma collection to a memory-mappable matrix.
+
+        The files are written to a new directory, which then replaces the
+        current export with one atomic rename of the ``current`` symlink.
+        Processes that opened the old export keep reading it. The previous
+        export is kept for processes that resolved the link but have not opened
+        every file yet; older ones are deleted.
+
+        Args:
+            collection: ChromaDB collection to export.
+            path: Output directory.
+            dtype: ``int8`` or ``float16``. A single float16 query spends most
+                of its time converting the matrix to float32; int8 converts
+                several times faster and takes half the space.
+            page_size: Records read from Chroma per request.
+            source_version: Version of the index the export was taken from.
+
+        Returns:
+            Number of exported embeddings.
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}")
+
+        root = Path(path)
+        root.mkdir(parents=True, exist_ok=True)
+        generation = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        out = root / generation
+        out.mkdir()
+        try:
+            count = MmapIndex._write(collection, out, dtype, page_size, source_version, generation)
+        except BaseException:
+            shutil.rmtree(out, ignore_errors=True)
+            raise
+
+        link = root / f"{CURRENT}.{generation}.tmp"
+        os.symlink(generation, link)
+        previous = os.readlink(root / CURRENT) if os.path.islink(root / CURRENT) else None
+        os.replace(link, root / CURRENT)
+        MmapIndex._remove_old_exports(root, keep={generation, previous})
+        return count
+
+    @staticmethod
+    def _write(
+        collection, out: Path, dtype: str, page_size: int, source_version: Optional[int], generation: str
+    ) -> int:
+        """Write one export's files into ``out``; ``meta.json`` comes last."""
+        count = collection.count()
+
+        ids: List[str] = []
+        offsets = [0]
+        vectors = scales = None
+        with open(out / "records.jsonl", "wb") as records:
+            for offset in range(0, count, page_size):
+                page = collection.get(include=["embeddings", "metadatas", "documents"], limit=page_size, offset=offset)
+                embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                if not len(embeddings):
+                    break
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        out / "vectors.npy", mode="w+", dtype=dtype, shape=(count, embeddings.shape[1])
+                    )
+                    if dtype == "int8":
+                        scales = np.lib.format.open_memmap(
+                            out / "scales.npy", mode="w+", dtype=np.float32, shape=(count,)
+                        )
+
+                rows = slice(len(ids), len(ids) + len(embeddings))
+                if dtype == "int8":
+                    row_scales = np.maximum(np.abs(embeddings).max(axis=1), 1e-12) / 127.0
+                    vectors[rows] = np.round(embeddings / row_scales[:, None]).astype(np.int8)
+                    scales[rows] = row_scales
+                else:
+                    vectors[rows] = embeddings.astype(np.float16)
+                ids.extend(page["ids"])
+                for metadata, document in zip(page["metadatas"], page["documents"]):
+                    offsets.append(offsets[-1] + records.write(json.dumps([metadata, document]).encode("utf-8") + b"\n"))
+
+        if vectors is None:
+            raise ValueError("The collection is empty; nothing to export.")
+
+        # The collection may have shrunk while it was being read
+        if len(ids) != count:
+            raise RuntimeError("The collection changed during export; run it again.")
+
+        vectors.flush()
+        del vectors
+        if scales is not None:
+            scales.flush()
+            del scales
+        with open(out / "offsets.npy", "wb") as f:
+            np.save(f, np.asarray(offsets, dtype=np.int64))
+        with open(out / "ids.json", "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        meta = {"dtype": dtype, "count": len(ids), "source_version": source_version, "generation": generation}
+        with open(out / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return len(ids)
+
+    @staticmethod
+    def _remove_old_exports(root: Path, keep: Set[Optional[str]]) -> None:
+        """Delete finished exports other than ``keep`` and files of the old flat layout."""
+        for name in LEGACY_FILES:
+            if (root / name).is_file():
+                os.remove(root / name)
+        for entry in root.iterdir():
+            # Exports still being written have no meta.json yet
+            if entry.is_dir() and not entry.is_symlink() and entry.name not in keep and (entry / "meta.json").exists():
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def memory_footprint(self) -> int:
+        """Bytes of the mapped matrix and scales, and of the float32 cache."""
+        size = self.vectors.nbytes
+        if self.scales is not None:
+            size += self.scales.nbytes
+        if self.matrix is not None:
+            size += self.matrix.nbytes
+        return size
+
+    def _float32(self, rows) -> np.ndarray:
+        """Unit vectors of the given rows as float32."""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[rows])[..., None]
+        return block
+
+    def _search_rows(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """Find the best ``k`` rows for normalized queries, as ``(row, score)`` pairs."""
+        count = len(self.ids)
+        k = min(k, count)
+        if not k:
+            return [[] for _ in queries]
+
+        if self.matrix is not None:
+            scores = queries @ self.matrix.T
+        else:
+            scores = np.empty((len(queries), count), dtype=np.float32)
+            for start in range(0, count, self.block_rows):
+                end = min(start + self.block_rows, count)
+                block = np.asarray(self.vectors[start:end], dtype=np.float32)
+                scores[:, start:end] = queries @ block.T
+                if self.scales is not None:
+                    scores[:, start:end] *= self.scales[start:end]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(int(i), float(scores[row, i])) for i in ordered])
+        return results
+
+    @staticmethod
+    def _normalize(queries) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    def search(self, queries: np.ndarray, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Find the most similar rows for a batch of queries.
+
+        Args:
+            queries: Query embeddings, shape ``(n, dim)`` or ``(dim,)``.
+            k: Number of results per query.
+
+        Returns:
+            For each query, ``(id, cosine similarity)`` pairs, best first.
+        """
+        return [
+            [(self.ids[row], score) for row, score in hits]
+            for hits in self._search_rows(self._normalize(queries), k)
+        ]
+
+    def records(self, rows: Sequence[int]) -> List[Tuple[Dict, str]]:
+        """Load the ``(metadata, document)`` of rows from the side store."""
+        return [
+            tuple(json.loads(self._records[self.offsets[row]:self.offsets[row + 1]]))
+            for row in rows
+        ]
+
+    def query(
+        self, queries, k: int = 10, vectors: Optional[Dict[str, np.ndarray]] = None
+    ) -> List[List[Tuple[str, float, Dict, str]]]:
+        """Search and load the hits, like ``collection.query`` does.
+
+        Cosine similarity is converted to squared L2 between unit vectors, so
+        distances match what the collection itself reports for normalized
+        embeddings.
+
+        Args:
+            queries: Query embeddings, shape ``(n, dim)`` or ``(dim,)``.
+            k: Number of results per query.
+            vectors: Receives the hits' unit vectors when given.
+
+        Returns:
+            For each query, ``(id, distance, metadata, document)`` tuples, best first.
+        """
+        hits = self._search_rows(self._normalize(queries), k)
+        rows = sorted({row for query_hits in hits for row, _ in query_hits})
+        loaded = dict(zip(rows, self.records(rows)))
+        if vectors is not None and rows:
+            vectors.update(zip((self.ids[row] for row in rows), self._float32(rows)))
+        return [
+            [(self.ids[row], 2.0 - 2.0 * score, *loaded[row]) for row, score in query_hits]
+            for query_hits in hits
+        ]
+
+    def fetch(
+        self, ids: Sequence[str], embedding, vectors: Dict[str, np.ndarray]
+    ) -> Dict[str, Tuple[str, float, Dict, str]]:
+        """Load given rows and their distance to a query, for hits found elsewhere.
+
+        Ids missing from the export are left out. The rows' unit vectors are
+        added to ``vectors``.
+        """
+        rows = [self.rows[doc_id] for doc_id in ids if doc_id in self.rows]
+        if not rows:
+            return {}
+        hit_vectors = self._float32(rows)
+        scores = hit_vectors @ self._normalize(embedding)[0]
+        vectors.update(zip((self.ids[row] for row in rows), hit_vectors))
+        return {
+            self.ids[row]: (self.ids[row], float(2.0 - 2.0 * score), metadata, document)
+            for row, score, (metadata, document) in zip(rows, scores, self.records(rows))
+        }
+
+
+def compare_with_chroma(
+    index: MmapIndex, collection, n_queries: int = 200, k: int = 10, batch_size: int = 32
+) -> Dict[str, float]:
+    """Measure dense retrieval latency of the mapped index against ChromaDB.
+
+    Both sides return what the retriever needs from a dense search: ids,
+    distances, metadata, documents and the hits' embeddings for diverse
+    selection. Queries are perturbed copies of indexed rows, so no embedding
+    model is needed.
+
+    Returns:
+        Footprint, per-query latency and QPS of both backends and top-1
+        agreement between them.
+    """
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(index.ids), size=min(n_queries, len(index.ids)), replace=False)
+    queries = index._float32(np.sort(rows))
+    queries += rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+
+    def timed(search) -> Tuple[List, List[float]]:
+        results, latencies = [], []
+        for query in queries:
+            started = time.perf_counter()
+            results.append(search(query))
+            latencies.append(time.perf_counter() - started)
+        return results, latencies
+
+    include = ["metadatas", "documents", "distances", "embeddings"]
+    chroma, chroma_latencies = timed(
+        lambda query: collection.query(query_embeddings=[query.tolist()], n_results=k, include=include)
+    )
+    mmap_results, mmap_latencies = timed(lambda query: index.query(query, k, vectors={}))
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        index.query(queries[start:start + batch_size], k, vectors={})
+    batched_seconds = time.perf_counter() - started
+
+    chroma_top = [result["ids"][0][0] if result["ids"][0] else None for result in chroma]
+    mmap_top = [hits[0][0][0] if hits[0] else None for hits in mmap_results]
+    agreement = np.mean([a == b for a, b in zip(chroma_top, mmap_top)])
+    return {
+        "vectors": len(index.ids),
+        "dtype": index.meta["dtype"],
+        "float32_cache": index.matrix is not None,
+        "footprint_mb": index.memory_footprint() / 2 ** 20,
+        "chroma_p50_ms": float(np.percentile(chroma_latencies, 50) * 1000),
+        "chroma_p95_ms": float(np.percentile(chroma_latencies, 95) * 1000),
+        "mmap_p50_ms": float(np.percentile(mmap_latencies, 50) * 1000),
+        "mmap_p95_ms": float(np.percentile(mmap_latencies, 95) * 1000),
+        "chroma_qps": len(queries) / sum(chroma_latencies),
+        "mmap_qps": len(queries) / sum(mmap_latencies),
+        "mmap_batched_qps": len(queries) / batched_seconds,
+        "top1_agreement": float(agreement),
+    }
+
+
+def _open_collection(database_path: str, collection_name: str):
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=database_path, settings=Settings())
+    return client.get_collection(collection_name)
+
+
+def export_from_database(
+    database_path: str = "database",
+    collection_name: str = "embeddings",
+    dtype: str = "int8",
+) -> int:
+    """Export the application's collection to ``<database_path>/mmap_index``.
+
+    The manifest's mtime is recorded so a stale export can be detected.
+    """
+    collection = _open_collection(database_path, collection_name)
+    try:
+        source_version = os.stat(os.path.join(database_path, "manifest.json")).st_mtime_ns
+    except OSError:
+        source_version = None
+    count = MmapIndex.export(
+        collection, os.path.join(database_path, "mmap_index"), dtype=dtype, source_version=source_version
+    )
+    print(f"Exported {count} embeddings as {dtype}.")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and benchmark the memory-mapped embedding index")
+    parser.add_argument("--database", default="database", help="ChromaDB directory")
+    parser.add_argument("--collection", default="embeddings", help="Collection name")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="int8", help="Storage precision")
+    parser.add_argument("--export", action="store_true", help="Export the collection")
+    parser.add_argument("--bench", action="store_true", help="Compare retrieval latency against ChromaDB")
+    parser.add_argument("--cache", action="store_true", help="Benchmark with the float32 matrix cached in memory")
+    args = parser.parse_args()
+
+    if args.export:
+        export_from_database(args.database, args.collection, args.dtype)
+    if args.bench:
+        report = compare_with_chroma(
+            MmapIndex(os.path.join(args.database, "mmap_index"), cache=args.cache),
+            _open_collection(args.database, args.collection),
+        )
+        print(json.dumps(report, indent=2))
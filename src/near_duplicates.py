@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import sqlite3
+import uuid
+from typing import List, Optional, Sequence
+
+SIMHASH_BITS = 64
+# Four 16-bit bands: two hashes within 3 differing bits share at least one band
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+MAX_DISTANCE = 3
+# Members of a cluster compared per band; a cluster's members all carry its id
+CANDIDATES_PER_BAND = 32
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash of a text's lowercase word shingles.
+
+    Texts that differ in a few words, in whitespace or in case get hashes
+    that differ in only a few bits.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) > shingle_size:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    else:
+        shingles = [" ".join(words)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _signed(value: int) -> int:
+    """Map an unsigned 64-bit value to SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class NearDuplicateIndex:
+    """Persistent SimHash index that groups near-identical chunks into clusters.
+
+    Built during ingestion next to the Chroma collection. Each chunk gets the
+    cluster of the first indexed chunk whose SimHash is within
+    ``max_distance`` bits of its own, or starts a new cluster with a random
+    id. Cluster ids never equal a chunk id: otherwise a chunk re-indexed with
+    other text under the id of a cluster's first member would join that
+    cluster. Candidates are found through the hash's 16-bit bands, so a
+    lookup never scans the whole corpus. The cluster id is stored in the chunk's
+    metadata, where retrieval uses it to drop duplicate passages.
+    """
+
+    def __init__(self, path: str = "database/near_duplicates.sqlite", max_distance: int = MAX_DISTANCE):
+        """Open the index, creating its tables if needed.
+
+        Args:
+            path: SQLite database file.
+            max_distance: Differing bits up to which two chunks are near-duplicates;
+                at most ``BANDS - 1`` for every such pair to be found.
+        """
+        self.path = path
+        self.max_distance = min(max_distance, BANDS - 1)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.duplicates = 0
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id TEXT PRIMARY KEY, filename TEXT, hash INTEGER NOT NULL, cluster TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_filename ON chunks (filename)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS bands ("
+                "band INTEGER NOT NULL, value INTEGER NOT NULL, id TEXT NOT NULL, "
+                "PRIMARY KEY (band, value, id)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS bands_id ON bands (id)")
+
+    def _find_cluster(self, doc_id: str, value: int) -> Optional[str]:
+        for band in range(BANDS):
+            key = value >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1)
+            rows = self._conn.execute(
+                "SELECT c.hash, c.cluster FROM bands b JOIN chunks c ON c.id = b.id "
+                "WHERE b.band = ? AND b.value = ? AND b.id != ? LIMIT ?",
+                (band, key, doc_id, CANDIDATES_PER_BAND),
+            )
+            for other, cluster in rows:
+                if hamming(value, other & ((1 << 64) - 1)) <= self.max_distance:
+                    return cluster
+        return None
+
+    def assign(
+        self, ids: Sequence[str], documents: Sequence[str], filenames: Optional[Sequence[str]] = None
+    ) -> List[str]:
+        """Index chunks and return the cluster id of each.
+
+        Chunks are compared with everything indexed before them, including
+        earlier chunks of the same call. Re-indexing an id replaces it. Chunks
+        that join an existing cluster are counted in ``duplicates``.
+
+        Args:
+            ids: Chunk ids, shared with the Chroma collection.
+            documents: Chunk texts.
+            filenames: Source file of each chunk, used for deletes by file.
+
+        Returns:
+            Cluster id per chunk.
+        """
+        clusters = []
+        with self._conn:
+            self._delete(ids)
+            for i, (doc_id, document) in enumerate(zip(ids, documents)):
+                value = simhash(document)
+                cluster = self._find_cluster(doc_id, value)
+                if cluster is None:
+                    cluster = f"cluster-{uuid.uuid4().hex}"
+                else:
+                    self.duplicates += 1
+                self._conn.execute(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                    (doc_id, filenames[i] if filenames else None, _signed(value), cluster),
+                )
+                self._conn.executemany(
+                    "INSERT INTO bands VALUES (?, ?, ?)",
+                    (
+                        (band, value >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1), doc_id)
+                        for band in range(BANDS)
+                    ),
+                )
+                clusters.append(cluster)
+        return clusters
+
+    def _delete(self, ids: Sequence[str]) -> None:
+        for start in range(0, len(ids), 500):
+            part = list(ids[start:start + 500])
+            placeholders = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM bands WHERE id IN ({placeholders})", part)
+            self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", part)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Remove chunks by id."""
+        with self._conn:
+            self._delete(ids)
+
+    def delete_file(self, filename: str) -> None:
+        """Remove every chunk of a source file."""
+        ids = [doc_id for (doc_id,) in self._conn.execute("SELECT id FROM chunks WHERE filename = ?", (filename,))]
+        self.delete(ids)
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
@@ -1,13 +1,70 @@
+import csv
+import io
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass, replace
+from queue import Empty
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 import pandas as pd
 import pdfplumber
+from src.chunker import TextChunker
+from src.embedding_cache import EmbeddingCache, open_embedding_cache
 from src.embeddings import VectorStore
+from src.lexical_index import LexicalIndex
+from src.manifest import IndexManifest
+from src.near_duplicates import NearDuplicateIndex
+
+
+class ExtractionError(Exception):
+    """Raised after walking a PDF whose pages could not all be extracted."""
+
+
+@dataclass
+class PageContent:
+    """A text or table record extracted from a PDF page, or a chunk of one."""
+    filename: str
+    page: int
+    kind: str
+    content: str
+    index: int = 0
+    chunk: Optional[int] = None
+    start: int = 0
+    end: int = 0
+
+    @property
+    def id(self) -> str:
+        """Stable document id for the record."""
+        if self.kind == "table":
+            base = f"{self.filename}_page_{self.page}_table_{self.index}"
+        else:
+            base = f"{self.filename}_page_{self.page}"
+        return base if self.chunk is None else f"{base}_chunk_{self.chunk}"
+
+    @property
+    def metadata(self) -> dict:
+        """Metadata stored alongside the record's embedding."""
+        metadata = {"filename": self.filename, "page": self.page, "kind": self.kind}
+        if self.chunk is not None:
+            metadata.update(chunk=self.chunk, start=self.start, end=self.end)
+        return metadata
+
+    def split(self, chunker: TextChunker) -> List["PageContent"]:
+        """Split the record into token-bounded chunks with character offsets."""
+        return [
+            replace(self, content=chunk.text, chunk=chunk.index, start=chunk.start, end=chunk.end)
+            for chunk in chunker.split(self.content)
+        ]
 
 
 class PDFProcessor:
     """Handles PDF text and table extraction."""
 
+    # Pages with fewer ruling lines/rectangles than this cannot hold a table
+    # the default "lines" table strategy would find, so detection is skipped.
+    MIN_TABLE_EDGES = 4
+
     def __init__(self):
         """Initialize the PDFProcessor."""
         pass
@@ -18,7 +75,8 @@ class PDFProcessor:
         try:
             from pypdf import PdfReader
             reader = PdfReader(pdf_path)
-            return [page.extract_text().strip() for page in reader.pages if page.extract_text()]
+            texts = (page.extract_text() for page in reader.pages)
+            return [text.strip() for text in texts if text]
         except Exception as e:
             print(f"Error extracting text from {pdf_path.name}: {e}")
             return []
@@ -45,38 +103,420 @@ class PDFProcessor:
         tables = self.extract_tables(pdf_path)
         return text + tables
 
+    @classmethod
+    def likely_has_tables(cls, page) -> bool:
+        """Cheap check for ruling lines before running full table detection."""
+        return len(page.lines) + len(page.rects) >= cls.MIN_TABLE_EDGES
 
-def process_pdf_directory(directory: str) -> None:
-    """Process all PDFs in a directory and store their embeddings."""
-    pdf_dir = Path(directory)
+    @staticmethod
+    def table_to_csv(table: List[List[str]]) -> str:
+        """Serialize an extracted table the same way ``DataFrame.to_csv`` did."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows([["" if cell is None else cell for cell in row] for row in table])
+        return buffer.getvalue()
+
+    def iter_content(self, pdf_path: Path) -> Iterator[PageContent]:
+        """Walk the PDF once, yielding text and table records page by page.
+
+        The file is opened a single time; each page's layout is parsed once and
+        shared by text and table extraction, then released before moving on.
+        A page that fails is reported and skipped, so the rest of the file is
+        still extracted.
+
+        Args:
+            pdf_path: Path to the PDF file.
+
+        Yields:
+            ``PageContent`` records with 1-based page numbers.
+
+        Raises:
+            ExtractionError: If the file cannot be read, or after the last
+                page if any page failed.
+        """
+        failed = []
+        try:
+            with pdfplumber.open(pdf_path) as pdf:
+                for page_number, page in enumerate(pdf.pages, start=1):
+                    try:
+                        text = page.extract_text()
+                        if text and text.strip():
+                            yield PageContent(pdf_path.name, page_number, "text", text.strip())
+
+                        if self.likely_has_tables(page):
+                            for index, table in enumerate(page.extract_tables(), start=1):
+                                yield PageContent(
+                                    pdf_path.name, page_number, "table", self.table_to_csv(table), index
+                                )
+                    except Exception as e:
+                        print(f"Error extracting page {page_number} of {pdf_path.name}: {e}")
+                        failed.append(page_number)
+                    finally:
+                        page.close()
+        except Exception as e:
+            raise ExtractionError(f"Could not read {pdf_path.name}: {e}") from e
+        if failed:
+            raise ExtractionError(f"{len(failed)} pages of {pdf_path.name} could not be extracted")
+
+
+class _EmbeddingSink:
+    """Splits extracted records into chunks and embeds them in large batches.
+
+    Chunks whose hash matches the manifest are not re-embedded, and chunks
+    whose text is in the embedding cache are not encoded. Every written chunk
+    gets a near-duplicate cluster id in its metadata. A file is committed to
+    the manifest only once all of its chunks are written. A file that failed
+    part-way is never committed and keeps its old ids, so the next run
+    extracts it again.
+    """
+
+    def __init__(self, store: VectorStore, manifest: IndexManifest, batch_size: int,
+                 chunker: TextChunker, lexical: LexicalIndex, near_duplicates: NearDuplicateIndex,
+                 cache: Optional[EmbeddingCache] = None):
+        self.store = store
+        self.cache = cache
+        self.manifest = manifest
+        self.lexical = lexical
+        self.near_duplicates = near_duplicates
+        self.chunker = chunker
+        self.batch_size = batch_size
+        self.pending: List[PageContent] = []
+        self.file_info: Dict[str, Tuple[os.stat_result, str]] = {}
+        self.chunks: Dict[str, Dict[str, str]] = {}
+        self.unwritten: Dict[str, int] = {}
+        self.finished: List[str] = []
+        self.incomplete = set()
+        self.records = 0
+        self.reused = 0
+        self.deleted = 0
+        self.pages = 0
+        self.files = 0
+        self.started = time.perf_counter()
+
+    def begin_file(self, filename: str, stat: os.stat_result, sha256: str) -> None:
+        """Register a file that is about to be extracted."""
+        self.file_info[filename] = (stat, sha256)
+        self.chunks[filename] = {}
+        self.unwritten[filename] = 0
+
+    def add(self, records: List[PageContent]) -> None:
+        """Queue changed chunks, embedding them whenever a full batch is ready."""
+        for record in (chunk for page_record in records for chunk in page_record.split(self.chunker)):
+            digest = IndexManifest.chunk_hash(record.content)
+            self.chunks[record.filename][record.id] = digest
+
+            entry = self.manifest.get(record.filename)
+            if entry and entry["chunks"].get(record.id) == digest:
+                self.reused += 1
+                continue
+
+            self.pending.append(record)
+            self.unwritten[record.filename] += 1
+
+        while len(self.pending) >= self.batch_size:
+            batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            self._write(batch)
+
+    def flush(self) -> None:
+        """Embed whatever is still queued."""
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self._write(batch)
+
+    def _write(self, batch: List[PageContent]) -> None:
+        documents = [record.content for record in batch]
+        ids = [record.id for record in batch]
+        filenames = [record.filename for record in batch]
+        embeddings = self.store.embed_documents(documents, cache=self.cache)
+        clusters = self.near_duplicates.assign(ids, documents, filenames)
+        self.store.store_embeddings(
+            embeddings,
+            [{**record.metadata, "cluster": cluster} for record, cluster in zip(batch, clusters)],
+            documents=documents,
+            ids=ids,
+        )
+        self.lexical.add(ids, documents, filenames)
+        self.records += len(batch)
+        for record in batch:
+            self.unwritten[record.filename] -= 1
+        self._commit_ready()
+
+    def finish_file(self, filename: str, pages: int, total: int, complete: bool = True) -> None:
+        """Record an extracted file, drop its orphaned ids and report progress.
+
+        Args:
+            filename: Name of the PDF.
+            pages: Number of pages seen.
+            total: Number of files in the run, for the progress line.
+            complete: False if extraction failed part-way. Ids that were not
+                seen may then still exist, so nothing is deleted and the file
+                is left out of the manifest.
+        """
+        orphans = [
+            chunk_id for chunk_id in self.manifest.chunk_ids(filename)
+            if chunk_id not in self.chunks[filename]
+        ]
+        if not complete:
+            self.incomplete.add(filename)
+            print(f"{filename} was not fully extracted and will be retried on the next run.")
+        elif orphans:
+            self.store.collection.delete(ids=orphans)
+            self.lexical.delete(orphans)
+            self.near_duplicates.delete(orphans)
+            self.deleted += len(orphans)
+
+        self.finished.append(filename)
+        self._commit_ready()
+
+        self.files += 1
+        self.pages += pages
+        if not pages:
+            print(f"No content found in {filename}, skipping.")
+        elapsed = time.perf_counter() - self.started
+        rate = self.pages / elapsed if elapsed > 0 else 0.0
+        print(f"[{self.files}/{total}] {filename}: {pages} pages ({rate:.1f} pages/s)")
+
+    def _commit_ready(self) -> None:
+        """Move finished files with no unwritten records into the manifest."""
+        still_pending = []
+        for filename in self.finished:
+            if self.unwritten[filename]:
+                still_pending.append(filename)
+                continue
+            stat, sha256 = self.file_info.pop(filename)
+            chunks = self.chunks.pop(filename)
+            if filename not in self.incomplete:
+                self.manifest.update(filename, stat, sha256, chunks)
+            del self.unwritten[filename]
+        self.finished = still_pending
+
+    def report(self) -> None:
+        """Print the overall throughput of the run."""
+        elapsed = time.perf_counter() - self.started
+        rate = self.pages / elapsed if elapsed > 0 else 0.0
+        print(
+            f"Indexed {self.records} records ({self.reused} unchanged, {self.deleted} removed) "
+            f"from {self.pages} pages in {self.files} files in {elapsed:.1f}s ({rate:.1f} pages/s); "
+            f"{self.near_duplicates.duplicates} were near-duplicates of other chunks."
+        )
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(
+                f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%}), {stats['size']} entries, {stats['evictions']} evicted."
+            )
+
+
+_worker_queue = None
+
+
+def _init_worker(queue) -> None:
+    """Give each extraction worker the shared result queue."""
+    global _worker_queue
+    _worker_queue = queue
+
+
+def _extract_worker(pdf_path: str, chunk_size: int) -> None:
+    """Extract one PDF in a worker process and stream its records to the queue."""
+    path = Path(pdf_path)
     processor = PDFProcessor()
-    store = VectorStore()
+    pages = 0
+    chunk = []
+    complete = False
+    # Lets the consumer notice if this process dies before it is done
+    _worker_queue.put(("start", path.name, os.getpid()))
+    try:
+        for record in processor.iter_content(path):
+            pages = max(pages, record.page)
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                _worker_queue.put(("records", path.name, chunk))
+                chunk = []
+        complete = True
+    except ExtractionError as e:
+        print(e)
+    finally:
+        if chunk:
+            _worker_queue.put(("records", path.name, chunk))
+        _worker_queue.put(("done", path.name, (pages, complete)))
 
-    for pdf_path in pdf_dir.glob("*.pdf"):
-        print(f"\nProcessing {pdf_path.name}...")
 
-        # Extract content
-        content = processor.extract_content(pdf_path)
+def _plan_files(
+    store: VectorStore,
+    lexical: LexicalIndex,
+    near_duplicates: NearDuplicateIndex,
+    manifest: IndexManifest,
+    pdf_dir: Path,
+) -> List[Tuple[Path, os.stat_result, str]]:
+    """Decide which PDFs need extraction and drop files that were removed.
+
+    Files whose size and mtime match the manifest are skipped without being
+    opened; files whose content hash still matches only get their stat
+    refreshed.
+
+    Returns:
+        List of ``(path, stat, sha256)`` for new or modified files.
+    """
+    pending = []
+    present = set()
+    for pdf_path in sorted(pdf_dir.glob("*.pdf")):
+        present.add(pdf_path.name)
+        stat = pdf_path.stat()
+        if manifest.stat_matches(pdf_path.name, stat):
+            continue
 
-        # Skip if no content
-        if not content:
-            print(f"No content found in {pdf_path.name}, skipping.")
+        sha256 = IndexManifest.file_hash(pdf_path)
+        entry = manifest.get(pdf_path.name)
+        if entry is not None and entry["sha256"] == sha256:
+            manifest.update(pdf_path.name, stat, sha256)
             continue
 
-        # Prepare metadata
-        metadata = [{"filename": pdf_path.name, "page": i + 1} for i in range(len(content))]
-        document_ids = [f"{pdf_path.name}_page_{i + 1}" for i in range(len(content))]
+        if entry is None:
+            # Not tracked yet: clear anything an older run stored for this name
+            store.collection.delete(where={"filename": pdf_path.name})
+            lexical.delete_file(pdf_path.name)
+            near_duplicates.delete_file(pdf_path.name)
+        pending.append((pdf_path, stat, sha256))
 
-        # Check for existing embeddings
-        existing_embeddings = store.collection.get(ids=document_ids)
-        if existing_embeddings and existing_embeddings.get("ids"):
-            print(f"Embeddings already exist for {pdf_path.name}, skipping.")
+    for filename in list(manifest.files):
+        if filename not in present:
+            print(f"{filename} was removed, deleting its embeddings.")
+            manifest.remove(filename)
+            store.collection.delete(where={"filename": filename})
+            lexical.delete_file(filename)
+            near_duplicates.delete_file(filename)
+
+    skipped = len(present) - len(pending)
+    if skipped:
+        print(f"{skipped} files unchanged, skipping.")
+    return pending
+
+
+def _ingest_sequential(processor: PDFProcessor, sink: _EmbeddingSink, files: List[Path]) -> None:
+    """Extract and embed files one after another in this process."""
+    for pdf_path in files:
+        print(f"\nProcessing {pdf_path.name}...")
+        pages = 0
+        complete = False
+        try:
+            for record in processor.iter_content(pdf_path):
+                pages = max(pages, record.page)
+                sink.add([record])
+            complete = True
+        except ExtractionError as e:
+            print(e)
+        sink.finish_file(pdf_path.name, pages, len(files), complete)
+
+
+def _check_workers(running: Dict[str, int]) -> None:
+    """Raise if a worker died without finishing its file.
+
+    A worker killed outright, e.g. by the OOM killer, is replaced by the
+    pool, but the file it was extracting is lost and its result would never
+    arrive.
+    """
+    for filename, pid in running.items():
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            raise RuntimeError(f"The worker extracting {filename} (pid {pid}) died before finishing it.") from None
+
+
+def _ingest_parallel(pool, queue, sink: _EmbeddingSink, files: List[Path], chunk_size: int) -> None:
+    """Extract files in worker processes while this process embeds their records."""
+    # One file per task, so a dead worker can only lose the file it announced
+    result = pool.starmap_async(_extract_worker, [(str(path), chunk_size) for path in files], chunksize=1)
+    running: Dict[str, int] = {}
+    done = 0
+    while done < len(files):
+        try:
+            kind, filename, payload = queue.get(timeout=1)
+        except Empty:
+            if result.ready() and not result.successful():
+                result.get()
+            _check_workers(running)
             continue
+        if kind == "start":
+            running[filename] = payload
+        elif kind == "records":
+            sink.add(payload)
+        else:
+            done += 1
+            running.pop(filename, None)
+            pages, complete = payload
+            sink.finish_file(filename, pages, len(files), complete)
+    result.get()
+
+
+def process_pdf_directory(
+    directory: str, workers: int = 1, batch_size: int = 128, chunk_overlap: int = 32
+) -> None:
+    """Process all PDFs in a directory and store their embeddings.
+
+    Content is streamed page by page, split into overlapping chunks that fit
+    the embedding model, and embedded in batches, so a document is never held
+    in memory as a whole. With ``workers > 1`` PDFs are extracted in
+    a pool of processes that feed a single embedding stage in this process.
+
+    A manifest in the database folder tracks what was indexed, so unchanged
+    files are skipped, only changed chunks are re-embedded and ids that no
+    longer exist are deleted. A BM25 index of the same chunks is kept in sync
+    for hybrid retrieval, and a SimHash index groups near-identical chunks.
+    Embeddings are also kept in a content-addressed cache outside the
+    database (see ``EmbeddingCache``), so duplicated text and rebuilds of a
+    deleted database are not encoded again.
+
+    Args:
+        directory: Folder containing the PDF files.
+        workers: Number of extraction processes.
+        batch_size: Number of chunks to embed per model call.
+        chunk_overlap: Number of tokens shared by consecutive chunks.
+    """
+    pdf_dir = Path(directory)
+    pool = queue = cache = None
+    if workers > 1:
+        # Fork the workers before the embedding model and database are opened,
+        # so they do not inherit the model weights or SQLite connections.
+        # torch itself is already imported through src.embeddings.
+        queue = multiprocessing.Queue(maxsize=workers * 4)
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(queue,))
+
+    try:
+        store = VectorStore()
+        manifest = IndexManifest(str(Path(store.database_path) / "manifest.json"))
+        lexical = LexicalIndex(str(Path(store.database_path) / "bm25.sqlite"))
+        near_duplicates = NearDuplicateIndex(str(Path(store.database_path) / "near_duplicates.sqlite"))
+        plan = _plan_files(store, lexical, near_duplicates, manifest, pdf_dir)
+        cache = open_embedding_cache()
+        sink = _EmbeddingSink(
+            store, manifest, batch_size, TextChunker.from_model(store.model, chunk_overlap), lexical,
+            near_duplicates, cache,
+        )
+        for pdf_path, stat, sha256 in plan:
+            sink.begin_file(pdf_path.name, stat, sha256)
+        files = [pdf_path for pdf_path, _, _ in plan]
+
+        if pool is not None and files:
+            _ingest_parallel(pool, queue, sink, files, chunk_size=max(1, batch_size // workers))
+        else:
+            _ingest_sequential(PDFProcessor(), sink, files)
 
-        # Create and store embeddings
-        embeddings = store.create_embeddings(content)
-        store.store_embeddings(embeddings, metadata, documents=content)
-        print(f"Successfully processed and stored embeddings for {pdf_path.name}.")
+        sink.flush()
+        manifest.save()
+        sink.report()
+    except BaseException:
+        # Workers may be blocked on a full queue; do not wait for them
+        if pool is not None:
+            pool.terminate()
+        raise
+    else:
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.join()
+        if cache is not None:
+            cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+import glob
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from metrics import REGISTRY, mark_process_dead
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_LIFETIME = 5.0
+
+
+def _reset_chroma() -> None:
+    """Drop ChromaDB clients a parent process may have cached before the fork."""
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return
+    SharedSystemClient.clear_system_cache()
+
+
+def _run_worker(sock: socket.socket, host: str, port: int, workers: int) -> None:
+    """Serve on the shared socket from a forked worker while the app loads.
+
+    The worker answers /healthz and /readyz as soon as it starts, so a load
+    balancer sees a 503 rather than a refused connection until the model is
+    loaded. A worker whose app fails to load exits to be restarted.
+    """
+    from werkzeug.serving import make_server
+
+    # The parent stops the workers with SIGTERM; Ctrl+C reaches the whole group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # Split the cores between workers unless the thread count is configured
+    if not os.getenv("EMBEDDING_THREADS"):
+        os.environ["EMBEDDING_THREADS"] = str(max(1, (os.cpu_count() or 1) // workers))
+
+    _reset_chroma()
+    import webserver
+
+    server = make_server(host, port, webserver.app, threaded=True, fd=sock.fileno())
+
+    def stop(*_) -> None:
+        # shutdown() must not run on the serving thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    # Finish in-flight requests on SIGTERM
+    signal.signal(signal.SIGTERM, stop)
+    webserver.load_in_background(on_error=stop)
+    print(f"Worker {os.getpid()} serving while the model loads")
+    server.serve_forever()
+    REGISTRY.flush()
+    if webserver._load_error is not None:
+        raise RuntimeError("The app failed to load") from webserver._load_error
+
+
+def serve(host: str = "0.0.0.0", port: int = 5000, workers: int = 2) -> None:
+    """Serve the app from ``workers`` forked processes sharing one socket.
+
+    The parent binds the socket and loads the embedding model weights, then
+    forks. Workers share the weights copy-on-write and each opens its own
+    ChromaDB client, SQLite connections, event loop and batcher thread, none
+    of which survive a fork. Workers that exit are restarted until the parent
+    receives SIGINT or SIGTERM.
+
+    Workers write their metrics to ``METRICS_DIR``, a temporary directory
+    unless set, and ``/metrics`` on any worker reports the sum over all of
+    them, including workers that have exited.
+
+    Args:
+        host: Interface to bind.
+        port: Port to bind.
+        workers: Number of worker processes.
+    """
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    metrics_dir = os.getenv("METRICS_DIR")
+    temporary_metrics_dir = not metrics_dir
+    if metrics_dir:
+        # Values left by an earlier run would be added to this one's
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(path)
+    else:
+        metrics_dir = os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="rag-metrics-")
+
+    from embeddings import preload_model
+
+    started = time.perf_counter()
+    if preload_model():
+        print(f"Embedding model loaded in {time.perf_counter() - started:.1f}s; forking {workers} workers")
+
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(sock, host, port, workers)
+            except BaseException:
+                import traceback
+
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(*_) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"Serving on http://{host}:{port} with {workers} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = children.pop(pid, None)
+        if started_at is not None:
+            mark_process_dead(metrics_dir, pid)
+        if stopping or started_at is None:
+            continue
+        print(f"Worker {pid} exited with status {status}; restarting")
+        if time.monotonic() - started_at < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        if not stopping:
+            spawn()
+
+    sock.close()
+    if temporary_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
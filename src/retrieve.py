@@ -1,6 +1,15 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 from embeddings import VectorStore
-import chromadb
-from chromadb.config import DEFAULT_TENANT, DEFAULT_DATABASE, Settings
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from metrics import EMBEDDING_BATCH_SIZE, span
+from mmap_index import CURRENT, MmapIndex
+
+logger = logging.getLogger(__name__)
 
 
 def print_collection_info(collection):
@@ -22,72 +31,474 @@ def print_collection_info(collection):
     except Exception as e:
         print(f"Error getting collection info: {str(e)}")
 
-def search_similar_text(search_text: str, n_results: int = 3):
-    """Search for similar text with detailed results."""
-    store = VectorStore()
-
-    client = chromadb.PersistentClient(
-        path="database",
-        settings=Settings(),
-        tenant=DEFAULT_TENANT,
-        database=DEFAULT_DATABASE,
-    )
-        
-    store.collection = client.get_collection("embeddings")
-    
-    print(f"\nSearching for text similar to: '{search_text}'")
-    
-    try:
-        # Create embedding for search text
-        search_embedding = store.create_embeddings(search_text)
-        search_embedding_np = search_embedding.cpu().numpy()
-        
+class Retriever:
+    """Process-wide retriever that keeps one warm embedding model and one client.
+
+    Building a ``VectorStore`` loads the SentenceTransformer and opens the
+    ChromaDB client, so it should happen once per process rather than once per
+    chat turn. A single ``Retriever`` is safe to share between request threads.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "embeddings",
+        database_path: str = "database",
+        hybrid: bool = True,
+        overfetch: int = 4,
+        backend: Optional[str] = None,
+        diverse: bool = True,
+        mmr_lambda: float = 0.7,
+    ):
+        """Initialize the retriever and load the embedding model.
+
+        Args:
+            collection_name: Name of the ChromaDB collection to search.
+            database_path: Path to the persistent database.
+            hybrid: Combine dense results with the BM25 index built at ingestion.
+            overfetch: Candidates fetched from each index per requested result.
+            backend: ``chroma`` or ``mmap`` for dense search; read from
+                ``VECTOR_BACKEND`` when omitted. ``mmap`` falls back to Chroma
+                until ``python src/mmap_index.py --export`` has been run.
+            diverse: Over-fetch and return distinct passages; see ``_select``.
+            mmr_lambda: Weight of relevance against novelty in diverse selection;
+                1.0 only drops near-duplicate clusters.
+        """
+        self.collection_name = collection_name
+        self.database_path = database_path
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._reloading = threading.Event()
+        self._loaded_from = self._files_version()
+        self.overfetch = overfetch
+        self.diverse = diverse
+        self.mmr_lambda = mmr_lambda
+        self.store = VectorStore(
+            collection_name=collection_name,
+            database_path=database_path,
+        )
+        if self.store.batcher is not None:
+            self.store.batcher.on_batch = EMBEDDING_BATCH_SIZE.observe
+        self.lexical = LexicalIndex(os.path.join(database_path, "bm25.sqlite")) if hybrid else None
+        self.backend = backend or os.getenv("VECTOR_BACKEND", "chroma")
+        self.mmap_index: Optional[MmapIndex] = None
+        if self.backend == "mmap":
+            self._open_mmap_index()
+
+    def _open_mmap_index(self) -> None:
+        path = os.path.join(self.database_path, "mmap_index")
+        if not MmapIndex.exists(path):
+            logger.info("No memory-mapped index found; searching ChromaDB instead.")
+            self.mmap_index = None
+            return
+        # Trades a private float32 copy of the matrix for faster single queries
+        self.mmap_index = MmapIndex(path, cache=os.getenv("MMAP_FLOAT32_CACHE") == "1")
+        if self.mmap_index.meta.get("source_version") != self.index_version()[0]:
+            logger.warning("Memory-mapped index is older than the manifest; re-run the export.")
+
+    def reload(self) -> None:
+        """Re-open the collection after the index has been rebuilt.
+
+        The embedding model stays loaded; the ChromaDB client and the
+        memory-mapped index are opened again. The BM25 index needs no reload,
+        since every query reads the SQLite file as committed by ingestion.
+        """
+        with self._lock:
+            self._reloading.set()
+            try:
+                self._loaded_from = self._files_version()
+                self.store.reopen()
+                if self.backend == "mmap":
+                    self._open_mmap_index()
+                self._generation += 1
+            finally:
+                self._reloading.clear()
+
+    def _files_version(self) -> Tuple[int, Optional[str]]:
+        """The manifest's mtime and the current memory-mapped export."""
+        try:
+            export = os.readlink(os.path.join(self.database_path, "mmap_index", CURRENT))
+        except OSError:
+            export = None
+        return self.index_version()[0], export
+
+    def reload_if_changed(self) -> bool:
+        """Reload if ingestion or an export changed the files since the last load.
+
+        Returns:
+            Whether the retriever was reloaded.
+        """
+        if self._files_version() == self._loaded_from:
+            return False
+        logger.info("The index changed on disk; reloading")
+        self.reload()
+        return True
+
+    def watch(self, interval: float = 5.0) -> threading.Thread:
+        """Poll the index files from a daemon thread and reload when they change.
+
+        Lets running servers pick up ``--run-extractor`` and
+        ``--export-index`` runs from other processes without a restart.
+        """
+        def run() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception:
+                    logger.exception("Reloading the index failed")
+
+        thread = threading.Thread(target=run, name="index-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def readiness(self) -> Tuple[Optional[str], Dict]:
+        """Check that the indexes can answer queries.
+
+        Does not wait for ``_lock``, so a probe arriving during a reload gets
+        an answer straight away.
+
+        Returns:
+            The reason the retriever is not ready, or ``None``, and the sizes
+            of the indexes it checked.
+        """
+        if self._reloading.is_set():
+            return "reloading", {}
+        details: Dict = {}
+        mmap_index = self.mmap_index
+        try:
+            details["documents"] = self.store.collection.count()
+            if self.lexical is not None:
+                details["lexical_documents"] = len(self.lexical)
+            if mmap_index is not None:
+                details["mmap_documents"] = len(mmap_index.ids)
+        except Exception as e:
+            return f"index error: {e}", details
+        return None, details
+
+    def index_version(self) -> Tuple[int, int]:
+        """Identify the current state of the index.
+
+        The version changes whenever ingestion rewrites the manifest or the
+        collection is reloaded, so caches derived from search results can be
+        invalidated.
+        """
+        try:
+            manifest_mtime = os.stat(os.path.join(self.database_path, "manifest.json")).st_mtime_ns
+        except OSError:
+            manifest_mtime = 0
+        return manifest_mtime, self._generation
+
+    def embed(self, query: str) -> List[float]:
+        """Create the embedding for a single search query.
+
+        Args:
+            query: Text to embed.
+
+        Returns:
+            Query embedding as a flat list of floats.
+        """
+        with span("embedding"):
+            search_embedding_np = self.store.create_embeddings(query).cpu().numpy()
+
         # Ensure embedding is properly formatted
         if len(search_embedding_np.shape) > 1:
             search_embedding_np = search_embedding_np.flatten()
-            
-        # Query with metadata and documents included
-        results = store.collection.query(
-            query_embeddings=[search_embedding_np.tolist()],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"]
-        )
-        
-        sorted_results = []
-        # Print detailed results
-        if results and results["ids"]:
-            print("\nMatching documents found:")
-            for i, (id, distance) in enumerate(zip(results["ids"][0], results["distances"][0])):
-                similarity = 1 - distance
-
-            # Sort results by similarity score in descending order
-            sorted_results = sorted(
-                zip(results["ids"][0], results["distances"][0], results["metadatas"][0], results["documents"][0]),
-                key=lambda x: 1 - x[1],
-                reverse=False
+
+        return search_embedding_np.tolist()
+
+    async def aembed(self, query: str) -> List[float]:
+        """Create the embedding for a single search query on an event loop.
+
+        See ``VectorStore.acreate_embedding``; the loop is not blocked while
+        the query waits for its batch.
+
+        Args:
+            query: Text to embed.
+
+        Returns:
+            Query embedding as a flat list of floats.
+        """
+        with span("embedding"):
+            embedding = await self.store.acreate_embedding(query)
+        return embedding.cpu().numpy().flatten().tolist()
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 3,
+        embedding: Optional[List[float]] = None,
+    ) -> List[Tuple[str, float, Dict, str]]:
+        """Search for passages similar to the query.
+
+        With hybrid retrieval enabled, dense and BM25 candidates are fetched
+        ``overfetch`` times over and merged with reciprocal rank fusion. With
+        diverse selection, near-duplicate passages are dropped from the
+        over-fetched candidates and the rest are picked by MMR.
+
+        Args:
+            query: Text to search for.
+            n_results: Number of results to return.
+            embedding: Precomputed query embedding, to avoid encoding twice.
+
+        Returns:
+            List of ``(id, distance, metadata, document)`` tuples, best first.
+        """
+        if embedding is None:
+            embedding = self.embed(query)
+
+        with self._lock:
+            collection = self.store.collection
+            mmap_index = self.mmap_index
+
+        vectors: Dict[str, np.ndarray] = {}
+        dense = self._dense(collection, mmap_index, [embedding], self._candidates(n_results), vectors)[0]
+        ranked = self._fuse(collection, mmap_index, query, embedding, dense, n_results, vectors)
+        with span("selection"):
+            return self._select(ranked, vectors, n_results)
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        n_results: int = 3,
+    ) -> Tuple[List[List[float]], List[List[Tuple[str, float, Dict, str]]]]:
+        """Search for many queries with one encode and one vector query.
+
+        Args:
+            queries: Texts to search for.
+            n_results: Number of results per query.
+
+        Returns:
+            Query embeddings and, per query, ``(id, distance, metadata, document)``
+            tuples, best first.
+        """
+        if not queries:
+            return [], []
+
+        with span("embedding"):
+            embeddings = self.store.create_embeddings(list(queries), use_cache=False).cpu().numpy().tolist()
+
+        with self._lock:
+            collection = self.store.collection
+            mmap_index = self.mmap_index
+
+        vectors: Dict[str, np.ndarray] = {}
+        dense = self._dense(collection, mmap_index, embeddings, self._candidates(n_results), vectors)
+        results = []
+        for query, embedding, hits in zip(queries, embeddings, dense):
+            ranked = self._fuse(collection, mmap_index, query, embedding, hits, n_results, vectors)
+            with span("selection"):
+                results.append(self._select(ranked, vectors, n_results))
+        return embeddings, results
+
+    def _candidates(self, n_results: int) -> int:
+        if self.lexical is None and not self.diverse:
+            return n_results
+        return n_results * self.overfetch
+
+    def _dense(
+        self,
+        collection,
+        mmap_index: Optional[MmapIndex],
+        embeddings: List[List[float]],
+        n_results: int,
+        vectors: Dict[str, np.ndarray],
+    ) -> List[List[Tuple[str, float, Dict, str]]]:
+        """Run the dense search for one or more query embeddings.
+
+        With diverse selection, the embeddings of the hits are added to ``vectors``.
+        """
+        with span("vector_query"):
+            if mmap_index is not None:
+                return self._dense_mmap(mmap_index, embeddings, n_results, vectors if self.diverse else None)
+
+            # Query with metadata and documents included
+            include = ["metadatas", "documents", "distances"]
+            if self.diverse:
+                include.append("embeddings")
+            results = collection.query(
+                query_embeddings=embeddings,
+                n_results=n_results,
+                include=include
             )
 
-            for i, (id, distance, metadata, document) in enumerate(sorted_results):
-                similarity = 1 - distance
-                print(f"\n{i+1}. Match Details:")
-                print(f"ID: {id}")
-                print(f"Similarity Score: {similarity:.4f}")
-                
-                if metadata:
-                    print(f"Metadata: {metadata}")
-                if document:
-                    print(f"Text Preview: {document[:1200]}...")
-               
-            
-        else:
-            print("No matching documents found")
-            
+            if not results or not results["ids"]:
+                return [[] for _ in embeddings]
+            if self.diverse and results.get("embeddings") is not None:
+                for ids, hit_vectors in zip(results["ids"], results["embeddings"]):
+                    vectors.update(zip(ids, hit_vectors))
+            return [
+                list(zip(ids, distances, metadatas, documents))
+                for ids, distances, metadatas, documents in zip(
+                    results["ids"], results["distances"], results["metadatas"], results["documents"]
+                )
+            ]
+
+    def _fuse(
+        self,
+        collection,
+        mmap_index: Optional[MmapIndex],
+        query: str,
+        embedding: List[float],
+        dense: List[Tuple],
+        n_results: int,
+        vectors: Dict[str, np.ndarray],
+    ) -> List[Tuple[str, float, Dict, str]]:
+        """Merge dense hits with BM25 hits for the same query.
+
+        Returns the candidates left for selection, best first: ``n_results``
+        of them, or all of them with diverse selection. Lexical-only hits are
+        loaded from the memory-mapped index when it has them, else from Chroma.
+        """
+        keep = self._candidates(n_results) if self.diverse else n_results
+        if self.lexical is None:
+            return dense[:keep]
+
+        with span("lexical_query"):
+            lexical_ids = [doc_id for doc_id, _ in self.lexical.search(query, self._candidates(n_results))]
+            fused_ids = reciprocal_rank_fusion([[result[0] for result in dense], lexical_ids])[:keep]
+
+            by_id = {result[0]: result for result in dense}
+            missing = [doc_id for doc_id in fused_ids if doc_id not in by_id]
+            if missing and mmap_index is not None:
+                by_id.update(mmap_index.fetch(missing, embedding, vectors))
+                missing = [doc_id for doc_id in missing if doc_id not in by_id]
+            if missing:
+                by_id.update(self._fetch(collection, missing, embedding, vectors))
+
+        return [by_id[doc_id] for doc_id in fused_ids if doc_id in by_id]
+
+    def _select(
+        self, ranked: List[Tuple[str, float, Dict, str]], vectors: Dict[str, np.ndarray], n_results: int
+    ) -> List[Tuple[str, float, Dict, str]]:
+        """Pick ``n_results`` distinct passages from candidates ranked best first.
+
+        Only the best-ranked passage of each near-duplicate cluster (see
+        ``NearDuplicateIndex``) is kept. The rest are picked by maximal
+        marginal relevance: relevance is the candidate's position in the
+        ranking scaled to [0, 1], redundancy its highest cosine similarity to
+        a passage already picked, weighted by ``mmr_lambda``.
+        """
+        if not self.diverse:
+            return ranked[:n_results]
+
+        clusters = set()
+        candidates = []
+        for result in ranked:
+            cluster = (result[2] or {}).get("cluster")
+            if cluster is not None:
+                if cluster in clusters:
+                    continue
+                clusters.add(cluster)
+            candidates.append(result)
+
+        if len(candidates) <= n_results or self.mmr_lambda >= 1.0:
+            return candidates[:n_results]
+
+        dim = next((len(vector) for vector in vectors.values()), 0)
+        matrix = np.zeros((len(candidates), dim), dtype=np.float32)
+        for i, result in enumerate(candidates):
+            vector = vectors.get(result[0])
+            if vector is not None:
+                matrix[i] = vector
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+        similarity = matrix @ matrix.T
+
+        relevance = 1.0 - np.arange(len(candidates), dtype=np.float32) / (len(candidates) - 1)
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        picked = []
+        available = np.ones(len(candidates), dtype=bool)
+        for _ in range(n_results):
+            scores = self.mmr_lambda * relevance - (1.0 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(available, scores, -np.inf)))
+            picked.append(best)
+            available[best] = False
+            redundancy = np.maximum(redundancy, similarity[best])
+        return [candidates[i] for i in picked]
+
+    @staticmethod
+    def _dense_mmap(
+        mmap_index: MmapIndex,
+        embeddings: List[List[float]],
+        n_results: int,
+        vectors: Optional[Dict[str, np.ndarray]] = None,
+    ) -> List[List[Tuple[str, float, Dict, str]]]:
+        """Rank with the memory-mapped index and load the hits from its side store.
+
+        Hits are not looked up in Chroma; ``MmapIndex`` keeps the metadata and
+        text of every exported row. Embeddings of the hits are loaded into
+        ``vectors`` when it is given.
+        """
+        return mmap_index.query(np.asarray(embeddings, dtype=np.float32), n_results, vectors)
+
+    @staticmethod
+    def _fetch(
+        collection, ids: List[str], embedding: List[float], vectors: Dict[str, np.ndarray]
+    ) -> Dict[str, Tuple[str, float, Dict, str]]:
+        """Load lexical-only hits from Chroma and compute their distance to the query.
+
+        Distances are squared L2, the same measure the collection reports. The
+        hits' embeddings are added to ``vectors``.
+        """
+        records = collection.get(ids=ids, include=["embeddings", "metadatas", "documents"])
+        if not records["ids"]:
+            return {}
+        hit_vectors = np.asarray(records["embeddings"], dtype=np.float32)
+        vectors.update(zip(records["ids"], hit_vectors))
+        distances = ((hit_vectors - np.asarray(embedding, dtype=np.float32)) ** 2).sum(axis=1)
+        return {
+            doc_id: (doc_id, float(distance), metadata, document)
+            for doc_id, distance, metadata, document in zip(
+                records["ids"], distances, records["metadatas"], records["documents"]
+            )
+        }
+
+
+_default_retriever: Optional[Retriever] = None
+_default_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> Retriever:
+    """Return the process-wide retriever, creating it on first use."""
+    global _default_retriever
+    with _default_retriever_lock:
+        if _default_retriever is None:
+            _default_retriever = Retriever()
+        return _default_retriever
+
+
+def search_similar_text(
+    search_text: str,
+    n_results: int = 3,
+    retriever: Optional[Retriever] = None,
+    embedding: Optional[List[float]] = None,
+):
+    """Search for similar text with detailed results."""
+    retriever = retriever or get_retriever()
+
+    logger.debug("Searching for text similar to: %r", search_text)
+
+    try:
+        sorted_results = retriever.search(search_text, n_results=n_results, embedding=embedding)
+
+        # Formatting every hit is costly, so only do it when it will be logged
+        if logger.isEnabledFor(logging.DEBUG):
+            if sorted_results:
+                for i, (id, distance, metadata, document) in enumerate(sorted_results):
+                    similarity = 1 - distance
+                    logger.debug(
+                        "Match %d: id=%s similarity=%.4f metadata=%s text=%s...",
+                        i + 1, id, similarity, metadata, (document or "")[:1200],
+                    )
+            else:
+                logger.debug("No matching documents found")
+
         return sorted_results
-    
+
     except Exception as e:
-        print(f"Error during search: {str(e)}")
+        logger.error("Error during search: %s", e)
         return None
 
 if __name__ == "__main__":
     # Initialize components
-    store = VectorStore()
\ No newline at end of file
+    retriever = get_retriever()
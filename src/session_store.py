@@ -0,0 +1,243 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from chat_history import ChatEntry, ChatHistory
+
+DEFAULT_SESSION = "default"
+
+
+class SessionStore(ABC):
+    """Chat histories keyed by session id."""
+
+    @abstractmethod
+    def add_interaction(self, session_id: str, user_message: str, assistant_response: str) -> None:
+        """Append an interaction to a session's history."""
+
+    @abstractmethod
+    def get_last_n_interactions(self, session_id: str, n: int) -> List[ChatEntry]:
+        """Return the last n interactions of a session, oldest first."""
+
+    @abstractmethod
+    def clear_history(self, session_id: str) -> None:
+        """Forget everything stored for a session."""
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local session store with LRU and TTL eviction.
+
+    Sessions are kept in access order. Idle sessions expire after ``ttl``
+    seconds, and the least recently used ones are evicted whenever the number
+    of sessions or the approximate memory of all entries exceeds its cap.
+    """
+
+    def __init__(
+        self,
+        max_history: int = 5,
+        max_sessions: int = 50_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600.0,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_history: Interactions kept per session
+            max_sessions: Maximum number of sessions held at once
+            max_bytes: Approximate memory cap across all sessions
+            ttl: Seconds of inactivity after which a session is dropped
+        """
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, ChatHistory]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _touch(self, session_id: str, create: bool) -> Optional[ChatHistory]:
+        now = time.monotonic()
+        self._expire(now)
+        history = self._sessions.get(session_id)
+        if history is None:
+            if not create:
+                return None
+            history = ChatHistory(max_history=self.max_history)
+            self._sessions[session_id] = history
+            self._sizes[session_id] = 0
+        else:
+            self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = now
+        return history
+
+    def _drop(self, session_id: str) -> None:
+        del self._sessions[session_id]
+        del self._last_access[session_id]
+        self._total_bytes -= self._sizes.pop(session_id)
+
+    def _expire(self, now: float) -> None:
+        """Drop sessions idle for longer than the TTL, oldest first."""
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if now - self._last_access[session_id] < self.ttl:
+                break
+            self._drop(session_id)
+
+    def _enforce_limits(self, keep: str) -> None:
+        """Evict least recently used sessions until both caps are met."""
+        while (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ) and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._drop(session_id)
+
+    def add_interaction(self, session_id: str, user_message: str, assistant_response: str) -> None:
+        with self._lock:
+            history = self._touch(session_id, create=True)
+            history.add_interaction(user_message, assistant_response)
+            size = sum(entry.size_bytes() for entry in history.history)
+            self._total_bytes += size - self._sizes[session_id]
+            self._sizes[session_id] = size
+            self._enforce_limits(keep=session_id)
+
+    def get_last_n_interactions(self, session_id: str, n: int) -> List[ChatEntry]:
+        with self._lock:
+            history = self._touch(session_id, create=False)
+            return history.get_last_n_interactions(n) if history is not None and n > 0 else []
+
+    def clear_history(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of sessions and their approximate memory."""
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._total_bytes}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store on SQLite, shared by all worker processes on a host.
+
+    Every thread uses its own connection. The database runs in WAL mode so
+    readers do not block the writer. Idle sessions are purged periodically.
+    """
+
+    def __init__(
+        self,
+        path: str = "database/sessions.sqlite",
+        max_history: int = 5,
+        ttl: float = 3600.0,
+        purge_interval: float = 60.0,
+    ):
+        """
+        Initialize the store and create its table.
+
+        Args:
+            path: SQLite database file
+            max_history: Interactions kept per session
+            ttl: Seconds of inactivity after which a session is dropped
+            purge_interval: Minimum seconds between purges of expired sessions
+        """
+        self.path = path
+        self.max_history = max_history
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "session_id TEXT NOT NULL, "
+                "user_message TEXT NOT NULL, "
+                "assistant_response TEXT NOT NULL, "
+                "timestamp REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS chat_history_session ON chat_history (session_id, id)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS chat_history_timestamp ON chat_history (timestamp)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _purge_expired(self, conn: sqlite3.Connection, now: float) -> None:
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        conn.execute(
+            "DELETE FROM chat_history WHERE session_id IN ("
+            "SELECT session_id FROM chat_history GROUP BY session_id HAVING MAX(timestamp) < ?)",
+            (now - self.ttl,),
+        )
+
+    def add_interaction(self, session_id: str, user_message: str, assistant_response: str) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO chat_history (session_id, user_message, assistant_response, timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, user_message, assistant_response, now),
+            )
+            conn.execute(
+                "DELETE FROM chat_history WHERE session_id = ? AND id NOT IN ("
+                "SELECT id FROM chat_history WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_history),
+            )
+            self._purge_expired(conn, now)
+
+    def get_last_n_interactions(self, session_id: str, n: int) -> List[ChatEntry]:
+        if n <= 0:
+            return []
+        rows = self._connection().execute(
+            "SELECT user_message, assistant_response, timestamp FROM chat_history "
+            "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, min(n, self.max_history)),
+        ).fetchall()
+        # The newest row tells whether the session has been idle past the TTL
+        if not rows or rows[0][2] < time.time() - self.ttl:
+            return []
+        return [ChatEntry(*row) for row in reversed(rows)]
+
+    def clear_history(self, session_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
+
+
+def create_session_store(max_history: int = 5) -> SessionStore:
+    """Build the session store selected by the ``SESSION_STORE`` environment variable.
+
+    Args:
+        max_history: Interactions kept per session
+
+    Returns:
+        ``SQLiteSessionStore`` when ``SESSION_STORE=sqlite``, otherwise an
+        ``InMemorySessionStore``.
+    """
+    if os.getenv("SESSION_STORE", "memory").lower() == "sqlite":
+        return SQLiteSessionStore(
+            path=os.getenv("SESSION_DB_PATH", "database/sessions.sqlite"),
+            max_history=max_history,
+        )
+    return InMemorySessionStore(max_history=max_history)
@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    """Counts tokens locally with the OpenAI model's tokenizer.
+
+    Uses ``tiktoken`` when it is installed; otherwise falls back to an
+    estimate of four characters per token.
+    """
+
+    def __init__(self, model_name: str = "gpt-4o-mini"):
+        """
+        Initialize the counter.
+
+        Args:
+            model_name: OpenAI model whose tokenizer is used
+        """
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text: str) -> int:
+        """Return the number of tokens in the text."""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut the text down to at most ``max_tokens`` tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+@dataclass
+class BudgetReport:
+    """Token counts of one assembled prompt."""
+    system_tokens: int = 0
+    knowledge_tokens: int = 0
+    history_tokens: int = 0
+    question_tokens: int = 0
+    passages_kept: int = 0
+    passages_dropped: int = 0
+    passages_truncated: int = 0
+    turns_kept: int = 0
+    turns_dropped: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.knowledge_tokens + self.history_tokens + self.question_tokens
+
+    def __str__(self) -> str:
+        return (
+            f"Prompt tokens: total={self.total_tokens} system={self.system_tokens} "
+            f"knowledge={self.knowledge_tokens} history={self.history_tokens} "
+            f"question={self.question_tokens} passages={self.passages_kept}/"
+            f"{self.passages_kept + self.passages_dropped} ({self.passages_truncated} truncated) "
+            f"turns={self.turns_kept}/{self.turns_kept + self.turns_dropped}"
+        )
+
+    @property
+    def trimmed(self) -> bool:
+        """Whether anything retrieved or remembered was cut to fit the budget."""
+        return bool(self.passages_dropped or self.passages_truncated or self.turns_dropped)
+
+
+class PromptBudget:
+    """Allocates a prompt token budget across knowledge base and chat history.
+
+    The system prompt and the question are always sent. What is left is split
+    between retrieved passages and past turns; passage tokens the knowledge
+    base does not use roll over to the history. The lowest-similarity passages
+    and the oldest turns are dropped first.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        max_prompt_tokens: int = 3000,
+        knowledge_share: float = 0.7,
+        min_passage_tokens: int = 50,
+    ):
+        """
+        Initialize the budget.
+
+        Args:
+            counter: Token counter for the target model
+            max_prompt_tokens: Upper bound for the whole prompt
+            knowledge_share: Fraction of the free budget reserved for passages
+            min_passage_tokens: A passage is truncated only if at least this many tokens remain
+        """
+        self.counter = counter
+        self.max_prompt_tokens = max_prompt_tokens
+        self.knowledge_share = knowledge_share
+        self.min_passage_tokens = min_passage_tokens
+
+    def fit_passages(
+        self, passages: Sequence[Tuple[str, float]], budget: int
+    ) -> Tuple[List[str], int, int, int]:
+        """
+        Keep the most similar passages that fit the budget.
+
+        Args:
+            passages: ``(text, similarity)`` pairs
+            budget: Tokens available for the knowledge base
+
+        Returns:
+            Kept passages (most similar first), tokens used, number dropped
+            and number truncated
+        """
+        kept, used, truncated = [], 0, 0
+        for text, _ in sorted(passages, key=lambda passage: passage[1], reverse=True):
+            # Joined with a newline, which costs about one token
+            tokens = self.counter.count(text) + 1
+            if used + tokens <= budget:
+                kept.append(text)
+                used += tokens
+            elif budget - used >= self.min_passage_tokens:
+                text = self.counter.truncate(text, budget - used - 1)
+                kept.append(text)
+                used += self.counter.count(text) + 1
+                truncated += 1
+            else:
+                break
+        return kept, used, len(passages) - len(kept), truncated
+
+    def fit_history(self, turns: Sequence, budget: int) -> Tuple[List, int]:
+        """
+        Keep the most recent turns that fit the budget.
+
+        Args:
+            turns: ``ChatEntry`` objects, oldest first
+            budget: Tokens available for the history
+
+        Returns:
+            Kept turns (oldest first) and tokens used
+        """
+        kept, used = [], 0
+        for turn in reversed(turns):
+            tokens = (
+                self.counter.count(turn.user_message)
+                + self.counter.count(turn.assistant_response)
+                + 2 * MESSAGE_OVERHEAD
+            )
+            if used + tokens > budget:
+                break
+            kept.append(turn)
+            used += tokens
+        kept.reverse()
+        return kept, used
+
+    def allocate(
+        self,
+        base_system_prompt: str,
+        question: str,
+        passages: Sequence[Tuple[str, float]],
+        turns: Sequence,
+    ) -> Tuple[List[str], List, BudgetReport]:
+        """
+        Fit passages and history into the prompt budget.
+
+        Args:
+            base_system_prompt: System prompt with an empty knowledge base
+            question: Current user question
+            passages: ``(text, similarity)`` pairs of retrieved passages
+            turns: ``ChatEntry`` objects, oldest first
+
+        Returns:
+            Kept passages, kept turns and the token report
+        """
+        report = BudgetReport(
+            system_tokens=self.counter.count(base_system_prompt) + MESSAGE_OVERHEAD,
+            question_tokens=self.counter.count(question) + MESSAGE_OVERHEAD,
+        )
+        free = max(0, self.max_prompt_tokens - report.system_tokens - report.question_tokens)
+
+        (
+            kept_passages, report.knowledge_tokens, report.passages_dropped, report.passages_truncated
+        ) = self.fit_passages(passages, int(free * self.knowledge_share))
+        kept_turns, report.history_tokens = self.fit_history(turns, free - report.knowledge_tokens)
+
+        report.passages_kept = len(kept_passages)
+        report.turns_kept = len(kept_turns)
+        report.turns_dropped = len(turns) - len(kept_turns)
+        return kept_passages, kept_turns, report
@@ -1,24 +1,204 @@
-from flask import Flask, render_template, request, jsonify, make_response
-from ai_service import AIService
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from typing import Callable, Optional
+from flask import Flask, Response, render_template, request, jsonify, make_response, stream_with_context
+from batch_qa import parse_item, parse_limits
+from metrics import REGISTRY, REQUESTS
+
+# Set LOG_LEVEL=DEBUG to log retrieved passages, prompts and stage timings
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 
 app = Flask(__name__)
-ai_service = AIService()
+# Limits of one /generate_batch request; use main.py --batch for larger jobs
+MAX_BATCH_QUESTIONS = 1000
+MAX_BATCH_CONCURRENCY = 32
+# Set by _load; importing this module stays cheap until then
+retriever = None
+ai_service = None
+event_loop = None
+_ready = threading.Event()
+_load_error: Optional[BaseException] = None
+# Endpoints that do not need the model or the index
+AVAILABLE_WHILE_LOADING = {"home", "static", "healthz", "readyz", "metrics"}
+
+logger = logging.getLogger(__name__)
+
+def _load() -> None:
+    """Load the embedding model, open the index and start the event loop.
+
+    Torch, ChromaDB and the OpenAI client are imported here rather than at
+    module level, and the event loop thread is started here, so a preforking
+    parent can import this module and fork before any of that state exists.
+    """
+    global retriever, ai_service, event_loop
+    from ai_service import AIService
+    from event_loop import BackgroundLoop
+    from retrieve import Retriever
+
+    # Set by prefork.serve, so any worker's /metrics covers all of them
+    if os.getenv("METRICS_DIR"):
+        REGISTRY.enable_multiprocess(os.environ["METRICS_DIR"])
+
+    # Load the embedding model and open the index once, at startup
+    retriever = Retriever()
+    # Pick up re-ingestion and exports run by other processes
+    retriever.watch(float(os.getenv("INDEX_POLL_SECONDS", "5")))
+    ai_service = AIService(retriever=retriever)
+    # All requests share one event loop for their async OpenAI calls
+    event_loop = BackgroundLoop()
+    REGISTRY.register_collector(ai_service.metric_samples)
+
+    retriever.store.warm_up()
+    _ready.set()
+    logger.info("Model loaded and index open; ready to serve")
+
+def create_app() -> Flask:
+    """Load everything the app needs and return it. Call once per process."""
+    _load()
+    return app
+
+def load_in_background(on_error: Optional[Callable[[BaseException], None]] = None) -> threading.Thread:
+    """Load the app in a thread, so the server can answer /readyz meanwhile.
+
+    Until loading finishes, /readyz reports ``loading`` and the chat
+    endpoints answer 503. If loading fails, /readyz reports ``load_failed``
+    and ``on_error`` is called with the exception.
+    """
+    def run() -> None:
+        global _load_error
+        try:
+            _load()
+        except BaseException as e:
+            logger.exception("Loading the app failed")
+            _load_error = e
+            if on_error is not None:
+                on_error(e)
+
+    thread = threading.Thread(target=run, name="app-loader", daemon=True)
+    thread.start()
+    return thread
+
+@app.before_request
+def _require_loaded():
+    """Turn away requests that need the model until it is loaded."""
+    if not _ready.is_set() and request.endpoint not in AVAILABLE_WHILE_LOADING:
+        return jsonify({"error": "The service is starting, try again shortly."}), 503
+
+SESSION_COOKIE = "session_id"
+SESSION_HEADER = "X-Session-Id"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+def _session_id() -> str:
+    """Read the session id from the header or cookie, or start a new session."""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if session_id and SESSION_ID_PATTERN.match(session_id):
+        return session_id
+    return uuid.uuid4().hex
+
+def _with_session(response, session_id: str):
+    """Set the session cookie if the client does not have it yet."""
+    if request.cookies.get(SESSION_COOKIE) != session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    return response
 
 @app.route("/")   
 def home():
-    return render_template("index.html")
+    return _with_session(make_response(render_template("index.html")), _session_id())
 
 @app.route("/generate", methods=['POST'])
 def get_bot_response():
     data = request.json
     user_input = data.get('msg', '')
+    session_id = _session_id()
+    REQUESTS.inc(endpoint="generate")
 
     if user_input:
-       response = ai_service.chat(user_input)
+       response = event_loop.run(ai_service.achat(user_input, session_id))
     else:
        response = "Please ask a question."
 
-    return jsonify({"response": response})
+    return _with_session(jsonify({"response": response}), session_id)
+
+def _sse(payload: dict, event: str = None) -> str:
+    """Format a payload as a Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+@app.route("/generate_stream", methods=['POST'])
+def stream_bot_response():
+    data = request.json
+    user_input = data.get('msg', '')
+    session_id = _session_id()
+    REQUESTS.inc(endpoint="generate_stream")
+
+    def events():
+        if user_input:
+            for token in ai_service.chat_stream(user_input, session_id):
+                yield _sse({"token": token})
+        else:
+            yield _sse({"token": "Please ask a question."})
+        yield _sse({}, event="done")
+
+    return _with_session(Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    ), session_id)
+
+@app.route("/generate_batch", methods=['POST'])
+def generate_batch():
+    """Answer a list of questions, streaming one JSON line per answer as it finishes."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Send a JSON object with a 'questions' list"}), 400
+    questions = data.get("questions") or []
+    if not isinstance(questions, list) or len(questions) > MAX_BATCH_QUESTIONS:
+        return jsonify({"error": f"'questions' must be a list of at most {MAX_BATCH_QUESTIONS} items"}), 400
+    try:
+        concurrency, rate = parse_limits(data.get("concurrency", 8), data.get("rate"), MAX_BATCH_CONCURRENCY)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    items = [parse_item(index, raw) for index, raw in enumerate(questions)]
+    REQUESTS.inc(endpoint="generate_batch")
+
+    def lines():
+        batch = ai_service.answer_batch(items, concurrency=concurrency, rate=rate)
+        for result in event_loop.iterate(batch):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson")
+
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is serving requests."""
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: the model is warm, the indexes answer queries and the LLM
+    circuit is not open, so a load balancer stops routing here otherwise."""
+    if not _ready.is_set():
+        reason = "loading" if _load_error is None else "load_failed"
+        return jsonify({"ready": False, "reason": reason}), 503
+    reason, details = retriever.readiness()
+    if reason is None and ai_service.llm.breaker.state == "open":
+        reason = "llm_circuit_open"
+    if reason is not None:
+        return jsonify({"ready": False, "reason": reason, **details}), 503
+    return jsonify({"ready": True, **details})
+
+@app.route("/metrics")
+def metrics():
+    """Expose stage timings, token usage and cache statistics to Prometheus."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
-    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
+    load_in_background()
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app modules import each other by bare name, as when run from src/
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
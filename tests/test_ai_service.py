@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+for module in ("torch", "chromadb", "sentence_transformers"):
+    pytest.importorskip(module)
+
+import ai_service
+from ai_service import AIService
+from answer_cache import AnswerCache
+from intent import IntentResult
+from session_store import InMemorySessionStore
+
+PASSAGES = [("report.pdf_page_1", 0.2, {"filename": "report.pdf", "page": 1}, "Bonds pay coupons.")]
+
+
+class FakeRetriever:
+    def embed(self, question):
+        return [1.0, 0.0]
+
+    async def aembed(self, question):
+        return self.embed(question)
+
+    def search_batch(self, questions):
+        return [self.embed(question) for question in questions], [PASSAGES for _ in questions]
+
+    def index_version(self):
+        return (0, 0)
+
+
+class FakeLLM:
+    async def acomplete(self, **kwargs):
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2)
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=SimpleNamespace(content="An answer."))])
+
+
+class ThreadRecordingSessions(InMemorySessionStore):
+    """Session store that remembers which threads called it."""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def add_interaction(self, session_id, user_message, assistant_response):
+        self.threads.append(threading.get_ident())
+        super().add_interaction(session_id, user_message, assistant_response)
+
+    def get_last_n_interactions(self, session_id, n):
+        self.threads.append(threading.get_ident())
+        return super().get_last_n_interactions(session_id, n)
+
+
+class ThreadRecordingCache(AnswerCache):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def lookup(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().lookup(*args, **kwargs)
+
+    def store(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().store(*args, **kwargs)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ai_service, "search_similar_text", lambda question, retriever, embedding: PASSAGES)
+    service = AIService(
+        retriever=FakeRetriever(), llm=FakeLLM(), session_store=ThreadRecordingSessions(),
+        answer_cache=ThreadRecordingCache(),
+    )
+    monkeypatch.setattr(service, "detect_intent", lambda text, embedding=None: IntentResult("uncategorized", 0.0, "test"))
+    yield service
+    service.executor.shutdown()
+
+
+def run_on_loop(coroutine):
+    """Run a coroutine and return its result with the id of the loop's thread."""
+    async def main():
+        return await coroutine, threading.get_ident()
+    return asyncio.run(main())
+
+
+def test_achat_keeps_blocking_calls_off_the_event_loop(service):
+    for _ in range(2):
+        answer, loop_thread = run_on_loop(service.achat("What do bonds pay?", "session"))
+        assert answer == "An answer."
+    assert service.sessions.threads and loop_thread not in service.sessions.threads
+    assert service.answer_cache.threads and loop_thread not in service.answer_cache.threads
+
+
+def test_answer_batch_keeps_blocking_calls_off_the_event_loop(service):
+    async def collect():
+        return [answer async for answer in service.answer_batch([("1", "What do bonds pay?"), ("2", "Coupons?")])]
+
+    answers, loop_thread = run_on_loop(collect())
+    assert sorted(answer["id"] for answer in answers) == ["1", "2"]
+    assert service.answer_cache.threads and loop_thread not in service.answer_cache.threads
@@ -0,0 +1,110 @@
+import math
+
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, is_follow_up
+
+DOCS = ["report.pdf_page_1", "report.pdf_page_2"]
+
+
+def at_angle(cosine: float):
+    """A unit vector with the given cosine similarity to ``[1, 0]``."""
+    return [cosine, math.sqrt(1 - cosine ** 2)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("cosine, hit", [(1.0, True), (0.96, True), (0.95, True), (0.94, False), (0.5, False)])
+def test_threshold(cosine, hit):
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], DOCS, "Coupons.")
+    assert (cache.lookup(at_angle(cosine), DOCS) == "Coupons.") is hit
+
+
+def test_embedding_scale_does_not_matter():
+    cache = AnswerCache()
+    cache.store([2.0, 0.0], DOCS, "Coupons.")
+    assert cache.lookup([0.5, 0.0], DOCS) == "Coupons."
+
+
+def test_needs_the_same_document_set():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], DOCS, "Coupons.")
+    # Order does not matter, membership does
+    assert cache.lookup([1.0, 0.0], list(reversed(DOCS))) == "Coupons."
+    assert cache.lookup([1.0, 0.0], DOCS[:1]) is None
+    assert cache.lookup([1.0, 0.0], DOCS + ["report.pdf_page_3"]) is None
+
+
+def test_picks_the_entry_with_matching_documents():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], ["other.pdf_page_1"], "Other answer.")
+    cache.store(at_angle(0.97), DOCS, "Coupons.")
+    assert cache.lookup([1.0, 0.0], DOCS) == "Coupons."
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(ttl=60)
+    cache.store([1.0, 0.0], DOCS, "Coupons.")
+    clock[0] += 59
+    assert cache.lookup([1.0, 0.0], DOCS) == "Coupons."
+    clock[0] += 1
+    assert cache.lookup([1.0, 0.0], DOCS) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_evicts_the_least_recently_used_entry():
+    cache = AnswerCache(max_entries=2)
+    cache.store([1.0, 0.0], DOCS, "First.")
+    cache.store([0.0, 1.0], DOCS, "Second.")
+    # Using the first entry makes the second the least recently used
+    assert cache.lookup([1.0, 0.0], DOCS) == "First."
+    cache.store([-1.0, 0.0], DOCS, "Third.")
+
+    assert cache.lookup([1.0, 0.0], DOCS) == "First."
+    assert cache.lookup([0.0, 1.0], DOCS) is None
+    assert cache.lookup([-1.0, 0.0], DOCS) == "Third."
+
+
+def test_a_new_index_version_drops_every_entry():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], DOCS, "Coupons.", index_version=(1, 0))
+    assert cache.lookup([1.0, 0.0], DOCS, index_version=(1, 0)) == "Coupons."
+    assert cache.lookup([1.0, 0.0], DOCS, index_version=(2, 0)) is None
+    # Going back does not bring them back
+    assert cache.lookup([1.0, 0.0], DOCS, index_version=(1, 0)) is None
+
+
+def test_disabled_with_no_entries():
+    cache = AnswerCache(max_entries=0)
+    cache.store([1.0, 0.0], DOCS, "Coupons.")
+    assert cache.lookup([1.0, 0.0], DOCS) is None
+
+
+def test_stats():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], DOCS, "Coupons.")
+    cache.lookup([1.0, 0.0], DOCS)
+    cache.lookup([0.0, 1.0], DOCS)
+    cache.lookup([0.0, 1.0], DOCS)
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2, "hit_rate": pytest.approx(1 / 3)}
+
+
+@pytest.mark.parametrize("question, follow_up", [
+    ("What is the dividend yield of the fund?", False),
+    ("How did revenue develop in 2023 for Acme?", False),
+    ("What about it?", True),
+    ("And their margins in 2023?", True),
+    ("Explain that in more detail please", True),
+    ("Why so?", True),
+    ("Show the previous quarter figures for Acme", True),
+    ("Is Italy part of the index?", False),
+])
+def test_is_follow_up(question, follow_up):
+    assert is_follow_up(question) is follow_up
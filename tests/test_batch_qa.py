@@ -0,0 +1,137 @@
+import asyncio
+import json
+import math
+
+import pytest
+
+from batch_qa import RateLimiter, answered_ids, parse_limits, run_batch
+
+
+def write_lines(path, records, tail: bytes = b""):
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(json.dumps(record).encode("utf-8") + b"\n")
+        f.write(tail)
+
+
+class FakeService:
+    """Answers every question, failing the ones listed in ``failing``."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.asked = []
+
+    async def answer_batch(self, items, concurrency, rate):
+        for item_id, question in items:
+            self.asked.append(item_id)
+            if item_id in self.failing:
+                yield {"id": item_id, "question": question, "error": "timeout"}
+            else:
+                yield {"id": item_id, "question": question, "answer": f"About {question}"}
+
+
+def test_answered_ids_truncates_a_torn_last_line(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [{"id": "1", "answer": "a"}, {"id": "2", "answer": "b"}], tail=b'{"id": "3", "ans')
+    intact = path.stat().st_size - len(b'{"id": "3", "ans')
+
+    assert answered_ids(str(path)) == {"1", "2"}
+    assert path.stat().st_size == intact
+    assert path.read_bytes().endswith(b"\n")
+
+
+def test_answered_ids_retries_failed_and_unreadable_rows(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [{"id": "1", "answer": "a"}, {"id": "2", "error": "rate limited"}], tail=b"not json\n")
+    assert answered_ids(str(path)) == {"1"}
+    # A complete line is never truncated, even if it cannot be parsed
+    assert path.read_bytes().endswith(b"not json\n")
+
+
+def test_answered_ids_of_a_missing_file(tmp_path):
+    assert answered_ids(str(tmp_path / "answers.jsonl")) == set()
+
+
+def test_run_batch_resumes_where_an_interrupted_run_stopped(tmp_path):
+    questions = tmp_path / "questions.jsonl"
+    write_lines(questions, ["bonds", {"id": "q1", "question": "yields"}, "coupons", "duration"])
+    out = tmp_path / "answers.jsonl"
+
+    service = FakeService(failing={"2"})
+    assert run_batch(service, str(questions), str(out)) == 4
+    # Interrupted while writing a fifth answer
+    with open(out, "ab") as f:
+        f.write(b'{"id": "3", "answ')
+
+    service = FakeService()
+    assert run_batch(service, str(questions), str(out)) == 1
+    assert service.asked == ["2"]
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [record["id"] for record in records] == ["0", "q1", "2", "3", "2"]
+    assert answered_ids(str(out)) == {"0", "q1", "2", "3"}
+
+
+def test_rate_limiter_spaces_out_calls():
+    async def start_times(rate, calls):
+        limiter = RateLimiter(rate)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        times = []
+        for _ in range(calls):
+            await limiter.acquire()
+            times.append(loop.time() - started)
+        return times
+
+    times = asyncio.run(start_times(rate=20, calls=5))
+    # The first call is immediate, the rest 50 ms apart
+    assert times[0] < 0.02
+    assert [b - a for a, b in zip(times, times[1:])] == pytest.approx([0.05] * 4, abs=0.02)
+    assert times[-1] == pytest.approx(0.2, abs=0.04)
+
+
+def test_rate_limiter_paces_concurrent_callers():
+    async def start_times():
+        limiter = RateLimiter(20)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def call():
+            await limiter.acquire()
+            return loop.time() - started
+
+        return sorted(await asyncio.gather(*(call() for _ in range(5))))
+
+    times = asyncio.run(start_times())
+    assert times[-1] == pytest.approx(0.2, abs=0.04)
+    assert min(b - a for a, b in zip(times, times[1:])) > 0.03
+
+
+@pytest.mark.parametrize("rate", [None, 0])
+def test_unlimited_rate_does_not_wait(rate):
+    async def elapsed():
+        limiter = RateLimiter(rate)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(100):
+            await limiter.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(elapsed()) < 0.05
+
+
+@pytest.mark.parametrize("concurrency, rate, expected", [
+    (8, None, (8, None)),
+    ("4", "2.5", (4, 2.5)),
+    (100, 0, (32, None)),
+    (1, "", (1, None)),
+])
+def test_parse_limits(concurrency, rate, expected):
+    assert parse_limits(concurrency, rate, max_concurrency=32) == expected
+
+
+@pytest.mark.parametrize("concurrency, rate", [
+    (0, None), (-1, None), ("x", None), (None, None), (1, "x"), (1, -0.5), (1, math.inf), (1, "nan"),
+])
+def test_parse_limits_rejects(concurrency, rate):
+    with pytest.raises(ValueError):
+        parse_limits(concurrency, rate)
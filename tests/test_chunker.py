@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from chunker import TextChunker
+
+
+class PieceTokenizer:
+    """Stand-in for a WordPiece tokenizer: words, punctuation, and 3-character
+    pieces for long runs, with character offsets like a fast tokenizer."""
+
+    PATTERN = re.compile(r"\w+|[^\w\s]")
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=True, verbose=False):
+        offsets = []
+        for match in self.PATTERN.finditer(text):
+            for start in range(match.start(), match.end(), 3):
+                offsets.append((start, min(start + 3, match.end())))
+        return {"offset_mapping": offsets}
+
+
+def csv_table(rows: int, cells: int) -> str:
+    return "\n".join(
+        ",".join(f"{row * cells + cell:07d}.{cell:02d}" for cell in range(cells)) for row in range(rows)
+    )
+
+
+def assert_covers_every_token(text: str, chunker: TextChunker) -> None:
+    chunks = chunker.split(text)
+    covered = [False] * len(text)
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk.text
+        for i in range(chunk.start, chunk.end):
+            covered[i] = True
+    for start, end in chunker.tokenizer(text)["offset_mapping"]:
+        assert all(covered[start:end]), f"token {text[start:end]!r} at {start} is in no chunk"
+
+
+@pytest.mark.parametrize("cells", [20, 30])
+def test_csv_tables_lose_no_text(cells):
+    assert_covers_every_token(csv_table(40, cells), TextChunker(PieceTokenizer(), max_tokens=254, overlap=32))
+
+
+def test_prose_covers_every_token():
+    text = " ".join(f"word{i} and some ordinary prose." for i in range(600))
+    assert_covers_every_token(text, TextChunker(PieceTokenizer(), max_tokens=64, overlap=8))
+
+
+def test_chunks_start_on_word_boundaries_when_possible():
+    text = " ".join(f"investment{i}" for i in range(400))
+    chunker = TextChunker(PieceTokenizer(), max_tokens=50, overlap=10)
+    for chunk in chunker.split(text)[1:]:
+        assert text[chunk.start - 1] == " "
+
+
+def test_chunks_fit_the_token_limit():
+    chunker = TextChunker(PieceTokenizer(), max_tokens=254, overlap=32)
+    for chunk in chunker.split(csv_table(40, 20)):
+        assert len(chunker.tokenizer(chunk.text)["offset_mapping"]) <= 254
+
+
+def test_short_text_is_one_chunk():
+    chunks = TextChunker(PieceTokenizer(), max_tokens=254, overlap=32).split("Index funds are cheap.")
+    assert [(chunk.start, chunk.end, chunk.index) for chunk in chunks] == [(0, 22, 0)]
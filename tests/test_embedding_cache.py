@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, open_embedding_cache
+
+DIM = 4
+MODEL = "all-MiniLM-L6-v2:torch"
+
+
+def vectors(*values):
+    return np.array([[value] * DIM for value in values], dtype=np.float32)
+
+
+def keys(*texts):
+    return [EmbeddingCache.key(MODEL, text) for text in texts]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(embedding_cache.time, "time", tick)
+
+
+def test_keys_depend_on_model_and_text():
+    assert EmbeddingCache.key(MODEL, "bonds") == EmbeddingCache.key(MODEL, "bonds")
+    assert EmbeddingCache.key(MODEL, "bonds") != EmbeddingCache.key(MODEL, "stocks")
+    assert EmbeddingCache.key(MODEL, "bonds") != EmbeddingCache.key("other-model:torch", "bonds")
+
+
+def test_lookup_returns_stored_vectors(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.store(keys("a", "b"), vectors(0.5, -0.25))
+    found = cache.lookup(keys("b", "c", "a"))
+    assert found[1] is None
+    np.testing.assert_allclose(found[0], vectors(-0.25)[0])
+    np.testing.assert_allclose(found[2], vectors(0.5)[0])
+
+
+def test_persists_across_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.store(keys("a", "b"), vectors(0.5, -0.25))
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path))
+    assert reopened.dim == DIM
+    np.testing.assert_allclose(reopened.lookup(keys("a"))[0], vectors(0.5)[0])
+    reopened.store(keys("c"), vectors(1.0))
+    assert reopened.stats()["size"] == 3
+
+
+def test_evicts_the_least_recently_used(tmp_path, clock):
+    # Room for three float16 vectors
+    cache = EmbeddingCache(str(tmp_path), max_bytes=3 * 2 * DIM)
+    cache.store(keys("a"), vectors(0.1))
+    cache.store(keys("b"), vectors(0.2))
+    cache.store(keys("c"), vectors(0.3))
+    cache.lookup(keys("a"))
+    cache.store(keys("d"), vectors(0.4))
+
+    found = cache.lookup(keys("a", "b", "c", "d"))
+    assert [vector is not None for vector in found] == [True, False, True, True]
+    np.testing.assert_allclose(found[3], vectors(0.4)[0], atol=1e-3)
+    assert cache.stats()["evictions"] == 1
+    assert os.path.getsize(tmp_path / "vectors.f16") == 3 * 2 * DIM
+
+
+def test_keeps_the_end_of_a_batch_larger_than_the_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_bytes=2 * 2 * DIM)
+    cache.store(keys("a", "b", "c"), vectors(0.1, 0.2, 0.3))
+    assert [vector is not None for vector in cache.lookup(keys("a", "b", "c"))] == [False, True, True]
+
+
+def test_starts_over_when_the_vector_file_is_shorter_than_the_index(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.store(keys("a", "b"), vectors(0.5, -0.25))
+    cache.close()
+    with open(tmp_path / "vectors.f16", "r+b") as f:
+        f.truncate(2 * DIM)
+
+    reopened = EmbeddingCache(str(tmp_path))
+    assert reopened.lookup(keys("a", "b")) == [None, None]
+    assert reopened.stats()["size"] == 0
+    assert not (tmp_path / "vectors.f16").exists()
+    reopened.store(keys("a"), vectors(0.5))
+    np.testing.assert_allclose(reopened.lookup(keys("a"))[0], vectors(0.5)[0])
+
+
+def test_rejects_vectors_of_another_dimension(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.store(keys("a"), vectors(0.5))
+    with pytest.raises(ValueError):
+        cache.store(keys("b"), np.zeros((1, DIM + 1), dtype=np.float32))
+
+
+def test_stats(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.store(keys("a"), vectors(0.5))
+    cache.lookup(keys("a", "b", "c", "a"))
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "size": 1, "evictions": 0}
+
+
+def test_disabled_with_a_zero_size(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_MAX_MB", "0")
+    assert open_embedding_cache(str(tmp_path)) is None
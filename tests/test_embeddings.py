@@ -0,0 +1,74 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+for module in ("torch", "chromadb", "sentence_transformers"):
+    pytest.importorskip(module)
+
+import embeddings
+from embeddings import QueryEmbeddingCache, VectorStore
+
+
+def fake_model(lowercase: bool = True):
+    return SimpleNamespace(tokenizer=SimpleNamespace(do_lower_case=lowercase))
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A VectorStore whose models come from the process cache and whose
+    encoder returns a distinct value per call, without loading anything."""
+    models = {name: fake_model() for name in ("model-a", "model-b")}
+    monkeypatch.setattr(
+        embeddings, "_MODEL_CACHE", {(name, "torch", "cpu", None): model for name, model in models.items()}
+    )
+    store = VectorStore.__new__(VectorStore)
+    store.backend, store.device, store.onnx_file, store.num_threads = "torch", "cpu", None, None
+    store.query_cache = QueryEmbeddingCache()
+    store.batcher = None
+    store.encoded = []
+    lock = threading.Lock()
+
+    def encode(texts):
+        with lock:
+            store.encoded.extend(texts)
+            return [f"{store.model_name}:{text}:{len(store.encoded)}" for text in texts]
+
+    store._encode = encode
+    store.load_model("model-a")
+    return store
+
+
+def test_cache_key_is_the_model_and_the_normalized_text(store):
+    assert store._cache_key("  What   do BONDS pay? ") == ("model-a", "what do bonds pay?")
+
+
+def test_normalized_duplicates_share_one_encode(store):
+    first = store.create_embeddings("What do bonds pay?")
+    assert store.create_embeddings("what  do bonds PAY?") == first
+    assert store.encoded == ["What do bonds pay?"]
+    assert store.query_cache.stats()["hits"] == 1
+
+
+def test_case_is_kept_for_cased_models(store):
+    store.model.tokenizer.do_lower_case = False
+    store.load_model("model-a")
+    store.create_embeddings("Bonds")
+    store.create_embeddings("bonds")
+    assert store.encoded == ["Bonds", "bonds"]
+
+
+def test_loading_a_model_clears_the_cache(store):
+    from_a = store.create_embeddings("What do bonds pay?")
+    store.load_model("model-b")
+    assert len(store.query_cache) == 0
+
+    from_b = store.create_embeddings("What do bonds pay?")
+    assert from_b != from_a
+    assert from_b.startswith("model-b:")
+
+
+def test_entries_of_another_model_are_never_served(store):
+    store.create_embeddings("What do bonds pay?")
+    store.model_name = "model-b"
+    assert store.create_embeddings("What do bonds pay?").startswith("model-b:")
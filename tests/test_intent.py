@@ -0,0 +1,50 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from intent import IntentClassifier
+
+
+def unrelated(texts):
+    """Encoder that gives every text its own axis, so nothing is similar."""
+    vectors = np.zeros((len(texts), 256))
+    for i, text in enumerate(texts):
+        vectors[i, zlib.crc32(text.encode()) % 256] = 1.0
+    return vectors
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier(encode=unrelated)
+
+
+@pytest.mark.parametrize("message", [
+    "clear chat history",
+    "Please clear our conversation.",
+    "delete the chat history",
+    "reset the conversation",
+    "wipe my history",
+    "Can you clear the history please?",
+    "start over",
+])
+def test_commands_clear_history(classifier, message):
+    result = classifier.classify(message)
+    assert (result.name, result.source) == ("clear_history", "rule")
+
+
+@pytest.mark.parametrize("message", [
+    "Does a reverse stock split reset the price history?",
+    "Should I delete my brokerage account history before switching brokers?",
+    "Can a company erase its debt history through bankruptcy?",
+    "How do I clear a margin call without losing my trading history?",
+    "What is the history of the S&P 500?",
+    "Does rebalancing reset the cost basis history of my portfolio holdings and change my tax situation?",
+])
+def test_questions_are_not_commands(classifier, message):
+    assert classifier.classify(message).name == IntentClassifier.UNCATEGORIZED
+
+
+def test_long_messages_skip_the_rules(classifier):
+    message = "clear chat history " + "and then tell me about bond ladders " * 3
+    assert classifier.classify(message).source == "length"
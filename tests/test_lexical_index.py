@@ -0,0 +1,95 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+import lexical_index
+from lexical_index import LexicalIndex, tokenize
+
+VOCABULARY = ["dividend", "yield", "bond", "equity", "margin", "revenue", "etf", "s&p", "volatility", "hedge"]
+
+
+def corpus(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        # A few common terms in every document, plus a long tail of rare ones
+        words = rng.choices(VOCABULARY, k=rng.randint(3, 30)) + [f"rare{rng.randint(0, 400)}" for _ in range(5)]
+        documents.append((f"doc_{i}", " ".join(words)))
+    return documents
+
+
+def exhaustive_bm25(index: LexicalIndex, documents, query: str, n_results: int):
+    """Plain BM25 over every document, with the index's length normalization."""
+    counts = {doc_id: Counter(tokenize(text)) for doc_id, text in documents}
+    average_length = round(sum(sum(c.values()) for c in counts.values()) / len(counts))
+    df = Counter(term for c in counts.values() for term in c)
+    scores = Counter()
+    for term, query_tf in Counter(tokenize(query)).items():
+        if not df[term] or df[term] > max(index.max_df_ratio * len(counts), 50):
+            continue
+        idf = math.log(1 + (len(counts) - df[term] + 0.5) / (df[term] + 0.5))
+        for doc_id, c in counts.items():
+            if c[term]:
+                scores[doc_id] += query_tf * idf * index._impact(c[term], sum(c.values()), average_length)
+    return [round(score, 9) for _, score in scores.most_common(n_results)]
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Make most searches take several rounds
+    monkeypatch.setattr(lexical_index, "FIRST_BLOCK", 4)
+
+
+@pytest.fixture(scope="module")
+def documents():
+    return corpus(1000)
+
+
+def build(path, documents) -> LexicalIndex:
+    index = LexicalIndex(str(path), max_df_ratio=0.9)
+    ids, texts = zip(*documents)
+    index.add(ids, texts)
+    return index
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory, documents):
+    return build(tmp_path_factory.mktemp("bm25") / "bm25.sqlite", documents)
+
+
+@pytest.mark.parametrize("query", [
+    "dividend yield",
+    "bond margin revenue hedge",
+    "rare7 dividend",
+    "rare12 rare99 rare250",
+    "etf etf volatility s&p",
+])
+@pytest.mark.parametrize("n_results", [1, 10, 40])
+def test_early_termination_matches_exhaustive_scoring(index, documents, query, n_results):
+    scores = [round(score, 9) for _, score in index.search(query, n_results)]
+    assert scores == exhaustive_bm25(index, documents, query, n_results)
+
+
+def test_search_after_replacing_and_deleting(tmp_path, documents):
+    index = build(tmp_path / "bm25.sqlite", documents)
+    index.add(["doc_0"], ["rare7 rare7 rare7 rare7"])
+    index.delete(["doc_1"])
+    results = index.search("rare7", 5)
+    assert results[0][0] == "doc_0"
+    assert "doc_1" not in [doc_id for doc_id, _ in index.search("dividend yield bond", 1000)]
+
+
+def test_unknown_and_empty_queries(index):
+    assert index.search("unknownterm", 10) == []
+    assert index.search("", 10) == []
+
+
+def test_impacts_follow_the_average_length(tmp_path, documents):
+    index = build(tmp_path / "bm25.sqlite", documents)
+    longer = [(f"long_{i}", text + " " + " ".join(VOCABULARY * 6)) for i, (_, text) in enumerate(corpus(1000, seed=1))]
+    ids, texts = zip(*longer)
+    index.add(ids, texts)
+    scores = [round(score, 9) for _, score in index.search("rare7 equity", 20)]
+    assert scores == exhaustive_bm25(index, documents + longer, "rare7 equity", 20)
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClient, LLMError, LLMTimeoutError
+
+REQUEST = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+
+
+def status_error(status: int, headers=None) -> openai.APIStatusError:
+    response = httpx.Response(status, request=REQUEST, headers=headers)
+    return openai.APIStatusError(f"status {status}", response=response, body=None)
+
+
+class FakeCompletions:
+    """Plays a script of outcomes, one per call: an exception to raise, a
+    number of seconds to sleep before answering, or a response to return."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def _next(self, timeout):
+        with self.lock:
+            self.calls += 1
+            self.timeouts.append(timeout)
+            return self.script.pop(0) if len(self.script) > 1 else self.script[0]
+
+    def create(self, timeout=None, stream=False, **params):
+        outcome = self._next(timeout)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, (int, float)):
+            # Ignores its timeout, like a response trickling in byte by byte
+            time.sleep(outcome)
+        return FakeStream(["Hel", "lo"]) if stream else "completion"
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, timeout=None, **params):
+        outcome = self._next(timeout)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, (int, float)):
+            await asyncio.sleep(outcome)
+        return "completion"
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def make_client(completions=None, async_completions=None, **options) -> LLMClient:
+    options.setdefault("backoff_base", 0.001)
+    client = LLMClient(api_key="test", base_url="https://api.openai.test/v1", **options)
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    client.async_client = SimpleNamespace(chat=SimpleNamespace(completions=async_completions))
+    return client
+
+
+def test_retries_retryable_errors():
+    completions = FakeCompletions(status_error(500), openai.APIConnectionError(request=REQUEST), 0)
+    client = make_client(completions, max_retries=2)
+    assert client.complete(model="m", messages=[]) == "completion"
+    assert completions.calls == 3
+    assert client.breaker.state == "closed"
+
+
+def test_gives_up_after_max_retries():
+    completions = FakeCompletions(status_error(503))
+    client = make_client(completions, max_retries=2)
+    with pytest.raises(LLMError, match="after 3 attempts"):
+        client.complete(model="m", messages=[])
+    assert completions.calls == 3
+
+
+def test_does_not_retry_client_errors():
+    completions = FakeCompletions(status_error(400))
+    client = make_client(completions, max_retries=2)
+    with pytest.raises(LLMError):
+        client.complete(model="m", messages=[])
+    assert completions.calls == 1
+    assert client.breaker._failures == 0
+
+
+def test_honours_retry_after_up_to_the_backoff_limit():
+    client = make_client(FakeCompletions(0), backoff_max=2.0)
+    assert client.backoff(0, status_error(429, {"retry-after": "1.5"})) == 1.5
+    assert client.backoff(0, status_error(429, {"retry-after": "60"})) == 2.0
+
+
+def test_circuit_breaker_transitions():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_open_circuit_rejects_calls_without_calling_the_api():
+    completions = FakeCompletions(status_error(500))
+    client = make_client(completions, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.complete(model="m", messages=[])
+    with pytest.raises(CircuitOpenError):
+        client.complete(model="m", messages=[])
+    assert completions.calls == 2
+
+
+def test_sync_deadline_bounds_a_slow_attempt():
+    completions = FakeCompletions(1.0)
+    client = make_client(completions)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        client.complete(deadline=0.1, model="m", messages=[])
+    assert time.monotonic() - started < 0.5
+    assert client.breaker._failures == 1
+
+
+def test_deadline_covers_retries():
+    completions = FakeCompletions(status_error(500), 0.2)
+    client = make_client(completions, max_retries=5)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        client.complete(deadline=0.1, model="m", messages=[])
+    assert time.monotonic() - started < 0.5
+    # The retry only got the time that was left
+    assert completions.timeouts[1] < completions.timeouts[0] <= 0.1
+
+
+def test_async_deadline_bounds_a_slow_attempt():
+    client = make_client(async_completions=FakeAsyncCompletions(1.0))
+
+    async def call():
+        started = time.monotonic()
+        with pytest.raises(LLMTimeoutError):
+            await client.acomplete(deadline=0.1, model="m", messages=[])
+        return time.monotonic() - started
+
+    assert asyncio.run(call()) < 0.5
+
+
+def test_async_retries():
+    completions = FakeAsyncCompletions(status_error(429), status_error(502), 0)
+    client = make_client(async_completions=completions, max_retries=2)
+    assert asyncio.run(client.acomplete(model="m", messages=[])) == "completion"
+    assert completions.calls == 3
+
+
+def test_hedges_a_slow_async_call():
+    completions = FakeAsyncCompletions(1.0, 0.0)
+    client = make_client(async_completions=completions, hedge_percentile=50)
+    for _ in range(client.latency.min_samples):
+        client.latency.observe(0.02)
+
+    async def call():
+        started = time.monotonic()
+        result = await client.acomplete(model="m", messages=[])
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(call())
+    assert result == "completion"
+    assert completions.calls == 2
+    assert elapsed < 0.5
+
+
+def test_does_not_hedge_before_enough_latencies_are_known():
+    completions = FakeAsyncCompletions(0.05)
+    client = make_client(async_completions=completions, hedge_percentile=50)
+    asyncio.run(client.acomplete(model="m", messages=[]))
+    assert completions.calls == 1
+
+
+def test_stream_retries_until_the_first_chunk():
+    completions = FakeCompletions(status_error(500), 0)
+    client = make_client(completions)
+    assert list(client.stream(model="m", messages=[])) == ["Hel", "lo"]
+    assert completions.calls == 2
+
+
+def test_stream_deadline_bounds_time_to_first_chunk():
+    client = make_client(FakeCompletions(1.0))
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        list(client.stream(deadline=0.1, model="m", messages=[]))
+    assert time.monotonic() - started < 0.5
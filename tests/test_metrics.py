@@ -0,0 +1,75 @@
+import os
+
+from metrics import Registry, mark_process_dead
+
+
+def make_registry():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ["endpoint"])
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    return registry, requests, latency
+
+
+def run_worker(directory, requests: int, entries: int) -> int:
+    """Fork a worker that records some metrics, flushes them and exits."""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            registry, counter, latency = make_registry()
+            registry.register_collector(lambda: [("entries", "gauge", "Entries.", {}, entries)])
+            registry.enable_multiprocess(str(directory), interval=60)
+            for _ in range(requests):
+                counter.inc(endpoint="chat")
+                latency.observe(0.5)
+            registry.flush()
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+    return pid
+
+
+def values(text: str):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_single_process_render():
+    registry, requests, latency = make_registry()
+    requests.inc(endpoint="chat")
+    latency.observe(0.05)
+    rendered = values(registry.render())
+    assert rendered['requests_total{endpoint="chat"}'] == "1"
+    assert rendered['latency_seconds_bucket{le="0.1"}'] == "1"
+    assert rendered["latency_seconds_count"] == "1"
+
+
+def test_scrape_adds_up_all_workers(tmp_path):
+    first = run_worker(tmp_path, requests=2, entries=5)
+    second = run_worker(tmp_path, requests=3, entries=7)
+
+    registry, requests, _ = make_registry()
+    registry.enable_multiprocess(str(tmp_path), interval=60)
+    requests.inc(endpoint="chat")
+    rendered = values(registry.render())
+
+    assert rendered['requests_total{endpoint="chat"}'] == "6"
+    assert rendered['latency_seconds_bucket{le="0.1"}'] == "0"
+    assert rendered['latency_seconds_bucket{le="1.0"}'] == "5"
+    assert rendered["latency_seconds_sum"] == "2.5"
+    assert rendered[f'entries{{pid="{first}"}}'] == "5"
+    assert rendered[f'entries{{pid="{second}"}}'] == "7"
+
+
+def test_exited_workers_keep_their_totals_but_not_their_gauges(tmp_path):
+    pid = run_worker(tmp_path, requests=4, entries=5)
+    mark_process_dead(str(tmp_path), pid)
+
+    registry, _, _ = make_registry()
+    registry.enable_multiprocess(str(tmp_path), interval=60)
+    rendered = values(registry.render())
+
+    assert rendered['requests_total{endpoint="chat"}'] == "4"
+    assert f'entries{{pid="{pid}"}}' not in rendered
+    assert not (tmp_path / f"{pid}.json").exists()
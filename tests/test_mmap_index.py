@@ -0,0 +1,193 @@
+import threading
+
+import numpy as np
+import pytest
+
+from mmap_index import MmapIndex, compare_with_chroma
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection, queried by brute force."""
+
+    def __init__(self, count: int = 300, dim: int = 16, seed: int = 0, label: str = "doc"):
+        rng = np.random.default_rng(seed)
+        self.embeddings = rng.standard_normal((count, dim)).astype(np.float32)
+        self.embeddings /= np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+        self.ids = [f"{label}_{i}" for i in range(count)]
+        self.metadatas = [{"filename": f"report_{i % 7}.pdf", "page": i, "title": "Résumé \"Q3\""} for i in range(count)]
+        self.documents = [f"Passage {i} about bonds.\nSecond line." for i in range(count)]
+        self.gets = 0
+        # Called with the offset before each page is returned
+        self.on_get = None
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include, limit, offset):
+        self.gets += 1
+        if self.on_get is not None:
+            self.on_get(offset)
+        rows = slice(offset, offset + limit)
+        return {
+            "ids": self.ids[rows], "embeddings": self.embeddings[rows],
+            "metadatas": self.metadatas[rows], "documents": self.documents[rows],
+        }
+
+    def query(self, query_embeddings, n_results, include):
+        query = np.asarray(query_embeddings, dtype=np.float32)
+        distances = ((self.embeddings[None] - query[:, None]) ** 2).sum(axis=2)
+        top = np.argsort(distances, axis=1)[:, :n_results]
+        return {"ids": [[self.ids[i] for i in row] for row in top]}
+
+
+@pytest.fixture(scope="module")
+def collection():
+    return FakeCollection()
+
+
+@pytest.fixture(scope="module", params=["int8", "float16"])
+def index(request, tmp_path_factory, collection):
+    path = tmp_path_factory.mktemp(request.param)
+    MmapIndex.export(collection, str(path), dtype=request.param, page_size=64)
+    return MmapIndex(str(path))
+
+
+def test_query_loads_hits_from_the_side_store(index, collection):
+    gets = collection.gets
+    vectors = {}
+    hits = index.query(collection.embeddings[[5, 42]], k=3, vectors=vectors)
+
+    assert collection.gets == gets
+    assert [query_hits[0][0] for query_hits in hits] == ["doc_5", "doc_42"]
+    doc_id, distance, metadata, document = hits[1][0]
+    assert distance == pytest.approx(0.0, abs=1e-3)
+    assert metadata == collection.metadatas[42]
+    assert document == collection.documents[42]
+    assert set(vectors) == {doc_id for query_hits in hits for doc_id, *_ in query_hits}
+    assert vectors["doc_5"] == pytest.approx(collection.embeddings[5], abs=0.02)
+
+
+def test_distances_are_squared_l2_between_unit_vectors(index, collection):
+    query = collection.embeddings[7] + collection.embeddings[8]
+    for doc_id, distance, _, _ in index.query(query, k=5)[0]:
+        row = int(doc_id.split("_")[1])
+        expected = ((collection.embeddings[row] - query / np.linalg.norm(query)) ** 2).sum()
+        assert distance == pytest.approx(expected, abs=0.02)
+
+
+def test_fetch_skips_ids_missing_from_the_export(index, collection):
+    vectors = {}
+    fetched = index.fetch(["doc_3", "doc_unknown"], collection.embeddings[3], vectors)
+    assert list(fetched) == ["doc_3"]
+    assert fetched["doc_3"][2:] == (collection.metadatas[3], collection.documents[3])
+    assert fetched["doc_3"][1] == pytest.approx(0.0, abs=1e-3)
+    assert list(vectors) == ["doc_3"]
+
+
+def test_float32_cache_gives_the_same_results(index, collection):
+    cached = MmapIndex(str(index.path), cache=True)
+    queries = collection.embeddings[:20] + 0.1
+    for cached_hits, hits in zip(cached.search(queries, 5), index.search(queries, 5)):
+        assert [doc_id for doc_id, _ in cached_hits] == [doc_id for doc_id, _ in hits]
+        assert [score for _, score in cached_hits] == pytest.approx([score for _, score in hits], abs=1e-5)
+    assert cached.memory_footprint() > index.memory_footprint()
+
+
+def test_exports_int8_by_default(tmp_path, collection):
+    MmapIndex.export(collection, str(tmp_path))
+    assert MmapIndex(str(tmp_path)).meta["dtype"] == "int8"
+
+
+def test_unversioned_exports_count_as_missing(tmp_path, collection):
+    MmapIndex.export(collection, str(tmp_path))
+    current = tmp_path / "current"
+    for path in current.iterdir():
+        (tmp_path / path.name).write_bytes(path.read_bytes())
+    current.unlink()
+    assert not MmapIndex.exists(str(tmp_path))
+
+    MmapIndex.export(collection, str(tmp_path))
+    assert MmapIndex.exists(str(tmp_path))
+    assert not (tmp_path / "meta.json").exists()
+
+
+def test_compare_with_chroma_times_the_whole_dense_path(index, collection):
+    report = compare_with_chroma(index, collection, n_queries=20, k=5)
+    assert report["top1_agreement"] == 1.0
+    assert report["mmap_p50_ms"] > 0 and report["chroma_p50_ms"] > 0
+
+
+def exports(path):
+    return [entry for entry in path.iterdir() if entry.is_dir() and not entry.is_symlink()]
+
+
+def assert_consistent(index: MmapIndex) -> str:
+    """Check that all files of an opened index come from one export."""
+    count = len(index.ids)
+    assert index.meta["count"] == count == len(index.vectors) == len(index.offsets) - 1
+    label = index.ids[0].split("_")[0]
+    for row in (0, count // 2, count - 1):
+        assert index.ids[row] == f"{label}_{row}"
+        assert index.records([row])[0][1].startswith(f"Passage {row} ")
+    return label
+
+
+def test_readers_see_whole_exports_while_an_export_runs(tmp_path):
+    MmapIndex.export(FakeCollection(300, label="old"), str(tmp_path), page_size=64)
+
+    new = FakeCollection(200, seed=1, label="new")
+    halfway, resume = threading.Event(), threading.Event()
+
+    def pause(offset):
+        if offset >= 64:
+            halfway.set()
+            assert resume.wait(5)
+
+    new.on_get = pause
+    exporter = threading.Thread(target=MmapIndex.export, args=(new, str(tmp_path)), kwargs={"page_size": 64})
+    exporter.start()
+    assert halfway.wait(5)
+    assert assert_consistent(MmapIndex(str(tmp_path))) == "old"
+
+    labels, errors = set(), []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            try:
+                labels.add(assert_consistent(MmapIndex(str(tmp_path))))
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    resume.set()
+    exporter.join(5)
+    # Further exports while the readers keep opening the index
+    for seed in range(2, 5):
+        MmapIndex.export(FakeCollection(100 + seed, seed=seed, label="new"), str(tmp_path), page_size=64)
+    stop.set()
+    for reader in readers:
+        reader.join(5)
+
+    assert not errors
+    assert labels <= {"old", "new"}
+    assert assert_consistent(MmapIndex(str(tmp_path))) == "new"
+    # The current and the previous export are kept
+    assert len(exports(tmp_path)) == 2
+
+
+def test_a_failed_export_leaves_the_current_one_in_place(tmp_path):
+    MmapIndex.export(FakeCollection(300, label="old"), str(tmp_path), page_size=64)
+    broken = FakeCollection(200, label="new")
+
+    def fail(offset):
+        if offset:
+            raise ConnectionError("Chroma went away")
+
+    broken.on_get = fail
+    with pytest.raises(ConnectionError):
+        MmapIndex.export(broken, str(tmp_path), page_size=64)
+    assert assert_consistent(MmapIndex(str(tmp_path))) == "old"
+    assert len(exports(tmp_path)) == 1
@@ -0,0 +1,33 @@
+from near_duplicates import NearDuplicateIndex
+
+BOILERPLATE = (
+    "Past performance is not a reliable indicator of future results. The value of "
+    "investments and the income from them can fall as well as rise."
+)
+OTHER = "Dividend growth funds hold companies that have raised their payouts for at least ten consecutive years."
+
+
+def test_near_duplicates_share_a_cluster(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "nd.sqlite"))
+    first, second, other = index.assign(
+        ["a_page_1", "b_page_1", "c_page_1"], [BOILERPLATE, BOILERPLATE + " ", OTHER]
+    )
+    assert first == second != other
+    assert index.duplicates == 1
+
+
+def test_cluster_ids_are_not_chunk_ids(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "nd.sqlite"))
+    ids = ["a_page_1", "b_page_1", "c_page_1"]
+    clusters = index.assign(ids, [BOILERPLATE, BOILERPLATE, OTHER])
+    assert not set(clusters) & set(ids)
+
+
+def test_reused_id_does_not_join_the_old_cluster(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "nd.sqlite"))
+    boilerplate, _ = index.assign(["a_page_1", "b_page_1"], [BOILERPLATE, BOILERPLATE], ["a.pdf", "b.pdf"])
+
+    # a.pdf is re-indexed and its first page now holds unrelated text
+    index.delete_file("a.pdf")
+    (other,) = index.assign(["a_page_1"], [OTHER], ["a.pdf"])
+    assert other != boilerplate
@@ -0,0 +1,142 @@
+import os
+from pathlib import Path
+
+import pytest
+
+for module in ("pandas", "torch", "chromadb", "sentence_transformers"):
+    pytest.importorskip(module)
+
+from src import pdf_extractor
+from src.chunker import TextChunker
+from src.lexical_index import LexicalIndex
+from src.manifest import IndexManifest
+from src.near_duplicates import NearDuplicateIndex
+from test_chunker import PieceTokenizer
+
+
+class FakePage:
+    lines = rects = ()
+
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        if self.text is None:
+            raise ValueError("broken content stream")
+        return self.text
+
+    def close(self):
+        pass
+
+
+class FakePDF:
+    def __init__(self, texts):
+        self.pages = [FakePage(text) for text in texts]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeCollection:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, ids=None, where=None):
+        self.deleted.extend(ids or [])
+
+
+class FakeStore:
+    def __init__(self):
+        self.collection = FakeCollection()
+        self.stored = []
+
+    def embed_documents(self, documents, cache=None):
+        return [[0.0] for _ in documents]
+
+    def store_embeddings(self, embeddings, metadata, documents, ids):
+        self.stored.extend(ids)
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    texts = {}
+    monkeypatch.setattr(pdf_extractor.pdfplumber, "open", lambda path: FakePDF(texts[Path(path).name]))
+    return texts
+
+
+def ingest(tmp_path, manifest):
+    store = FakeStore()
+    sink = pdf_extractor._EmbeddingSink(
+        store, manifest, 8, TextChunker(PieceTokenizer()), LexicalIndex(str(tmp_path / "bm25.sqlite")),
+        NearDuplicateIndex(str(tmp_path / "nd.sqlite")),
+    )
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"new")
+    sink.begin_file(path.name, os.stat(path), "new")
+    pdf_extractor._ingest_sequential(pdf_extractor.PDFProcessor(), sink, [path])
+    sink.flush()
+    return store
+
+
+def test_a_failing_page_does_not_stop_the_file(pages, tmp_path):
+    pages["report.pdf"] = ["Bonds pay coupons.", None, "Stocks pay dividends."]
+    records = []
+    with pytest.raises(pdf_extractor.ExtractionError):
+        for record in pdf_extractor.PDFProcessor().iter_content(tmp_path / "report.pdf"):
+            records.append(record)
+    assert [record.page for record in records] == [1, 3]
+
+
+def test_a_partly_extracted_file_keeps_its_old_ids(pages, tmp_path):
+    old_chunks = {f"report.pdf_page_{page}_chunk_0": "old" for page in (1, 2, 3)}
+    manifest = IndexManifest(str(tmp_path / "manifest.json"))
+    manifest.files["report.pdf"] = {"size": 3, "mtime": 0, "sha256": "old", "chunks": old_chunks}
+
+    pages["report.pdf"] = ["Bonds pay coupons.", None, "Stocks pay dividends."]
+    store = ingest(tmp_path, manifest)
+    assert store.stored == ["report.pdf_page_1_chunk_0", "report.pdf_page_3_chunk_0"]
+    assert store.collection.deleted == []
+    assert manifest.get("report.pdf")["sha256"] == "old"
+
+    pages["report.pdf"] = ["Bonds pay coupons."]
+    store = ingest(tmp_path, manifest)
+    assert sorted(store.collection.deleted) == ["report.pdf_page_2_chunk_0", "report.pdf_page_3_chunk_0"]
+    assert list(manifest.get("report.pdf")["chunks"]) == ["report.pdf_page_1_chunk_0"]
+
+
+class RecordingSink:
+    def __init__(self):
+        self.finished = []
+
+    def add(self, records):
+        pass
+
+    def finish_file(self, filename, pages, total, complete):
+        self.finished.append(filename)
+
+
+def extract_or_die(pdf_path, chunk_size):
+    name = Path(pdf_path).name
+    pdf_extractor._worker_queue.put(("start", name, os.getpid()))
+    if name == "oom.pdf":
+        # Flush the start message, which a real worker would have sent long
+        # before running out of memory
+        pdf_extractor._worker_queue.close()
+        pdf_extractor._worker_queue.join_thread()
+        os._exit(9)
+    pdf_extractor._worker_queue.put(("done", name, (1, True)))
+
+
+def test_a_dead_worker_fails_the_ingest_instead_of_hanging(monkeypatch):
+    monkeypatch.setattr(pdf_extractor, "_extract_worker", extract_or_die)
+    queue = pdf_extractor.multiprocessing.Queue()
+    pool = pdf_extractor.multiprocessing.Pool(2, initializer=pdf_extractor._init_worker, initargs=(queue,))
+    try:
+        with pytest.raises(RuntimeError, match="oom.pdf"):
+            pdf_extractor._ingest_parallel(pool, queue, RecordingSink(), [Path("a.pdf"), Path("oom.pdf")], 8)
+    finally:
+        pool.terminate()
+        pool.join()
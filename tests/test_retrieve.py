@@ -0,0 +1,99 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+for module in ("torch", "chromadb", "sentence_transformers"):
+    pytest.importorskip(module)
+
+from retrieve import Retriever
+
+
+class ReopenCountingStore:
+    def __init__(self):
+        self.reopened = 0
+        self.collection = SimpleNamespace(count=lambda: 3)
+
+    def reopen(self):
+        self.reopened += 1
+
+
+def make_retriever(database_path) -> Retriever:
+    """A retriever with a fake store, without loading a model."""
+    retriever = Retriever.__new__(Retriever)
+    retriever.database_path = str(database_path)
+    retriever.collection_name = "embeddings"
+    retriever.backend = "chroma"
+    retriever._lock = threading.RLock()
+    retriever._reloading = threading.Event()
+    retriever._generation = 0
+    retriever.store = ReopenCountingStore()
+    retriever.lexical = None
+    retriever.mmap_index = None
+    retriever._loaded_from = retriever._files_version()
+    return retriever
+
+
+def touch(path, mtime_ns: int) -> None:
+    path.write_text("{}")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reloads_when_ingestion_rewrites_the_manifest(tmp_path):
+    touch(tmp_path / "manifest.json", 1_000_000_000)
+    retriever = make_retriever(tmp_path)
+    version = retriever.index_version()
+
+    assert not retriever.reload_if_changed()
+    assert retriever.store.reopened == 0
+
+    touch(tmp_path / "manifest.json", 2_000_000_000)
+    assert retriever.reload_if_changed()
+    assert retriever.store.reopened == 1
+    assert retriever.index_version() != version
+    # Nothing changed since the reload
+    assert not retriever.reload_if_changed()
+
+
+def test_reloads_when_an_export_is_published(tmp_path):
+    retriever = make_retriever(tmp_path)
+    (tmp_path / "mmap_index").mkdir()
+    os.symlink("20260101T000000-aaaaaaaa", tmp_path / "mmap_index" / "current")
+    assert retriever.reload_if_changed()
+    assert not retriever.reload_if_changed()
+
+
+def test_watch_reloads_in_the_background(tmp_path):
+    retriever = make_retriever(tmp_path)
+    reloaded = threading.Event()
+    reload = retriever.reload
+
+    def signal_reload():
+        reload()
+        reloaded.set()
+
+    retriever.reload = signal_reload
+    retriever.watch(interval=0.01)
+    touch(tmp_path / "manifest.json", 3_000_000_000)
+    assert reloaded.wait(5)
+    assert retriever.store.reopened == 1
+
+
+def test_not_ready_during_a_reload(tmp_path):
+    retriever = make_retriever(tmp_path)
+    reopening, release = threading.Event(), threading.Event()
+
+    def slow_reopen():
+        reopening.set()
+        release.wait(5)
+
+    retriever.store.reopen = slow_reopen
+    assert retriever.readiness() == (None, {"documents": 3})
+    thread = threading.Thread(target=retriever.reload)
+    thread.start()
+    assert reopening.wait(5)
+    assert retriever.readiness()[0] == "reloading"
+    release.set()
+    thread.join(5)
+    assert retriever.readiness() == (None, {"documents": 3})
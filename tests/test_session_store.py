@@ -0,0 +1,33 @@
+import pytest
+
+from session_store import InMemorySessionStore, SessionStore, SQLiteSessionStore
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class Incomplete(SessionStore):
+        def add_interaction(self, session_id, user_message, assistant_response):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore(max_history=2)
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite"), max_history=2)
+
+
+def test_stores_keep_the_last_interactions_per_session(store):
+    for i in range(3):
+        store.add_interaction("a", f"question {i}", f"answer {i}")
+    store.add_interaction("b", "other", "reply")
+
+    assert [entry.user_message for entry in store.get_last_n_interactions("a", 5)] == ["question 1", "question 2"]
+    store.clear_history("a")
+    assert store.get_last_n_interactions("a", 5) == []
+    assert len(store.get_last_n_interactions("b", 5)) == 1
@@ -0,0 +1,37 @@
+from chat_history import ChatEntry
+from metrics import REGISTRY, record_prompt
+from token_budget import PromptBudget, TokenCounter
+
+
+def budget(max_prompt_tokens: int) -> PromptBudget:
+    counter = TokenCounter()
+    # Count four characters per token, with or without tiktoken installed
+    counter.encoding = None
+    return PromptBudget(counter, max_prompt_tokens=max_prompt_tokens, min_passage_tokens=10)
+
+
+def test_report_counts_dropped_and_truncated_passages():
+    passages = [("a" * 400, 0.9), ("b" * 400, 0.8), ("c" * 400, 0.7)]
+    kept, turns, report = budget(300).allocate("system", "question?", passages, [])
+    assert len(kept) == 2 and kept[0] == "a" * 400 and len(kept[1]) < 400
+    assert (report.passages_kept, report.passages_dropped, report.passages_truncated) == (2, 1, 1)
+    assert report.trimmed
+
+
+def test_report_counts_dropped_turns():
+    turns = [ChatEntry("q" * 400, "a" * 400) for _ in range(3)]
+    _, kept, report = budget(600).allocate("system", "question?", [], turns)
+    assert report.turns_dropped == 3 - len(kept) > 0
+
+
+def test_untrimmed_prompt():
+    _, _, report = budget(3000).allocate("system", "question?", [("short passage", 0.9)], [])
+    assert not report.trimmed
+
+
+def test_prompt_metrics_are_exported():
+    _, _, report = budget(300).allocate("system", "question?", [("a" * 400, 0.9), ("b" * 400, 0.8)], [])
+    record_prompt(report)
+    text = REGISTRY.render()
+    assert 'rag_prompt_tokens_count{part="total"}' in text
+    assert 'rag_prompt_trimmed_total{item="passage",action="truncated"}' in text
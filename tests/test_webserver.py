@@ -0,0 +1,106 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import webserver
+from llm_client import CircuitBreaker
+
+
+class FakeRetriever:
+    def __init__(self, reason=None):
+        self.reason = reason
+
+    def readiness(self):
+        return self.reason, {"documents": 3}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(webserver, "retriever", FakeRetriever())
+    monkeypatch.setattr(webserver, "ai_service", SimpleNamespace(llm=SimpleNamespace(breaker=breaker)))
+    monkeypatch.setattr(webserver, "_ready", threading.Event())
+    monkeypatch.setattr(webserver, "_load_error", None)
+    webserver._ready.set()
+    return webserver.app.test_client()
+
+
+def test_ready(client):
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json == {"ready": True, "documents": 3}
+
+
+def test_not_ready_while_loading(client):
+    webserver._ready.clear()
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["reason"] == "loading"
+
+
+def test_serves_readyz_while_the_app_loads_in_the_background(client, monkeypatch):
+    webserver._ready.clear()
+    release = threading.Event()
+
+    def slow_load():
+        release.wait(5)
+        webserver._ready.set()
+
+    monkeypatch.setattr(webserver, "_load", slow_load)
+    thread = webserver.load_in_background()
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["reason"] == "loading"
+    assert client.post("/generate", json={"msg": "Hello"}).status_code == 503
+    assert client.get("/healthz").status_code == 200
+
+    release.set()
+    thread.join(5)
+    assert client.get("/readyz").status_code == 200
+
+
+def test_reports_a_failed_load(client, monkeypatch):
+    webserver._ready.clear()
+    errors = []
+
+    def failing_load():
+        raise OSError("no model")
+
+    monkeypatch.setattr(webserver, "_load", failing_load)
+    webserver.load_in_background(on_error=errors.append).join(5)
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["reason"] == "load_failed"
+    assert [str(e) for e in errors] == ["no model"]
+
+
+def test_not_ready_while_the_retriever_is_not(client):
+    webserver.retriever.reason = "reloading"
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["reason"] == "reloading"
+
+
+def test_not_ready_while_the_llm_circuit_is_open(client):
+    webserver.ai_service.llm.breaker.record_failure()
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["reason"] == "llm_circuit_open"
+
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"questions": ["Q"], "concurrency": "many"}, "'concurrency' must be a positive integer"),
+    ({"questions": ["Q"], "concurrency": 0}, "'concurrency' must be a positive integer"),
+    ({"questions": ["Q"], "concurrency": -3}, "'concurrency' must be a positive integer"),
+    ({"questions": ["Q"], "rate": "fast"}, "'rate' must be a number of questions per second"),
+    ({"questions": ["Q"], "rate": -1}, "'rate' must be a non-negative number of questions per second"),
+    (["Q"], "Send a JSON object with a 'questions' list"),
+])
+def test_generate_batch_rejects_invalid_limits(client, body, message):
+    response = client.post("/generate_batch", json=body)
+    assert response.status_code == 400
+    assert response.json == {"error": message}